@@ -0,0 +1,457 @@
+import argparse
+import contextlib
+import dataclasses
+import decimal as dec
+import http.client
+import json
+import logging
+import os
+import pathlib
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+from typing import Callable, Iterator, Mapping, Sequence
+
+from tests.synthetic import build_corpus, planilha_for, trades_for
+from pynotas import read_avenue, read_nu, read_xp
+from pynotas.backends import BACKENDS, DEFAULT_BACKEND, Document
+from pynotas.cache import LayoutCache
+from pynotas.centavos import processar_centavos
+from pynotas.detect import Classificacao, classificar
+from pynotas.formatting import PLAIN, PT_BR
+from pynotas.models import LinhaPlanilha, Negocios
+from pynotas.parser import processar_decimal, to_dec
+
+logger = logging.getLogger("benchmarks")
+
+Reader = Callable[[pathlib.Path | Document, str | None], Sequence[LinhaPlanilha]]
+
+READERS: Mapping[str, Reader] = {"xp": read_xp, "nu": read_nu, "avenue": read_avenue}
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+STARTUP_BUDGET = 150.0
+SERVE_BUDGET = 100.0
+# only reading a note (or --sqlite, --format parquet, a changed sys.path) may import these
+LAZY = (
+    "pdfminer",
+    "pymupdf",
+    "fitz",
+    "sqlite3",
+    "pyarrow",
+    "pytz",
+    "importlib.metadata",
+    "pynotas.companies.avenue",
+    "pynotas.companies.nu",
+    "pynotas.companies.xp",
+)
+
+
+@dataclasses.dataclass
+class Result:
+    name: str
+    notes: int
+    pages: int
+    seconds: float
+
+    @property
+    def notes_per_second(self) -> float:
+        return self.notes / self.seconds if self.seconds else float("inf")
+
+    @property
+    def pages_per_second(self) -> float:
+        return self.pages / self.seconds if self.seconds else float("inf")
+
+    def line(self) -> str:
+        return (
+            f"{self.name:<32} {self.notes:>6} notes {self.seconds:>9.3f}s "
+            f"{self.notes_per_second:>10.1f} notes/s {self.pages_per_second:>10.1f} pages/s"
+        )
+
+
+def _pages(corpus: Sequence[tuple[str, pathlib.Path]]) -> int:
+    import pymupdf
+
+    total = 0
+    for _, file_path in corpus:
+        with pymupdf.open(file_path) as doc:  # type: ignore[no-untyped-call]
+            total += doc.page_count
+    return total
+
+
+def bench_readers(corpus: Sequence[tuple[str, pathlib.Path]], backend: str) -> Iterator[Result]:
+    for broker, reader in READERS.items():
+        files = [file_path for name, file_path in corpus if name == broker]
+        if not files:
+            continue
+        start = time.perf_counter()
+        for file_path in files:
+            reader(file_path, backend)
+        seconds = time.perf_counter() - start
+        yield Result(f"read_{broker} [{backend}]", len(files), _pages([(broker, f) for f in files]), seconds)
+
+
+def bench_detect(corpus: Sequence[tuple[str, pathlib.Path]]) -> Result:
+    start = time.perf_counter()
+    for _, file_path in corpus:
+        classificar(file_path)
+    return Result("detect (first page)", len(corpus), len(corpus), time.perf_counter() - start)
+
+
+def check_detect(corpus: Sequence[tuple[str, pathlib.Path]]) -> int:
+    mismatches = 0
+    for broker, file_path in corpus:
+        # 000001-nu-v1.pdf: xp has a single layout
+        _, _, version = file_path.stem.partition("-")[2].partition("-v")
+        detected = classificar(file_path)
+        if detected != Classificacao(broker, int(version or 1)):
+            logger.error("%s detected as %s", file_path, detected)
+            mismatches += 1
+    return mismatches
+
+
+def bench_replay(corpus: Sequence[tuple[str, pathlib.Path]], backend: str, workdir: pathlib.Path) -> Iterator[Result]:
+    layout = LayoutCache(workdir / "layout")
+    for broker, reader in READERS.items():
+        files = [file_path for name, file_path in corpus if name == broker]
+        if not files:
+            continue
+        for file_path in files:
+            with layout.open_document(file_path, backend) as document:
+                reader(document, backend)
+        start = time.perf_counter()
+        for file_path in files:
+            with layout.open_document(file_path, backend) as document:
+                reader(document, backend)
+        seconds = time.perf_counter() - start
+        yield Result(f"replay_{broker} [{backend}]", len(files), _pages([(broker, f) for f in files]), seconds)
+
+
+def bench_processar_dados(notes: int, trades: int) -> Iterator[Result]:
+    planilhas = [planilha_for(trades, seed) for seed in range(notes)]
+    for name, engine in (("processar_decimal", processar_decimal), ("processar_centavos", processar_centavos)):
+        start = time.perf_counter()
+        for planilha in planilhas:
+            engine(planilha)
+        yield Result(f"{name} [{trades} trades]", notes, notes, time.perf_counter() - start)
+
+
+def _decimais(values: int, seed: int = 0) -> list[dec.Decimal]:
+    # qualquer Decimal: sinais, expoentes positivos e até 28 casas
+    rng = random.Random(seed)
+    decimais = []
+    for _ in range(values):
+        digits = tuple(rng.randrange(10) for _ in range(rng.randint(1, 28)))
+        decimais.append(dec.Decimal((rng.choice((0, 1)), digits, rng.randint(-28, 3))))
+    return decimais
+
+
+def _row_values(values: int, seed: int = 0) -> list[dec.Decimal]:
+    # o que montar_planilha formata: quantidade, preço, total, rateio de taxa e preço médio
+    rng = random.Random(seed)
+    decimais: list[dec.Decimal] = []
+    while len(decimais) < values:
+        sign = rng.choice((1, 1, -1))
+        quantity = dec.Decimal(rng.randint(1, 1000))
+        price = dec.Decimal(rng.randint(1, 100000)).scaleb(-2)
+        total = quantity * price
+        fee = total * dec.Decimal("0.0003") / quantity
+        decimais += [sign * quantity, price, sign * total, fee, price + fee, dec.Decimal(0)]
+    return decimais[:values]
+
+
+def _dec2str_legacy(value: dec.Decimal) -> str:
+    return str(value).replace(",", "").replace(".", ",").strip("0")
+
+
+def bench_formatting(values: int, repeat: int = 3) -> Iterator[Result]:
+    decimais = _row_values(values)
+    legacy = _dec2str_legacy
+    formatar = PT_BR.format_value
+    variants: Mapping[str, Callable[[], object]] = {
+        "_dec2str (legacy)": lambda: [legacy(valor) for valor in decimais],
+        "DecimalFormatter.format_value": lambda: [formatar(valor) for valor in decimais],
+        "DecimalFormatter.column": lambda: PT_BR.column(None, decimais),
+    }
+    for name, variant in variants.items():
+        seconds = min(timeit.repeat(variant, number=1, repeat=repeat))
+        yield Result(f"{name} [{values} values]", values, 0, seconds)
+
+
+def check_round_trip(values: int) -> int:
+    decimais = [
+        *_decimais(values, seed=1),
+        *_row_values(values, seed=1),
+        *map(dec.Decimal, ("10", "0.5", "-0", "0E-23", "1E+3", "-0.000")),
+    ]
+    mismatches = 0
+    for valor in decimais:
+        texto = PT_BR.format_value(valor)
+        if to_dec(texto) != valor or PT_BR.parse(texto) != valor or PLAIN.parse(PLAIN.format_value(valor)) != valor:
+            logger.error("%r formatted as %r", valor, texto)
+            mismatches += 1
+    return mismatches
+
+
+def _statement(trades: int) -> list[str]:
+    # uma linha de texto por negócio, como sai do PDF: cada campo lido vira um objeto novo
+    return [
+        f"{trade.ticker} {trade.quantity} {PT_BR.format_value(trade.price)} {PT_BR.format_value(trade.signed_total)}"
+        for trade in trades_for(trades, 0, sells=True)
+    ]
+
+
+def _traced(build: Callable[[], object]) -> int:
+    tracemalloc.start()
+    try:
+        kept = build()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del kept
+    return size
+
+
+def bench_memory(trades: int) -> Iterator[tuple[str, int]]:
+    lines = _statement(trades)
+
+    def lists() -> object:
+        columns: tuple[list[str], list[str], list[dec.Decimal], list[dec.Decimal], list[dec.Decimal]] = (
+            [], [], [], [], [],
+        )
+        for line in lines:
+            ticker, quantity, price, total = line.split()
+            columns[0].append(ticker)
+            columns[1].append("Ação")
+            columns[2].append(to_dec(quantity))
+            columns[3].append(to_dec(price))
+            columns[4].append(to_dec(total))
+        return columns
+
+    def negocios() -> object:
+        batch = Negocios()
+        for line in lines:
+            ticker, quantity, price, total = line.split()
+            batch.append(ticker, "Ação", to_dec(quantity), to_dec(price), to_dec(total))
+        return batch
+
+    yield "lists of Decimal", _traced(lists)
+    yield "Negocios", _traced(negocios)
+
+
+def _python(args: Sequence[str], cwd: pathlib.Path | None = None) -> "subprocess.CompletedProcess[str]":
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=cwd,
+        env={**os.environ, "PYTHONPATH": str(ROOT)},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def _importtime(args: Sequence[str], cwd: pathlib.Path | None = None) -> dict[str, int]:
+    # self time in microseconds of each module, from python -X importtime
+    imported = {}
+    for line in _python(["-X", "importtime", *args], cwd).stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            own, _, name = line.removeprefix("import time:").split("|")
+            with contextlib.suppress(ValueError):
+                imported[name.strip()] = int(own)
+    return imported
+
+
+def bench_startup(args: Sequence[str], cwd: pathlib.Path | None = None, repeat: int = 5) -> tuple[float, list[str]]:
+    # the best of a few cold starts, minus what a bare interpreter imports anyway
+    bare = _importtime(["-c", "pass"])
+    best = float("inf")
+    lazy: list[str] = []
+    for _ in range(repeat):
+        imported = _importtime(args, cwd)
+        best = min(best, sum(own for name, own in imported.items() if name not in bare) / 1e3)
+        lazy = sorted(name for name in imported if any(name == m or name.startswith(f"{m}.") for m in LAZY))
+    return best, lazy
+
+
+def check_startup(name: str, milliseconds: float, lazy: Sequence[str], budget: float) -> int:
+    mismatches = 0
+    if milliseconds > budget:
+        logger.error("%s: %.1f ms of imports, over the %.0f ms budget", name, milliseconds, budget)
+        mismatches += 1
+    if lazy:
+        logger.error("%s imports %s at startup", name, ", ".join(lazy))
+        mismatches += 1
+    return mismatches
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return int(s.getsockname()[1])
+
+
+def bench_serve(corpus: Sequence[tuple[str, pathlib.Path]], backend: str, requests: int = 50) -> tuple[float, float]:
+    # the corpus' XP notes posted to a warm `pynotas serve`, one keep-alive client, as another tool would
+    notes = [file_path.read_bytes() for broker, file_path in corpus if broker == "xp"]
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "pynotas", "--backend", backend, "serve", "--porta", str(port), "--workers", "2"],
+        env={**os.environ, "PYTHONPATH": str(ROOT)},
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                with contextlib.closing(socket.create_connection(("127.0.0.1", port))):
+                    break
+            except OSError:
+                if time.monotonic() > deadline or server.poll() is not None:
+                    raise
+                time.sleep(0.05)
+        client = http.client.HTTPConnection("127.0.0.1", port)
+        milliseconds = []
+        for index in range(requests):
+            start = time.perf_counter()
+            note = notes[index % len(notes)]
+            client.request("POST", "/notas?corretora=xp", note, {"Content-Type": "application/pdf"})
+            response = client.getresponse()
+            response.read()
+            milliseconds.append((time.perf_counter() - start) * 1000)
+            if response.status != 200:  # noqa: PLR2004
+                msg = f"pynotas serve answered {response.status}"
+                raise RuntimeError(msg)
+        client.close()
+    finally:
+        server.terminate()
+        server.wait()
+    milliseconds.sort()
+    return milliseconds[len(milliseconds) // 2], milliseconds[int(len(milliseconds) * 0.95) - 1]
+
+
+@contextlib.contextmanager
+def _chdir(path: pathlib.Path) -> Iterator[None]:
+    previous = pathlib.Path.cwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def bench_cli(base: pathlib.Path, corpus: Sequence[tuple[str, pathlib.Path]], backend: str, jobs: int) -> Result:
+    from pynotas.__main__ import processar
+
+    for broker in READERS:
+        (base / broker).mkdir(parents=True, exist_ok=True)
+    with _chdir(base.parent):
+        start = time.perf_counter()
+        processar(jobs, None, dict.fromkeys(READERS, backend))
+        seconds = time.perf_counter() - start
+    return Result(f"cli [{backend}, jobs={jobs}]", len(corpus), _pages(corpus), seconds)
+
+
+def _arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument("--notes", type=int, nargs="+", default=[10, 100], help="corpus sizes")
+    parser.add_argument("--trades", type=int, default=3, help="trades per note")
+    parser.add_argument("--pages", type=int, default=1, help="pages per note (more when the trades do not fit)")
+    parser.add_argument("--backend", choices=BACKENDS, action="append", help=f"default {DEFAULT_BACKEND}")
+    parser.add_argument("--jobs", type=int, default=1, help="--jobs for the full cli() run")
+    parser.add_argument("--skip-cli", action="store_true", help="only time the readers and processar_dados")
+    parser.add_argument("--workdir", type=pathlib.Path, help="keep generated corpora here between runs")
+    parser.add_argument("--values", type=int, default=1_000_000, help="decimals for the formatting benchmark")
+    parser.add_argument(
+        "--statement",
+        type=int,
+        default=50_000,
+        help="trades in the statement for the memory benchmark",
+    )
+    parser.add_argument(
+        "--startup-budget",
+        type=float,
+        default=STARTUP_BUDGET,
+        help="fail if importing pynotas.__main__ or a no-op -i run takes longer (ms)",
+    )
+    parser.add_argument(
+        "--serve-budget",
+        type=float,
+        default=SERVE_BUDGET,
+        help="fail if pynotas serve takes longer for a one-page XP note (p95, ms)",
+    )
+    parser.add_argument("--json", type=pathlib.Path, help="also write the results as JSON")
+    return parser.parse_args()
+
+
+def main() -> None:  # noqa: C901
+    args = _arguments()
+    logging.basicConfig(level=logging.WARNING)
+    backends = args.backend or [DEFAULT_BACKEND]
+    results: list[Result] = []
+    mismatches = check_round_trip(min(args.values, 100_000))
+    if mismatches:
+        logger.error("%d decimals do not round-trip", mismatches)
+    print(f"# formatting, {args.values} decimals")  # noqa: T201
+    for result in bench_formatting(args.values):
+        print(result.line())  # noqa: T201
+        results.append(result)
+
+    print(f"# memory, one statement with {args.statement} trades")  # noqa: T201
+    for name, size in bench_memory(args.statement):
+        print(f"{name:<32} {size / 1e6:>9.2f} MB {size / args.statement:>10.1f} B/trade")  # noqa: T201
+
+    print("# startup, python -X importtime")  # noqa: T201
+    milliseconds, lazy = bench_startup(["-c", "import pynotas.__main__"])
+    print(f"{'import pynotas.__main__':<32} {milliseconds:>9.1f} ms")  # noqa: T201
+    mismatches += check_startup("import pynotas.__main__", milliseconds, lazy, args.startup_budget)
+
+    with contextlib.ExitStack() as stack:
+        workdir = args.workdir or pathlib.Path(stack.enter_context(tempfile.TemporaryDirectory()))
+        for notes in args.notes:
+            base = workdir / f"corpus-{notes}-{args.trades}-{args.pages}" / "data"
+            corpus = build_corpus(base, notes, args.trades, args.pages)
+            print(f"# {notes} notes, {args.trades} trades each")  # noqa: T201
+            batch = [*bench_processar_dados(notes, args.trades), bench_detect(corpus)]
+            for backend in backends:
+                batch += bench_readers(corpus, backend)
+                batch += bench_replay(corpus, backend, base.parent / "cache")
+                if not args.skip_cli:
+                    batch.append(bench_cli(base, corpus, backend, args.jobs))
+            for result in batch:
+                print(result.line())  # noqa: T201
+            results += batch
+            for backend in backends if args.pages == 1 and not args.skip_cli else ():
+                p50, p95 = bench_serve(corpus, backend)
+                print(f"{f'serve, one-page xp [{backend}]':<32} {p50:>9.1f} ms p50 {p95:>9.1f} ms p95")  # noqa: T201
+                if p95 > args.serve_budget:
+                    logger.error("pynotas serve: p95 of %.1f ms, over the %.0f ms budget", p95, args.serve_budget)
+                    mismatches += 1
+            # nothing new: -i must answer from the manifest without loading a broker or a PDF backend
+            _python(["-m", "pynotas", "-i"], base.parent)
+            milliseconds, lazy = bench_startup(["-m", "pynotas", "-i"], base.parent)
+            print(f"{'pynotas -i (nothing new)':<32} {milliseconds:>9.1f} ms")  # noqa: T201
+            mismatches += check_startup("pynotas -i", milliseconds, lazy, args.startup_budget)
+            mismatches += check_detect(corpus)
+
+    if args.json:
+        with args.json.open("w") as f:
+            json.dump(
+                [
+                    {**dataclasses.asdict(result), "notes_per_second": result.notes_per_second,
+                     "pages_per_second": result.pages_per_second}
+                    for result in results
+                ],
+                f,
+                indent=2,
+            )
+    if mismatches:
+        sys.exit(
+            f"{mismatches} mismatches: decimal round-trip, detection, startup or serve",
+        )
+
+
+if __name__ == "__main__":
+    main()
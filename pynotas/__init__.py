@@ -1,5 +1,26 @@
-from pynotas.companies.avenue import read_avenue
-from pynotas.companies.nu import read_nu
-from pynotas.companies.xp import read_xp
+import importlib
+from typing import TYPE_CHECKING
 
-__all__ = ["read_avenue", "read_nu", "read_xp"]
+if TYPE_CHECKING:
+    from pynotas.companies.avenue import iter_avenue, read_avenue
+    from pynotas.companies.nu import iter_nu, read_nu
+    from pynotas.companies.xp import iter_xp, read_xp
+
+__all__ = ["iter_avenue", "iter_nu", "iter_xp", "read_avenue", "read_nu", "read_xp"]
+
+# cada leitor puxa o pdfminer: o módulo da corretora só é importado quando alguém usa
+_LEITORES = {
+    "iter_avenue": "pynotas.companies.avenue",
+    "read_avenue": "pynotas.companies.avenue",
+    "iter_nu": "pynotas.companies.nu",
+    "read_nu": "pynotas.companies.nu",
+    "iter_xp": "pynotas.companies.xp",
+    "read_xp": "pynotas.companies.xp",
+}
+
+
+def __getattr__(name: str) -> object:
+    if name not in _LEITORES:
+        msg = f"module {__name__!r} has no attribute {name!r}"
+        raise AttributeError(msg)
+    return getattr(importlib.import_module(_LEITORES[name]), name)
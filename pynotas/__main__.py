@@ -1,65 +1,973 @@
+import argparse
+import contextlib
 import csv
+import datetime as dt
 import logging
 import os
 import pathlib
+import shutil
+import signal
 import sys
-from typing import Callable, Mapping, Sequence, TypedDict
+import time
+from typing import TYPE_CHECKING, Collection, Iterable, Iterator, Mapping, NamedTuple, Sequence, TextIO
 
-from pynotas import read_avenue, read_nu, read_xp
-from pynotas.models import LinhaPlanilha
-from pynotas.utils import CABECALHO, assert1page
+from pynotas import detect, ledger, profiling, registry, watch
+from pynotas.backends import BACKENDS, DEFAULT_BACKEND, PYMUPDF, open_document, preload
+from pynotas.cache import LayoutCache, ParseCache, file_digest
+from pynotas.formatting import DecimalFormatter
+from pynotas.manifest import Manifest
+from pynotas.models import LinhaConvertida, LinhaPlanilha
+from pynotas.parser import DECIMAL, MOTORES, usar_motor
+from pynotas.ptax import PTAX_PATH, Conversor, PtaxTable
+from pynotas.quarentena import QUARENTENA_PATH, Quarentena
+from pynotas.store import STORE_PATH, SqliteStore
+from pynotas.utils import CABECALHO, IntegridadeError, NotaError, substituir
 
-try:
-    log_level = logging.INFO if sys.argv[1] == "-v" else logging.WARNING
-except IndexError:
-    log_level = logging.WARNING
+if TYPE_CHECKING:
+    import concurrent.futures as cf
+
+    from pynotas.parquet import ParquetSink, _Escritor
 
-logging.basicConfig(level=log_level)
 logger = logging.getLogger(__name__)
 
 
-class OptionsType(TypedDict):
-    path: pathlib.Path
-    code: Callable[[pathlib.Path], Sequence[LinhaPlanilha]]
+BASE_PATH = pathlib.Path("data")
+FORMATOS: Sequence[str] = ("csv", "parquet")
+# relatórios em centavos; quantidade e preço médio saem com todas as casas
+RELATORIO = DecimalFormatter(
+    precisoes=dict.fromkeys(
+        ("custo", "vendas", "resultado", "compensado", "base", "imposto", "prejuizo", "darf"),
+        2,
+    ),
+)
 
 
-BASE_PATH = pathlib.Path("data")
-OPTIONS: Mapping[str, OptionsType] = {
-    "xp": {"path": BASE_PATH / "xp", "code": read_xp},
-    "nu": {"path": BASE_PATH / "nu", "code": read_nu},
-    "avenue": {"path": BASE_PATH / "avenue", "code": read_avenue},
-}
+def iter_nota(  # noqa: PLR0913
+    name: str,
+    file_path: pathlib.Path,
+    backend: str | None = None,
+    versao_layout: int | None = None,
+    *,
+    layout: LayoutCache | None = None,
+    digest: str | None = None,
+) -> Iterator[LinhaPlanilha]:
+    etapa = "abrir"
+    try:
+        with profiling.stage("open"):
+            documento = (
+                open_document(file_path, backend)
+                if layout is None
+                else layout.open_document(file_path, backend, digest)
+            )
+        etapa = "ler"
+        with documento:
+            yield from registry.leitor(registry.corretoras()[name])(documento, backend, versao_layout)
+    except IntegridadeError as exc:
+        raise NotaError(
+            file_path,
+            f"{type(exc).__name__}: {exc}",
+            corretora=name,
+            etapa=exc.etapa,
+            esperado=exc.esperado,
+            encontrado=exc.encontrado,
+        ) from exc
+    except Exception as exc:
+        raise NotaError(file_path, f"{type(exc).__name__}: {exc}", corretora=name, etapa=etapa) from exc
+
+
+def ler_nota(  # noqa: PLR0913
+    name: str,
+    file_path: pathlib.Path,
+    backend: str | None = None,
+    versao_layout: int | None = None,
+    *,
+    layout: LayoutCache | None = None,
+    digest: str | None = None,
+) -> Sequence[LinhaPlanilha]:
+    return list(iter_nota(name, file_path, backend, versao_layout, layout=layout, digest=digest))
+
+
+def aquecer(motor: str, backends: Mapping[str, str]) -> None:
+    # para um processo que fica rodando: a primeira nota não paga os imports da corretora
+    # nem do backend
+    usar_motor(motor)
+    for name, corretora in registry.corretoras().items():
+        registry.leitor(corretora)
+        preload(backends[name])
+
+
+def _trabalhador(motor: str, backends: Mapping[str, str]) -> None:
+    # o Ctrl-C chega no grupo todo: quem para é o watch, que desliga o pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    aquecer(motor, backends)
+
+
+@contextlib.contextmanager
+def _pool(
+    jobs: int,
+    motor: str = DECIMAL,
+    backends: Mapping[str, str] | None = None,
+) -> "Iterator[cf.ProcessPoolExecutor | None]":
+    if jobs == 1:
+        yield None
+        return
+    import concurrent.futures as cf
+
+    if backends is None:
+        executor = cf.ProcessPoolExecutor(max_workers=jobs or None, initializer=usar_motor, initargs=(motor,))
+    else:
+        executor = cf.ProcessPoolExecutor(
+            max_workers=jobs or None,
+            initializer=_trabalhador,
+            initargs=(motor, backends),
+        )
+    try:
+        yield executor
+    finally:
+        # a failed note must not wait for (or be buried under) the rest of the backlog
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _notas(path: pathlib.Path, detectadas: Sequence[pathlib.Path] = ()) -> list[tuple[int, pathlib.Path]]:
+    # as notas da pasta da corretora e, depois delas, as que o --inbox reconheceu como dela
+    nomes = sorted(path.iterdir()) if path.is_dir() else []
+    notas = [(index, file_path) for index, file_path in enumerate(nomes) if file_path.name != ".gitkeep"]
+    notas += ((index, file_path) for index, file_path in enumerate(detectadas, len(nomes)))
+    return notas
+
+
+# As notas do --inbox, cada uma com a classificação e o digest. A primeira atualização
+# lê as pastas inteiras; o watch guarda o Inbox entre uma leva e outra e, depois dela,
+# só classifica os caminhos que os eventos trouxeram (a pasta inteira, quando a fila do
+# inotify estoura). O digest também serve de chave do ParseCache, então _planejar não
+# lê a nota de novo.
+class Inbox:
+    def __init__(self, pastas: Sequence[pathlib.Path]) -> None:
+        self.pastas = pastas
+        self.notas: dict[pathlib.Path, tuple[detect.Classificacao | None, str]] = {}
+        self._lidas = False
+
+    def atualizar(self, caminhos: Iterable[pathlib.Path], adiadas: Collection[pathlib.Path] = ()) -> None:
+        if not self.pastas:
+            return
+        if not self._lidas:
+            caminhos, self._lidas = self.pastas, True
+        deteccoes = detect.Deteccoes.load(registry.corretoras().values())
+        for caminho in caminhos:
+            if not any(caminho.is_relative_to(pasta) for pasta in self.pastas):
+                continue
+            if caminho.is_dir():
+                # o que sumiu da pasta sai, o resto é classificado de novo
+                for file_path in [file_path for file_path in self.notas if file_path.is_relative_to(caminho)]:
+                    del self.notas[file_path]
+                file_paths = list(detect.notas(caminho))
+            else:
+                self.notas.pop(caminho, None)
+                file_paths = [caminho] if caminho.is_file() else []
+            for file_path in file_paths:
+                if file_path in adiadas:
+                    continue
+                with profiling.file("inbox", file_path), profiling.stage("detect"):
+                    digest = file_digest(file_path)
+                    if digest not in deteccoes:
+                        deteccoes[digest] = detect.classificar(file_path, registry.corretoras().values())
+                self.notas[file_path] = (deteccoes[digest], digest)
+        deteccoes.save()
+
+    def _ordem(self, file_path: pathlib.Path) -> tuple[int, list[tuple[int, str]]]:
+        # a ordem de detect.notas: pasta do --inbox, e os arquivos de uma pasta antes das subpastas
+        for indice, pasta in enumerate(self.pastas):
+            if file_path.is_relative_to(pasta):
+                *subpastas, nome = file_path.relative_to(pasta).parts
+                return indice, [*((1, subpasta) for subpasta in subpastas), (0, nome)]
+        return len(self.pastas), []
+
+    def detectadas(
+        self,
+        quarentena: Quarentena | None,
+        adiadas: Collection[pathlib.Path] = (),
+    ) -> tuple[dict[str, list[pathlib.Path]], dict[pathlib.Path, str], dict[pathlib.Path, int]]:
+        # uma pasta misturada: cada PDF vai para o leitor da corretora que a primeira página indica
+        detectadas: dict[str, list[pathlib.Path]] = {name: [] for name in registry.corretoras()}
+        digests: dict[pathlib.Path, str] = {}
+        layouts: dict[pathlib.Path, int] = {}
+        if not self.notas:
+            return detectadas, digests, layouts
+        conhecidas = {
+            file_path.resolve() for name in registry.corretoras() for _, file_path in _notas(BASE_PATH / name)
+        }
+        for file_path in sorted(self.notas, key=self._ordem):
+            if file_path.resolve() in conhecidas or file_path in adiadas:
+                continue
+            conhecidas.add(file_path.resolve())
+            classificacao, digest = self.notas[file_path]
+            if classificacao is None:
+                logger.warning("inbox: %s não parece nota de nenhuma corretora, ignorando", file_path)
+                if quarentena is not None:
+                    quarentena.registrar(NotaError(file_path, "corretora não reconhecida", etapa="detectar"))
+                continue
+            logger.debug("inbox: %s é %s, layout %d", file_path, *classificacao)
+            detectadas[classificacao.corretora].append(file_path)
+            digests[file_path] = digest
+            layouts[file_path] = classificacao.versao
+        for name, notas in detectadas.items():
+            if notas:
+                logger.info("inbox: %d notas de %s", len(notas), name)
+        return detectadas, digests, layouts
+
+
+def _caixa(inbox: "Sequence[pathlib.Path] | Inbox", adiadas: Collection[pathlib.Path]) -> Inbox:
+    # o watch passa o Inbox que guarda entre as levas; -i passa as pastas, lidas inteiras aqui
+    if isinstance(inbox, Inbox):
+        return inbox
+    caixa = Inbox(inbox)
+    caixa.atualizar((), adiadas)
+    return caixa
+
+
+class _Leitura(NamedTuple):
+    backends: Mapping[str, str]
+    cache: ParseCache | None
+    chaves: Mapping[pathlib.Path, str]
+    digests: Mapping[pathlib.Path, str]
+    layouts: Mapping[pathlib.Path, int]
+    futuros: "dict[pathlib.Path, cf.Future[Sequence[LinhaPlanilha]]]"
+    conversor: Conversor
+    quarentena: Quarentena | None = None
+
+
+class _Saidas(NamedTuple):
+    store: SqliteStore | None = None
+    colunar: "ParquetSink | None" = None
+
+
+def _linhas(name: str, file_path: pathlib.Path, leitura: _Leitura) -> Iterator[LinhaConvertida]:
+    _, cache, chaves, digests, layouts, futuros, conversor, _ = leitura
+    # o cache guarda as linhas como a nota as tem; o câmbio entra na saída
+    if cache is not None:
+        with profiling.stage("cache"):
+            cacheadas = cache.load(chaves[file_path])
+        if cacheadas is not None:
+            yield from map(conversor, cacheadas)
+            return
+    futuro = futuros.pop(file_path, None)
+    if futuro is not None:
+        linhas_planilha: Iterable[LinhaPlanilha] = futuro.result()
+    else:
+        layout = None if cache is None else cache.layout
+        linhas_planilha = iter_nota(
+            name,
+            file_path,
+            leitura.backends[name],
+            layouts.get(file_path),
+            layout=layout,
+            digest=digests.get(file_path),
+        )
+    if cache is None:
+        yield from map(conversor, linhas_planilha)
+        return
+    emitidas = []
+    for linha in linhas_planilha:
+        emitidas.append(linha)
+        yield conversor(linha)
+    with profiling.stage("cache"):
+        cache.store(chaves[file_path], emitidas)
+
+
+def _nota(name: str, file_path: pathlib.Path, leitura: _Leitura) -> list[LinhaConvertida] | None:
+    # a nota entra inteira ou não entra; com --keep-going, a que falha vai para a quarentena
+    try:
+        linhas_planilha = list(_linhas(name, file_path, leitura))
+    except NotaError as exc:
+        if leitura.quarentena is None:
+            raise
+        leitura.quarentena.registrar(exc)
+        return None
+    if leitura.quarentena is not None:
+        leitura.quarentena.lidas += 1
+    return linhas_planilha
+
+
+def _juntar() -> None:
+    with substituir(BASE_PATH / "all.csv") as all_file:
+        csv.DictWriter(all_file, CABECALHO, dialect="unix").writeheader()
+        for name in registry.corretoras():
+            with contextlib.suppress(FileNotFoundError), (BASE_PATH / (name + ".csv")).open(
+                encoding="utf-8",
+            ) as csv_file:
+                csv_file.readline()
+                shutil.copyfileobj(csv_file, all_file)
+
+
+def _refazer(
+    name: str,
+    notas: Sequence[tuple[int, pathlib.Path]],
+    leitura: _Leitura,
+    saidas: _Saidas,
+    colunar: "_Escritor | None",
+) -> None:
+    store = saidas.store
+    with substituir(BASE_PATH / (name + ".csv")) as csv_file, _transacao(store):
+        csv_writer = csv.DictWriter(csv_file, CABECALHO, dialect="unix")
+        csv_writer.writeheader()
+        if store is not None:
+            store.refazer(registry.corretoras()[name].rotulo)
+        for index, file_path in notas:
+            logger.info("Lendo nota %02d %s...", index + 1, file_path.name)
+            with profiling.file(name, file_path):
+                emitidas = _nota(name, file_path, leitura)
+                if emitidas is None:
+                    continue
+                with profiling.stage("csv"):
+                    csv_writer.writerows(emitidas)
+                if store is not None:
+                    with profiling.stage("sqlite"):
+                        store.gravar(file_path, emitidas)
+                if colunar is not None:
+                    with profiling.stage("parquet"):
+                        colunar.escrever(emitidas)
+            logger.info("Nota %02d salva!", index + 1)
+
+
+def _transacao(store: SqliteStore | None) -> contextlib.AbstractContextManager[None]:
+    return contextlib.nullcontext() if store is None else store.transacao()
+
+
+def _anexar(juntar: bool) -> contextlib.AbstractContextManager[TextIO | None]:  # noqa: FBT001
+    # quando all.csv vai ser refeito por _juntar, as notas novas não são anexadas a ele
+    return contextlib.nullcontext() if juntar else (BASE_PATH / "all.csv").open("a", encoding="utf-8")
+
+
+def _acrescentar(  # noqa: PLR0913
+    name: str,
+    notas: Sequence[tuple[int, pathlib.Path]],
+    leitura: _Leitura,
+    saidas: _Saidas,
+    colunar: "_Escritor | None",
+    manifest: Manifest,
+    all_file: TextIO | None,
+) -> None:
+    store = saidas.store
+    with (BASE_PATH / (name + ".csv")).open("a", encoding="utf-8") as csv_file:
+        csv_writer = csv.DictWriter(csv_file, CABECALHO, dialect="unix")
+        csv_all = None if all_file is None else csv.DictWriter(all_file, CABECALHO, dialect="unix")
+        for index, file_path in notas:
+            logger.info("Lendo nota %02d %s...", index + 1, file_path.name)
+            with profiling.file(name, file_path):
+                # a nota entra inteira ou não entra, para o manifest nunca mentir
+                linhas_planilha = _nota(name, file_path, leitura)
+                if linhas_planilha is None:
+                    continue
+                with profiling.stage("csv"):
+                    csv_writer.writerows(linhas_planilha)
+                    csv_file.flush()
+                    if csv_all is not None and all_file is not None:
+                        csv_all.writerows(linhas_planilha)
+                        all_file.flush()
+                if store is not None:
+                    with profiling.stage("sqlite"), store.transacao():
+                        store.gravar(file_path, linhas_planilha)
+                if colunar is not None:
+                    with profiling.stage("parquet"):
+                        colunar.escrever(linhas_planilha)
+            manifest.record(name, file_path)
+            logger.info("Nota %02d salva!", index + 1)
+
+
+def _cabecalho_atual(csv_path: pathlib.Path) -> bool:
+    with csv_path.open(encoding="utf-8") as csv_file:
+        return next(csv.reader(csv_file, dialect="unix"), None) == list(CABECALHO)
+
+
+def _pendentes(
+    name: str,
+    manifest: Manifest,
+    versao: str,
+    notas: Sequence[tuple[int, pathlib.Path]],
+    *,
+    incremental: bool,
+) -> Sequence[pathlib.Path] | None:
+    # None: a corretora é refeita do zero; lista: só estas notas são acrescentadas
+    if not (BASE_PATH / (name + ".csv")).is_file() or not _cabecalho_atual(BASE_PATH / (name + ".csv")):
+        return None
+    pendentes = manifest.pending(name, versao, [file_path for _, file_path in notas])
+    if pendentes is None:
+        if incremental:
+            logger.info("%s: notas alteradas ou removidas, refazendo %s.csv", name, name)
+    else:
+        logger.info("%s: %d notas novas", name, len(pendentes))
+    return pendentes
+
+
+def _a_ler(
+    notas: Sequence[tuple[int, pathlib.Path]],
+    pendentes: Sequence[pathlib.Path] | None,
+) -> Sequence[tuple[int, pathlib.Path]]:
+    return notas if pendentes is None else [nota for nota in notas if nota[1] in pendentes]
+
+
+def _colunar(
+    colunar: "ParquetSink | None",
+    name: str,
+    pendentes: Sequence[pathlib.Path] | None,
+    notas: Sequence[tuple[int, pathlib.Path]],
+) -> "contextlib.AbstractContextManager[_Escritor | None]":
+    # nada novo e o parquet ainda espelha o CSV: não há o que reescrever
+    if colunar is None or (pendentes is not None and not notas and colunar.atualizado(name)):
+        return contextlib.nullcontext()
+    return colunar.broker(name, anexar=pendentes is not None)
+
+
+def _planejar(  # noqa: PLR0913
+    executor: "cf.ProcessPoolExecutor | None",
+    cache: ParseCache | None,
+    a_ler: Mapping[str, Sequence[tuple[int, pathlib.Path]]],
+    *,
+    versoes: Mapping[str, str],
+    backends: Mapping[str, str],
+    digests: dict[pathlib.Path, str],
+    layouts: Mapping[pathlib.Path, int],
+) -> "tuple[dict[pathlib.Path, str], dict[pathlib.Path, cf.Future[Sequence[LinhaPlanilha]]]]":
+    chaves: dict[pathlib.Path, str] = {}
+    futuros: dict[pathlib.Path, cf.Future[Sequence[LinhaPlanilha]]] = {}
+    for name, notas in a_ler.items():
+        for _, file_path in notas:
+            if cache is not None:
+                with profiling.file(name, file_path), profiling.stage("cache"):
+                    if file_path not in digests:
+                        digests[file_path] = file_digest(file_path)
+                    chaves[file_path] = cache.key(name, versoes[name], digests[file_path])
+                if cache.contains(chaves[file_path]):
+                    continue
+            if executor is not None:
+                futuros[file_path] = executor.submit(
+                    ler_nota,
+                    name,
+                    file_path,
+                    backends[name],
+                    layouts.get(file_path),
+                    layout=None if cache is None else cache.layout,
+                    digest=digests.get(file_path),
+                )
+    return chaves, futuros
+
+
+def _gravar(  # noqa: PLR0913
+    name: str,
+    notas: Sequence[tuple[int, pathlib.Path]],
+    leitura: _Leitura,
+    saidas: _Saidas,
+    manifest: Manifest,
+    *,
+    versao: str,
+    pendentes: Sequence[pathlib.Path] | None,
+    all_file: TextIO | None,
+) -> None:
+    logger.info("%s selecionado.", name)
+    logger.info("Lendo notas...")
+    with _colunar(saidas.colunar, name, pendentes, notas) as colunar:
+        if pendentes is None:
+            _refazer(name, notas, leitura, saidas, colunar)
+            manifest.reset(name, versao)
+            for _, file_path in notas:
+                if leitura.quarentena is None or file_path not in leitura.quarentena:
+                    manifest.record(name, file_path)
+        else:
+            _acrescentar(name, notas, leitura, saidas, colunar, manifest, all_file)
+    logger.info("Fim.")
+
+
+def processar(  # noqa: PLR0913
+    jobs: int = 1,
+    cache: ParseCache | None = None,
+    backends: Mapping[str, str] | None = None,
+    *,
+    incremental: bool = False,
+    ptax: PtaxTable | None = None,
+    motor: str = DECIMAL,
+    saidas: _Saidas | None = None,
+    quarentena: Quarentena | None = None,
+    inbox: "Sequence[pathlib.Path] | Inbox" = (),
+    executor: "cf.ProcessPoolExecutor | None" = None,
+    adiadas: Collection[pathlib.Path] = (),
+) -> None:
+
+    corretoras = registry.corretoras()
+    saidas = saidas or _Saidas()
+    backends = {name: (backends or {}).get(name, DEFAULT_BACKEND) for name in corretoras}
+    versoes = {name: f"{corretora.versao}-{backends[name]}" for name, corretora in corretoras.items()}
+    if motor != DECIMAL:
+        # as taxas por ativo mudam com o motor: cache e manifest não podem misturar os dois
+        versoes = {name: f"{versao}-{motor}" for name, versao in versoes.items()}
+    usar_motor(motor)
+    manifest = Manifest.load() if incremental else Manifest()
+    detectadas, digests, layouts = _caixa(inbox, adiadas).detectadas(quarentena, adiadas)
+    # adiadas: as que o watch ainda vê sendo gravadas ficam para a próxima leva
+    notas = {
+        name: [nota for nota in _notas(BASE_PATH / name, detectadas[name]) if nota[1] not in adiadas]
+        for name in corretoras
+    }
+
+    if saidas.store is not None and saidas.store.novo:
+        logger.info("store: %s novo, refazendo todas as corretoras", saidas.store.path)
+        pendentes: dict[str, Sequence[pathlib.Path] | None] = dict.fromkeys(corretoras)
+    else:
+        pendentes = {
+            name: _pendentes(name, manifest, versoes[name], notas[name], incremental=incremental)
+            for name in corretoras
+        }
+    juntar = any(pendente is None for pendente in pendentes.values()) or not (BASE_PATH / "all.csv").is_file()
+    a_ler = {name: _a_ler(notas[name], pendentes[name]) for name in corretoras}
+
+    # o watch mantém um pool aquecido entre uma leva de notas e outra
+    with _pool(jobs, motor) if executor is None else contextlib.nullcontext(executor) as workers:
+        chaves, futuros = _planejar(
+            workers, cache, a_ler, versoes=versoes, backends=backends, digests=digests, layouts=layouts,
+        )
+        leitura = _Leitura(backends, cache, chaves, digests, layouts, futuros, Conversor(ptax), quarentena)
+
+        try:
+            with _anexar(juntar) as all_file:
+                for name in corretoras:
+                    _gravar(
+                        name,
+                        a_ler[name],
+                        leitura,
+                        saidas,
+                        manifest,
+                        versao=versoes[name],
+                        pendentes=pendentes[name],
+                        all_file=all_file,
+                    )
+        finally:
+            # all.csv é sempre a soma dos CSVs por corretora, mesmo se uma nota falhar no meio
+            if juntar:
+                _juntar()
+            if saidas.colunar is not None and (saidas.colunar.alterado or not saidas.colunar.path("all").is_file()):
+                saidas.colunar.juntar(corretoras)
+            manifest.save()
+
+    if cache is not None:
+        cache.evict()
+
+
+def _backends(parser: argparse.ArgumentParser, valores: Sequence[str]) -> dict[str, str]:
+    backends: dict[str, str] = {}
+    for valor in valores:
+        name, _, backend = valor.rpartition("=")
+        if backend not in BACKENDS or (name and name not in registry.corretoras()):
+            parser.error(f"--backend inválido: {valor}")
+        for corretora in [name] if name else registry.corretoras():
+            backends[corretora] = backend
+    return backends
+
+
+def _data(valor: str) -> dt.date:
+    try:
+        return dt.datetime.strptime(valor, "%d/%m/%Y").date()  # noqa: DTZ007
+    except ValueError:
+        msg = f"data inválida: {valor}, use DD/MM/AAAA"
+        raise argparse.ArgumentTypeError(msg) from None
+
+
+def _ptax(path: pathlib.Path) -> PtaxTable | None:
+    if not path.is_file():
+        return None
+    return PtaxTable.load(path)
+
+
+def _parquet() -> "ParquetSink":
+    try:
+        from pynotas.parquet import ParquetSink
+    except ImportError:
+        logger.error("--format parquet precisa do pyarrow: poetry install -E parquet")  # noqa: TRY400
+        raise SystemExit(1) from None
+    return ParquetSink(BASE_PATH)
+
+
+def _ledger() -> ledger.Ledger:
+    return ledger.atualizar(BASE_PATH / "all.csv", BASE_PATH)
+
+
+def _ledger_existente() -> ledger.Ledger:
+    if not (BASE_PATH / "all.csv").is_file():
+        logger.error("%s não existe, rode pynotas antes", BASE_PATH / "all.csv")
+        raise SystemExit(1)
+    return _ledger()
+
+
+def _positions(data: dt.date) -> None:
+    index = _ledger_existente().index
+    carteira = {} if index is None else index.at(data)
+    escritor = csv.DictWriter(sys.stdout, ("ativo", "quantidade", "custo", "preco_medio"), dialect="unix")
+    escritor.writeheader()
+    for ativo, posicao in sorted(carteira.items()):
+        escritor.writerow(
+            {
+                "ativo": ativo,
+                **RELATORIO.row(
+                    {"quantidade": posicao.quantidade, "custo": posicao.custo, "preco_medio": posicao.preco_medio},
+                ),
+            },
+        )
+
+
+def _darf(ano: int | None) -> None:
+    rollup = _ledger_existente().rollup
+    escritor = csv.DictWriter(
+        sys.stdout,
+        ("mes", "classe", "vendas", "resultado", "isento", "compensado", "base", "imposto", "prejuizo", "darf"),
+        dialect="unix",
+    )
+    escritor.writeheader()
+    for darf in rollup or ():
+        if ano is not None and not darf.mes.startswith(f"{ano}-"):
+            continue
+        for a in darf.apuracoes:
+            valores = RELATORIO.row(
+                {
+                    "vendas": a.vendas,
+                    "resultado": a.resultado,
+                    "compensado": a.compensado,
+                    "base": a.base,
+                    "imposto": a.imposto,
+                    "prejuizo": a.prejuizo,
+                },
+            )
+            escritor.writerow({"mes": darf.mes, "classe": a.classe, "isento": "sim" if a.isento else "não", **valores})
+        escritor.writerow(
+            {"mes": darf.mes, "classe": "Total", **RELATORIO.row({"imposto": darf.imposto, "darf": darf.a_pagar})},
+        )
+
+
+def _vigiar(args: argparse.Namespace, saidas: _Saidas) -> None:
+    from concurrent.futures import BrokenExecutor
+
+    # como -i, mas o processo fica: corretoras, backend, cache e pool já estão carregados
+    # quando a próxima nota chega. Uma nota que falha vai para a quarentena e o watch segue.
+    cache = None if args.no_cache else ParseCache(rebuild=args.rebuild_cache)
+    backends = {name: args.backend.get(name, DEFAULT_BACKEND) for name in registry.corretoras()}
+    ptax = _ptax(args.ptax)
+    pastas = [BASE_PATH / name for name in registry.corretoras()]
+    for pasta in pastas:
+        pasta.mkdir(parents=True, exist_ok=True)
+    pastas += (pasta for pasta in args.inbox if pasta.is_dir())
+    aquecer(args.rateio, backends)
+
+    # só os caminhos de cada evento são classificados de novo
+    inbox = Inbox(args.inbox)
+
+    with _pool(args.jobs, args.rateio, backends) as executor:
+
+        def ler(prontos: Sequence[pathlib.Path], adiadas: Collection[pathlib.Path]) -> None:
+            if prontos:
+                logger.info("watch: %d notas novas, alteradas ou removidas", len(prontos))
+            inicio = time.perf_counter()
+            quarentena = Quarentena(args.keep_going or QUARENTENA_PATH)
+            try:
+                inbox.atualizar(prontos, adiadas)
+                processar(
+                    args.jobs,
+                    cache,
+                    backends,
+                    incremental=True,
+                    ptax=ptax,
+                    motor=args.rateio,
+                    saidas=saidas,
+                    quarentena=quarentena,
+                    inbox=inbox,
+                    executor=executor,
+                    adiadas=adiadas,
+                )
+                if args.ledger:
+                    _ledger()
+            except BrokenExecutor:
+                raise
+            except Exception:
+                logger.exception("watch: erro lendo as notas, esperando as próximas")
+            finally:
+                quarentena.salvar()
+            if quarentena:
+                logger.error("watch: %d notas em quarentena, veja %s", len(quarentena), quarentena.path)
+            logger.info("watch: em dia (%.2fs)", time.perf_counter() - inicio)
+
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        try:
+            watch.observar(pastas, ler, espera=args.espera, intervalo=args.intervalo, polling=args.polling)
+        except KeyboardInterrupt:
+            logger.info("watch: parando")
+
+
+def _servir(args: argparse.Namespace) -> None:
+    import concurrent.futures as cf
+
+    from pynotas import serve
+
+    # workers criados (fork) já com corretoras e backend importados, antes do primeiro pedido
+    backends = {name: args.backend.get(name, DEFAULT_BACKEND) for name in registry.corretoras()}
+    aquecer(args.rateio, backends)
+    # sem ?corretora=, a primeira página diz de quem é a nota, lida com o pymupdf
+    preload(PYMUPDF)
+    workers = args.workers or os.cpu_count() or 1
+    executor = cf.ProcessPoolExecutor(max_workers=workers, initializer=_trabalhador, initargs=(args.rateio, backends))
+    try:
+        for futuro in [executor.submit(os.getpid) for _ in range(workers)]:
+            futuro.result()
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        serve.servir(
+            serve.Servico(executor, ler_nota, backends, workers, args.fila, args.timeout, args.tamanho_maximo),
+            args.host,
+            args.porta,
+            args.unix,
+        )
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _argumentos() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="pynotas")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        metavar="N",
+        help="processos lendo notas em paralelo (0 = um por CPU)",
+    )
+    parser.add_argument(
+        "--backend",
+        action="append",
+        default=[],
+        metavar="[CORRETORA=]BACKEND",
+        help=f"extrator de PDF ({', '.join(BACKENDS)}), para todas ou só uma corretora; padrão {DEFAULT_BACKEND}",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const=BASE_PATH / "profile.json",
+        type=pathlib.Path,
+        metavar="ARQUIVO",
+        help="salva em JSON o tempo gasto em cada etapa, por nota e por corretora",
+    )
+    parser.add_argument(
+        "--profile-note",
+        type=pathlib.Path,
+        metavar="NOTA",
+        help="salva um pstats (cProfile) da leitura desta nota ao lado dela",
+    )
+    cache = parser.add_mutually_exclusive_group()
+    cache.add_argument("--no-cache", action="store_true", help="não lê nem grava o cache de notas")
+    cache.add_argument("--rebuild-cache", action="store_true", help="ignora o cache e regrava todas as notas")
+    parser.add_argument(
+        "-i",
+        "--incremental",
+        action="store_true",
+        help="só acrescenta as notas novas aos CSVs; refaz a corretora com nota alterada ou removida",
+    )
+    parser.add_argument(
+        "--ledger",
+        action="store_true",
+        help="gera data/ledger.csv com quantidade_final e preco_medio acumulados, em ordem de data, "
+        "e data/ganhos.csv com o resultado de cada venda",
+    )
+    parser.add_argument(
+        "--ptax",
+        type=pathlib.Path,
+        default=PTAX_PATH,
+        metavar="ARQUIVO",
+        help=f"cotações PTAX do dólar (CSV do Banco Central) para as colunas em reais do exterior; padrão {PTAX_PATH}",
+    )
+    parser.add_argument(
+        "--sqlite",
+        nargs="?",
+        const=STORE_PATH,
+        type=pathlib.Path,
+        metavar="ARQUIVO",
+        help=f"também grava as linhas num banco SQLite, com uma linha por operação e a nota de origem; "
+        f"padrão {STORE_PATH}",
+    )
+    parser.add_argument(
+        "--format",
+        action="append",
+        default=["csv"],
+        choices=FORMATOS,
+        help="formato extra das saídas por corretora e de all; parquet grava data/*.parquet com colunas tipadas "
+        "(precisa do pyarrow). Os CSVs são sempre gravados",
+    )
+    parser.add_argument(
+        "--rateio",
+        choices=MOTORES,
+        default=DECIMAL,
+        help="como a taxa da nota é dividida entre os ativos: decimal (proporcional, com todas as casas) "
+        "ou centavos (inteiros, e os centavos que sobram vão para os maiores restos)",
+    )
+    parser.add_argument(
+        "--inbox",
+        action="append",
+        default=[],
+        type=pathlib.Path,
+        metavar="PASTA",
+        help="também lê os PDFs desta pasta (e subpastas), com as corretoras misturadas: a primeira página de "
+        "cada um diz de qual corretora ele é",
+    )
+    parser.add_argument(
+        "--keep-going",
+        nargs="?",
+        const=QUARENTENA_PATH,
+        type=pathlib.Path,
+        metavar="ARQUIVO",
+        help="uma nota que falha vai para a quarentena e as outras seguem; o relatório em JSON "
+        f"(arquivo, corretora, etapa, esperado e encontrado) vai para ARQUIVO, padrão {QUARENTENA_PATH}",
+    )
+    comandos = parser.add_subparsers(dest="comando", metavar="COMANDO")
+    servir = comandos.add_parser(
+        "serve",
+        help="serviço HTTP local que lê uma nota por pedido e devolve as linhas em JSON, com workers já aquecidos "
+        "(POST /notas com o PDF no corpo, ou /notas?path=ARQUIVO; ?corretora= e ?backend= são opcionais)",
+    )
+    servir.add_argument("--host", default="127.0.0.1", help="padrão 127.0.0.1")
+    servir.add_argument("--porta", type=int, default=8765, help="padrão 8765 (0 = qualquer uma livre)")
+    servir.add_argument("--unix", type=pathlib.Path, metavar="SOCKET", help="atende num socket Unix em vez de TCP")
+    servir.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        metavar="N",
+        help="processos lendo notas ao mesmo tempo (0 = um por CPU)",
+    )
+    servir.add_argument(
+        "--fila",
+        type=int,
+        default=16,
+        metavar="N",
+        help="notas esperando um worker; com a fila cheia o pedido volta na hora com 503. Padrão 16",
+    )
+    servir.add_argument(
+        "--timeout",
+        type=float,
+        default=30.0,
+        metavar="SEGUNDOS",
+        help="tempo máximo de um pedido (504 depois disso); padrão 30",
+    )
+    servir.add_argument(
+        "--tamanho-maximo",
+        type=int,
+        default=20 * 1024 * 1024,
+        metavar="BYTES",
+        help="maior PDF aceito no corpo do POST (413 acima disso); padrão 20 MiB",
+    )
+    positions = comandos.add_parser(
+        "positions",
+        help="carteira numa data, a partir de all.csv (não lê nenhum PDF)",
+    )
+    positions.add_argument("--at", required=True, type=_data, metavar="DD/MM/AAAA")
+    darf = comandos.add_parser(
+        "darf",
+        help="imposto de swing trade por mês e classe de ativo, com prejuízo a compensar (não lê nenhum PDF)",
+    )
+    darf.add_argument("--ano", type=int, metavar="AAAA", help="só os meses deste ano")
+    vigiar = comandos.add_parser(
+        "watch",
+        help="fica rodando e, como -i, lê as notas que chegam em data/<corretora> (e no --inbox) assim que "
+        "terminam de ser gravadas; uma nota que falha vai para a quarentena",
+    )
+    vigiar.add_argument(
+        "--espera",
+        type=float,
+        default=watch.ESPERA,
+        metavar="SEGUNDOS",
+        help=f"quanto tempo uma nota precisa ficar sem mudar antes de ser lida; padrão {watch.ESPERA}",
+    )
+    vigiar.add_argument(
+        "--polling",
+        action="store_true",
+        help="relê as pastas em vez de usar o inotify (pasta de rede, sistema sem inotify)",
+    )
+    vigiar.add_argument(
+        "--intervalo",
+        type=float,
+        default=watch.INTERVALO,
+        metavar="SEGUNDOS",
+        help=f"de quanto em quanto tempo as pastas são relidas sem o inotify; padrão {watch.INTERVALO}",
+    )
+    args = parser.parse_args()
+    if args.jobs < 0:
+        parser.error("--jobs deve ser >= 0")
+    if args.comando == "serve" and (args.workers < 0 or args.fila < 0):
+        parser.error("--workers e --fila devem ser >= 0")
+    args.backend = _backends(parser, args.backend)
+    return args
+
+
+def _subcomando(args: argparse.Namespace) -> bool:
+    if args.comando == "positions":
+        _positions(args.at)
+    elif args.comando == "darf":
+        _darf(args.ano)
+    elif args.comando == "serve":
+        _servir(args)
+    else:
+        return False
+    return True
+
+
+def _profiler(args: argparse.Namespace) -> profiling.Profiler | None:
+    if not args.profile and not args.profile_note:
+        return None
+    profiler = profiling.Profiler(args.profile_note)
+    profiling.activate(profiler)
+    if args.jobs != 1:
+        logger.warning("--profile só mede o processo principal, usando --jobs 1")
+        args.jobs = 1
+    return profiler
 
 
 def cli() -> None:
+    args = _argumentos()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    if _subcomando(args):
+        return
+
+    profiler = _profiler(args)
+    saidas = _Saidas(
+        None if args.sqlite is None else SqliteStore(args.sqlite),
+        _parquet() if "parquet" in args.format else None,
+    )
+    # o watch tem uma quarentena por leva de notas
+    quarentena = None if args.keep_going is None or args.comando == "watch" else Quarentena(args.keep_going)
+    try:
+        if args.comando == "watch":
+            _vigiar(args, saidas)
+        else:
+            processar(
+                args.jobs,
+                None if args.no_cache else ParseCache(rebuild=args.rebuild_cache),
+                args.backend,
+                incremental=args.incremental,
+                ptax=_ptax(args.ptax),
+                motor=args.rateio,
+                saidas=saidas,
+                quarentena=quarentena,
+                inbox=args.inbox,
+            )
+            if args.ledger:
+                _ledger()
+    except NotaError as exc:
+        logger.error("Erro ao ler nota %s", exc)  # noqa: TRY400
+        raise SystemExit(1) from exc
+    finally:
+        if quarentena is not None:
+            quarentena.salvar()
+        if saidas.store is not None:
+            saidas.store.close()
+        if profiler is not None and args.profile:
+            profiler.write(args.profile)
+    if quarentena:
+        logger.error("%d notas em quarentena, veja %s", len(quarentena), quarentena.path)
+        raise SystemExit(1)
+
 
-    with (BASE_PATH / "all.csv").open("w") as all_file:
-        csv_all = csv.DictWriter(all_file, CABECALHO, dialect="unix")
-        csv_all.writeheader()
-
-        for name, option in OPTIONS.items():
-
-            path = option["path"]
-            code = option["code"]
-
-            logger.info("%s selecionado.", name)
-            logger.info("Lendo notas...")
-
-            with (path.parent / (name + ".csv")).open("w") as csv_file:
-                csv_writer = csv.DictWriter(csv_file, CABECALHO, dialect="unix")
-                csv_writer.writeheader()
-                for index, file_name in enumerate(sorted(os.listdir(path))):
-                    if file_name == ".gitkeep":
-                        continue
-                    logger.info("Lendo nota %02d %s...", index + 1, file_name)
-                    file_path = path / file_name
-
-                    if name != "avenue":
-                        assert1page(file_path)
-                    linhas_planilha = code(file_path)
-                    logger.info("Salvando nota %02d...", index + 1)
-                    for linha in linhas_planilha:
-                        csv_writer.writerow(linha)
-                        csv_all.writerow(linha)
-                    logger.info("Salvo!")
-            logger.info("Fim.")
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,209 @@
+import abc
+import contextlib
+import importlib
+import io
+import pathlib
+import sys
+from types import TracebackType
+from typing import TYPE_CHECKING, Any, Callable, Final, Iterable, Iterator, Mapping, NamedTuple, Sequence, cast
+
+from pynotas import profiling
+
+if TYPE_CHECKING:
+    from pynotas.models import TextElement
+
+PDFMINER: Final[str] = "pdfminer"
+PYMUPDF: Final[str] = "pymupdf"
+DEFAULT_BACKEND: Final[str] = PDFMINER
+
+
+class TextBox(NamedTuple):
+    x0: float
+    y0: float
+    x1: float
+    y1: float
+    text: str
+
+    def get_text(self) -> str:
+        return self.text
+
+
+class NonTextBox(NamedTuple):
+    x0: float
+    y0: float
+    x1: float
+    y1: float
+
+
+def is_text_box(element: object) -> bool:
+    if isinstance(element, TextBox):
+        return True
+    # pdfminer só é importado quando um PdfminerDocument é aberto; antes disso, nenhuma
+    # caixa pode ser dele
+    layout = sys.modules.get("pdfminer.layout")
+    return layout is not None and isinstance(element, layout.LTTextBoxHorizontal)
+
+
+class Document(abc.ABC):
+    def __init__(self, file_path: pathlib.Path) -> None:
+        self.file_path = file_path
+
+    @abc.abstractmethod
+    def pages(self) -> Iterator[Iterable["TextElement"]]: ...
+
+    # o ReplayDocument não tem arquivo aberto para fechar
+    def close(self) -> None:  # noqa: B027
+        pass
+
+    def __enter__(self) -> "Document":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+
+class PdfminerDocument(Document):
+    def __init__(self, file_path: pathlib.Path) -> None:
+        from pdfminer.pdfdocument import PDFDocument
+        from pdfminer.pdfparser import PDFParser
+
+        super().__init__(file_path)
+        # one read of the whole note, then the xref and catalog are parsed once, before
+        # layout analysis walks the page tree
+        self._stream = io.BytesIO(file_path.read_bytes())
+        self._document = PDFDocument(PDFParser(self._stream))
+
+    def pages(self) -> Iterator[Iterable["TextElement"]]:
+        from pdfminer.converter import PDFPageAggregator
+        from pdfminer.layout import LAParams
+        from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+        from pdfminer.pdfpage import PDFPage
+
+        resource_manager = PDFResourceManager()
+        device = PDFPageAggregator(resource_manager, laparams=LAParams())
+        interpreter = PDFPageInterpreter(resource_manager, device)
+        for page in PDFPage.create_pages(self._document):
+            interpreter.process_page(page)
+            yield cast("Iterable[TextElement]", device.get_result())
+
+    def close(self) -> None:
+        self._stream.close()
+
+
+class PymupdfDocument(Document):
+    def __init__(self, file_path: pathlib.Path) -> None:
+        import pymupdf
+
+        super().__init__(file_path)
+        self._document: Any = pymupdf.open(file_path)  # type: ignore[no-untyped-call]
+
+    def pages(self) -> Iterator[Iterable["TextElement"]]:
+        for page in self._document:
+            elements: list[TextBox | NonTextBox] = []
+            others: list[TextBox | NonTextBox] = []
+            for x0, y0, x1, y1, text, _, block_type in page.get_text("blocks", sort=True):
+                if block_type == 0:
+                    elements.append(TextBox(x0, y0, x1, y1, text))
+                else:
+                    others.append(NonTextBox(x0, y0, x1, y1))
+            # pdfminer yields figures, images and vector graphics after every text box,
+            # and the readers rely on hitting one of them to know a table has ended
+            others += (NonTextBox(*drawing["rect"]) for drawing in page.get_cdrawings())
+            yield cast("Iterable[TextElement]", elements + others)
+
+    def close(self) -> None:
+        self._document.close()
+
+
+def _box(element: Any) -> TextBox | NonTextBox:  # noqa: ANN401
+    if is_text_box(element):
+        return TextBox(element.x0, element.y0, element.x1, element.y1, element.get_text())
+    return NonTextBox(element.x0, element.y0, element.x1, element.y1)
+
+
+class RecordingDocument(Document):
+    def __init__(
+        self,
+        document: Document,
+        on_complete: Callable[[Sequence[Sequence[TextBox | NonTextBox]]], None],
+    ) -> None:
+        super().__init__(document.file_path)
+        self._document = document
+        self._on_complete = on_complete
+
+    def pages(self) -> Iterator[Iterable["TextElement"]]:
+        recorded = []
+        for page in self._document.pages():
+            elements = [_box(element) for element in page]
+            recorded.append(elements)
+            yield cast("Iterable[TextElement]", elements)
+        # only a note read to the last page is worth replaying
+        self._on_complete(recorded)
+
+    def close(self) -> None:
+        self._document.close()
+
+
+class ReplayDocument(Document):
+    def __init__(self, file_path: pathlib.Path, pages: Sequence[Sequence[TextBox | NonTextBox]]) -> None:
+        super().__init__(file_path)
+        self._pages = pages
+
+    def pages(self) -> Iterator[Iterable["TextElement"]]:
+        for page in self._pages:
+            yield cast("Iterable[TextElement]", page)
+
+
+BACKENDS: Final[Mapping[str, type[Document]]] = {
+    PDFMINER: PdfminerDocument,
+    PYMUPDF: PymupdfDocument,
+}
+
+
+# o que cada backend importa na primeira nota: quem fica rodando (watch) paga isso antes
+# da primeira nota chegar
+MODULES: Final[Mapping[str, Sequence[str]]] = {
+    PDFMINER: (
+        "pdfminer.converter",
+        "pdfminer.layout",
+        "pdfminer.pdfdocument",
+        "pdfminer.pdfinterp",
+        "pdfminer.pdfpage",
+        "pdfminer.pdfparser",
+    ),
+    PYMUPDF: ("pymupdf",),
+}
+
+
+def preload(backend: str | None = None) -> None:
+    for module in MODULES[backend or DEFAULT_BACKEND]:
+        importlib.import_module(module)
+
+
+def open_document(file_path: pathlib.Path, backend: str | None = None) -> Document:
+    try:
+        document = BACKENDS[backend or DEFAULT_BACKEND]
+    except KeyError:
+        msg = f"unknown PDF backend {backend!r}, expected one of {', '.join(BACKENDS)}"
+        raise ValueError(msg) from None
+    return document(file_path)
+
+
+def extract_pages(
+    source: "pathlib.Path | Document",
+    backend: str | None = None,
+) -> Iterator[Iterable["TextElement"]]:
+    with contextlib.ExitStack() as stack:
+        document = source if isinstance(source, Document) else stack.enter_context(open_document(source, backend))
+        pages = document.pages()
+        while True:
+            with profiling.stage("layout"):
+                page = next(pages, None)
+            if page is None:
+                return
+            yield page
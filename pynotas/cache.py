@@ -0,0 +1,238 @@
+import datetime as dt
+import functools
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import struct
+import time
+import zlib
+from typing import Final, Sequence
+
+from pynotas.backends import (
+    DEFAULT_BACKEND,
+    Document,
+    NonTextBox,
+    RecordingDocument,
+    ReplayDocument,
+    TextBox,
+    open_document,
+)
+from pynotas.models import LinhaPlanilha
+from pynotas.utils import temporario
+
+logger = logging.getLogger(__name__)
+
+CACHE_PATH: Final[pathlib.Path] = pathlib.Path("data") / ".cache"
+MAX_BYTES: Final[int] = 256 * 1024 * 1024
+MAX_AGE: Final[dt.timedelta] = dt.timedelta(days=365)
+_CHUNK: Final[int] = 1024 * 1024
+
+
+LAYOUT_FORMAT: Final[str] = "1"
+_LAYOUT_MAGIC: Final[bytes] = b"PNLT"
+_PAGE: Final[struct.Struct] = struct.Struct("<I")
+_BOX: Final[struct.Struct] = struct.Struct("<B4fI")
+
+Page = Sequence[TextBox | NonTextBox]
+
+
+def file_digest(file_path: pathlib.Path) -> str:
+    sha = hashlib.sha256()
+    with file_path.open("rb") as f:
+        while chunk := f.read(_CHUNK):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def encode_layout(pages: Sequence[Page]) -> bytes:
+    body = bytearray()
+    for page in pages:
+        body += _PAGE.pack(len(page))
+        for box in page:
+            text = box.text.encode() if isinstance(box, TextBox) else b""
+            body += _BOX.pack(isinstance(box, TextBox), box.x0, box.y0, box.x1, box.y1, len(text))
+            body += text
+    return _LAYOUT_MAGIC + zlib.compress(body)
+
+
+def decode_layout(data: bytes) -> Sequence[Page]:
+    if not data.startswith(_LAYOUT_MAGIC):
+        msg = "not a layout cache entry"
+        raise ValueError(msg)
+    body = zlib.decompress(data.removeprefix(_LAYOUT_MAGIC))
+    pages = []
+    offset = 0
+    while offset < len(body):
+        (count,) = _PAGE.unpack_from(body, offset)
+        offset += _PAGE.size
+        page: list[TextBox | NonTextBox] = []
+        for _ in range(count):
+            kind, x0, y0, x1, y1, size = _BOX.unpack_from(body, offset)
+            offset += _BOX.size
+            if kind:
+                fim = offset + size
+                page.append(TextBox(x0, y0, x1, y1, body[offset:fim].decode()))
+                offset = fim
+            else:
+                page.append(NonTextBox(x0, y0, x1, y1))
+        pages.append(page)
+    return pages
+
+
+class _DiskCache:
+    NAME = ""
+    SUFFIX = ""
+
+    def __init__(
+        self,
+        path: pathlib.Path,
+        *,
+        rebuild: bool = False,
+        max_bytes: int = MAX_BYTES,
+        max_age: dt.timedelta = MAX_AGE,
+    ) -> None:
+        self.path = path
+        self.rebuild = rebuild
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def _entry(self, key: str) -> pathlib.Path:
+        return self.path / f"{key}{self.SUFFIX}"
+
+    def contains(self, key: str) -> bool:
+        return not self.rebuild and self._entry(key).is_file()
+
+    def _read(self, key: str) -> bytes | None:
+        if self.rebuild:
+            self.misses += 1
+            return None
+        entry = self._entry(key)
+        try:
+            data = entry.read_bytes()
+        except OSError:
+            self.misses += 1
+            return None
+        os.utime(entry)  # eviction is least-recently-used
+        self.hits += 1
+        return data
+
+    def _write(self, key: str, data: bytes) -> None:
+        with temporario(self._entry(key)) as tmp_path:
+            tmp_path.write_bytes(data)
+
+    def evict(self) -> int:
+        now = time.time()
+        entries = []
+        removed = 0
+        for entry in self.path.glob(f"*{self.SUFFIX}"):
+            stat = entry.stat()
+            if now - stat.st_mtime > self.max_age.total_seconds():
+                entry.unlink(missing_ok=True)
+                removed += 1
+            else:
+                entries.append((stat.st_mtime, stat.st_size, entry))
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            entry.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        logger.info("%s: %d hits, %d misses, %d removidos", self.NAME, self.hits, self.misses, removed)
+        return removed
+
+
+# The text boxes pdfminer (or PyMuPDF) extracts from a note, page by page. This is
+# the expensive part of a run and it does not depend on the broker parsers, so a
+# parser fix replays every note from here instead of laying the PDFs out again.
+class LayoutCache(_DiskCache):
+    NAME = "layout"
+    SUFFIX = ".layout"
+
+    def __init__(
+        self,
+        path: pathlib.Path = CACHE_PATH / "layout",
+        *,
+        rebuild: bool = False,
+        max_bytes: int = MAX_BYTES,
+        max_age: dt.timedelta = MAX_AGE,
+    ) -> None:
+        super().__init__(path, rebuild=rebuild, max_bytes=max_bytes, max_age=max_age)
+
+    @staticmethod
+    def key(backend: str, digest: str) -> str:
+        return f"{backend}-{LAYOUT_FORMAT}-{digest}"
+
+    def load(self, key: str) -> Sequence[Page] | None:
+        data = self._read(key)
+        if data is None:
+            return None
+        try:
+            return decode_layout(data)
+        except (ValueError, struct.error, zlib.error):
+            self.hits -= 1
+            self.misses += 1
+            return None
+
+    def store(self, key: str, pages: Sequence[Page]) -> None:
+        self._write(key, encode_layout(pages))
+
+    def open_document(self, file_path: pathlib.Path, backend: str | None = None, digest: str | None = None) -> Document:
+        # quem já tem o hash da nota (a chave do ParseCache) o repassa: o PDF não é lido de novo
+        backend = backend or DEFAULT_BACKEND
+        key = self.key(backend, digest or file_digest(file_path))
+        pages = self.load(key)
+        if pages is not None:
+            return ReplayDocument(file_path, pages)
+        return RecordingDocument(open_document(file_path, backend), functools.partial(self.store, key))
+
+
+# Broker notes never change once issued, so an entry only goes stale when the broker
+# parser changes: bump that module's PARSER_VERSION and the old entries age out.
+class ParseCache(_DiskCache):
+    NAME = "cache"
+    SUFFIX = ".json"
+
+    def __init__(
+        self,
+        path: pathlib.Path = CACHE_PATH,
+        *,
+        rebuild: bool = False,
+        max_bytes: int = MAX_BYTES,
+        max_age: dt.timedelta = MAX_AGE,
+        layout: bool = True,
+    ) -> None:
+        super().__init__(path, rebuild=rebuild, max_bytes=max_bytes, max_age=max_age)
+        self.layout = (
+            LayoutCache(path / "layout", rebuild=rebuild, max_bytes=max_bytes, max_age=max_age) if layout else None
+        )
+
+    @staticmethod
+    def key(broker: str, version: str, digest: str) -> str:
+        return f"{broker}-{version}-{digest}"
+
+    def load(self, key: str) -> Sequence[LinhaPlanilha] | None:
+        data = self._read(key)
+        if data is None:
+            return None
+        try:
+            rows: list[LinhaPlanilha] = json.loads(data)
+        except ValueError:
+            self.hits -= 1
+            self.misses += 1
+            return None
+        return rows
+
+    def store(self, key: str, rows: Sequence[LinhaPlanilha]) -> None:
+        self._write(key, json.dumps(list(rows), ensure_ascii=False).encode())
+
+    def evict(self) -> int:
+        removed = super().evict()
+        if self.layout is not None:
+            removed += self.layout.evict()
+        return removed
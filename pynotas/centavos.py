@@ -0,0 +1,122 @@
+import array
+import decimal as dec
+import heapq
+import logging
+from typing import TYPE_CHECKING, Final, MutableMapping
+
+from pynotas.models import ESCALA, inteiros
+from pynotas.parser import COMPRA, VENDA
+from pynotas.utils import IntegridadeError, assert_almost_equal
+
+if TYPE_CHECKING:
+    from pynotas.models import Planilha, ProcessedDataType
+
+logger = logging.getLogger(__name__)
+
+ESCALA_DINHEIRO: Final[int] = 2
+# totais de Negocios vêm em ESCALA casas; centavos são ESCALA_DINHEIRO
+CENTAVO: Final[int] = 10 ** (ESCALA - ESCALA_DINHEIRO)
+
+
+# Mesmo resultado de processar_decimal, mas com o rateio da taxa em centavos inteiros.
+# Quantidade, preço e total saem direto dos arrays de inteiros de Negocios (escala de
+# ESCALA casas) e são somados por (ativo, operação) numa passada só, sem listas por
+# ativo e sem montar um Decimal por negócio. Cada grupo leva o piso da sua parte da
+# taxa, proporcional ao volume, e os centavos que sobram vão um a um para os grupos
+# com o maior resto (empate fica com quem apareceu antes na nota): a soma das taxas
+# por ativo é exatamente a taxa da nota. Devolve None quando algum valor não cabe
+# nessas escalas, e quem chamou segue pelo caminho em Decimal.
+def processar_centavos(planilha: "Planilha") -> "ProcessedDataType | None":  # noqa: C901, PLR0915
+    negocios = planilha.negocios
+    assert_almost_equal(len(negocios), planilha.contador, "contador")
+    quantidades = negocios.quantidades.escalados
+    precos = negocios.precos.escalados
+    totais = negocios.totais.escalados
+    if quantidades is None or precos is None or totais is None:
+        logger.debug("centavos: valores fora da escala, usando Decimal")
+        return None
+
+    grupos: dict[tuple[str, str], int] = {}
+    tipos: list[str] = []
+    g_quantidades: list[int] = []
+    g_totais: list[int] = []
+    brutos: list[int] = []
+    for ativo, tipo, quantidade, preco, total in zip(
+        negocios.ativos, negocios.tipos, quantidades, precos, totais, strict=True,
+    ):
+        chave = (ativo, VENDA if quantidade < 0 else COMPRA)
+        grupo = grupos.get(chave)
+        if grupo is None:
+            grupos[chave] = len(tipos)
+            tipos.append(tipo)
+            g_quantidades.append(quantidade)
+            g_totais.append(total)
+            brutos.append(quantidade * preco)
+        else:
+            g_quantidades[grupo] += quantidade
+            g_totais[grupo] += total
+            brutos[grupo] += quantidade * preco
+
+    # quantidade * preço fica com o dobro das casas do total
+    escala = 10**ESCALA
+    for chave, grupo in grupos.items():
+        if brutos[grupo] != g_totais[grupo] * escala:
+            logger.error("chave=%s, bruto=%d, total=%d", chave, brutos[grupo], g_totais[grupo] * escala)
+            etapa = "total-ativo"
+            raise IntegridadeError(
+                etapa,
+                dec.Decimal(brutos[grupo]).scaleb(-2 * ESCALA),
+                dec.Decimal(g_totais[grupo]).scaleb(-ESCALA),
+            )
+        if g_totais[grupo] % CENTAVO:
+            logger.debug("centavos: total de %s com fração de centavo, usando Decimal", chave)
+            return None
+        g_totais[grupo] //= CENTAVO
+
+    nota = inteiros(
+        (
+            planilha.taxa_liquidacao + planilha.taxa_emolumento + planilha.custos_operacionais,
+            planilha.irrf,
+            planilha.nota_total_sem_taxa,
+            planilha.nota_total_com_taxa,
+        ),
+        ESCALA_DINHEIRO,
+    )
+    if nota is None:
+        logger.debug("centavos: valores fora da escala, usando Decimal")
+        return None
+    taxa, irrf, nota_sem_taxa, nota_com_taxa = nota
+    soma = sum(g_totais)
+    assert_almost_equal(abs(soma), nota_sem_taxa, "nota-total")
+    assert_almost_equal(abs(soma + taxa + irrf), nota_com_taxa, "nota-total-taxa")
+
+    volume = sum(map(abs, g_totais))
+    if volume:
+        partes = [taxa * abs(g_total) for g_total in g_totais]
+        rateio = array.array("q", (parte // volume for parte in partes))
+        sobra = taxa - sum(rateio)
+        for grupo in heapq.nlargest(sobra, range(len(partes)), key=lambda g: (partes[g] % volume, -g)):
+            rateio[grupo] += 1
+    else:
+        # só negócios a preço zero: não há por onde ratear, então a nota não pode ter taxa
+        rateio = array.array("q", [0] * len(g_totais))
+    assert_almost_equal(sum(rateio), taxa, "taxa-total")
+
+    dados: MutableMapping[tuple[str, str], MutableMapping[str, dec.Decimal]] = {}
+    for chave, grupo in grupos.items():
+        quantidade_dec = dec.Decimal(g_quantidades[grupo]).scaleb(-ESCALA)
+        total_dec = dec.Decimal(g_totais[grupo]).scaleb(-ESCALA_DINHEIRO)
+        taxa_dec = dec.Decimal(rateio[grupo]).scaleb(-ESCALA_DINHEIRO)
+        preco_dec = total_dec / quantidade_dec
+        taxa_unitaria = taxa_dec / quantidade_dec
+        dados[chave] = {
+            "tipo": tipos[grupo],  # type: ignore[dict-item]
+            "quantidade": quantidade_dec,
+            "preco_sem_taxa": preco_dec,
+            "total_sem_taxa": total_dec,
+            "taxa_unitaria": taxa_unitaria,
+            "taxa_total": taxa_dec,
+            "preco_com_taxa": preco_dec + taxa_unitaria,
+            "total_com_taxa": total_dec + taxa_dec,
+        }
+    return dados
@@ -1,13 +1,20 @@
 import datetime as dt
 import decimal as dec
-import pathlib
-from typing import Iterator, Sequence
+from typing import TYPE_CHECKING, Iterator, Sequence
 
-from pdfminer.high_level import extract_pages
-from pdfminer.layout import LTTextBoxHorizontal
-
-from pynotas.models import LinhaPlanilha, Sheet, TickerType
+from pynotas.backends import Document, extract_pages, is_text_box
+from pynotas.companies.corretoras import AVENUE
+from pynotas.models import LinhaPlanilha, Negocios, Sheet, TickerType
 from pynotas.parser import _dec2str, get_next, get_next_text, get_text
+from pynotas.profiling import profiled
+from pynotas.utils import EXTERIOR
+
+if TYPE_CHECKING:
+    import pathlib
+
+    from pynotas.models import TextElement
+
+PARSER_VERSION = AVENUE.versao
 
 stock = TickerType.stock
 etf = TickerType.etf
@@ -42,7 +49,7 @@ TICKER2TYPE = {
 }
 
 
-def get_next_decimal(gnd_elements: Iterator["LTTextBoxHorizontal"]) -> dec.Decimal:
+def get_next_decimal(gnd_elements: Iterator["TextElement"]) -> dec.Decimal:
     while True:
         gnd_text = get_next_text(gnd_elements)
         try:
@@ -51,7 +58,7 @@ def get_next_decimal(gnd_elements: Iterator["LTTextBoxHorizontal"]) -> dec.Decim
             continue
 
 
-def get_next_date(gnd_elements: Iterator["LTTextBoxHorizontal"], *, v2_flag: bool = True) -> dt.date:
+def get_next_date(gnd_elements: Iterator["TextElement"], *, v2_flag: bool = True) -> dt.date:
     while True:
         gnd_text = get_next_text(gnd_elements)
         try:
@@ -64,14 +71,14 @@ def get_next_date(gnd_elements: Iterator["LTTextBoxHorizontal"], *, v2_flag: boo
             return dt.date(gnd_year, gnd_month, gnd_day)
 
 
-def get_b_s(fbs_elements: Iterator["LTTextBoxHorizontal"]) -> str:
+def get_b_s(fbs_elements: Iterator["TextElement"]) -> str:
     while True:
         fbs_text = get_next_text(fbs_elements).replace("Buy", "B").replace("Sell", "S")
         if fbs_text in ("B", "S"):
             return fbs_text
 
 
-def get_ticker(gt_elements: Iterator["LTTextBoxHorizontal"]) -> str:
+def get_ticker(gt_elements: Iterator["TextElement"]) -> str:
     while True:
         gt_text = get_next_text(gt_elements)
         if gt_text == "SYM" or " " in gt_text or ":" in gt_text:
@@ -79,15 +86,16 @@ def get_ticker(gt_elements: Iterator["LTTextBoxHorizontal"]) -> str:
         return gt_text
 
 
-def get_data(gd_elements: Iterator["LTTextBoxHorizontal"], *, gd_flag: bool = False) -> tuple[
-    dt.date,
+@profiled
+def get_data(gd_elements: Iterator["TextElement"]) -> tuple[
+    list[dt.date],
     list[str],
     list[dec.Decimal],
     list[str],
     list[dec.Decimal],
     list[dec.Decimal],
 ]:
-    gd_date = dt.date(1970, 1, 1)
+    gd_dates: list[dt.date] = []
     gd_actions: list[str] = []
     gd_quantities: list[dec.Decimal] = []
     gd_tickers: list[str] = []
@@ -97,25 +105,24 @@ def get_data(gd_elements: Iterator["LTTextBoxHorizontal"], *, gd_flag: bool = Fa
         try:
             gd_actions.append(get_b_s(gd_elements))
         except AttributeError:
-            return gd_date, gd_actions, gd_quantities, gd_tickers, gd_prices, gd_totals
-        if gd_flag:
-            gd_date = get_next_date(gd_elements)
-            gd_flag = False
+            return gd_dates, gd_actions, gd_quantities, gd_tickers, gd_prices, gd_totals
+        gd_dates.append(get_next_date(gd_elements))
         gd_quantities.append(get_next_decimal(gd_elements))
         gd_tickers.append(get_ticker(gd_elements))
         gd_prices.append(get_next_decimal(gd_elements))
         gd_totals.append(get_next_decimal(gd_elements))
 
 
-def go2(g2_elements: Iterator["LTTextBoxHorizontal"], g2_value: str) -> None:
+def go2(g2_elements: Iterator["TextElement"], g2_value: str) -> None:
     while True:
         g2_text = get_next_text(g2_elements)
         if g2_text == g2_value:
             break
 
 
+@profiled
 def get_data_v1(
-    gdv1_elements: Iterator["LTTextBoxHorizontal"],
+    gdv1_elements: Iterator["TextElement"],
 ) -> tuple[
     int,
     list[str],
@@ -162,52 +169,58 @@ def get_data_v1(
             go2(gdv1_elements, "Net Amount")
 
 
+@profiled
 def get_types(gt_tickers: list[str]) -> list[TickerType]:
-    return [TICKER2TYPE[gt_ticker] for gt_ticker in gt_tickers]
-
-
-def _assert_list(
-    al_data: list[str] | list[dec.Decimal] | list[TickerType],
-    al_name: str,
-    al_size: int,
-) -> None:
-    if len(al_data) == 0:
-        msg = f"no {al_name} in PDF?"
-        raise SystemError(msg)
-    elif len(al_data) != al_size:  # noqa: RET506
-        msg = f"missing {al_name} in PDF...\nExpected {al_size}, got {len(al_data)}"
+    try:
+        return [TICKER2TYPE[gt_ticker] for gt_ticker in gt_tickers]
+    except KeyError as exc:
+        msg = f"unknown ticker {exc.args[0]}, add it to TICKER2TYPE"
+        raise SystemError(msg) from exc
+
+
+def get_trades(
+    gt_actions: list[str],
+    gt_tickers: list[str],
+    gt_quantities: list[dec.Decimal],
+    gt_prices: list[dec.Decimal],
+    gt_totals: list[dec.Decimal],
+) -> Negocios:
+    if len(gt_actions) != len(gt_tickers):
+        msg = f"missing actions in PDF...\nExpected {len(gt_tickers)}, got {len(gt_actions)}"
         raise SystemError(msg)
-
-
+    # sells go in with negative quantity and total, like XP and Nu sells
+    gt_signs = [-1 if gt_action == "S" else 1 for gt_action in gt_actions]
+    return Negocios(
+        gt_tickers,
+        get_types(gt_tickers),
+        [gt_sign * gt_quantity for gt_sign, gt_quantity in zip(gt_signs, gt_quantities, strict=True)],
+        gt_prices,
+        [gt_sign * gt_total for gt_sign, gt_total in zip(gt_signs, gt_totals, strict=True)],
+    )
+
+
+@profiled
 def assert_data_found(sheet: "Sheet") -> None:
-    if sheet.date == dt.date(1970, 1, 1):
+    if not sheet.dates:
         msg = "no date in PDF?"
         raise SystemError(msg)
-    for adf_data, adf_name in (
-        (sheet.actions, "actions"),
-        (sheet.tickers, "tickers"),
-        (sheet.types, "types"),
-        (sheet.quantities, "quantities"),
-        (sheet.prices, "prices"),
-        (sheet.totals, "totals"),
-    ):
-        _assert_list(adf_data, adf_name, sheet.counter)  # type: ignore[arg-type]
+    if len(sheet.trades) == 0:
+        msg = "no actions in PDF?"
+        raise SystemError(msg)
 
 
+@profiled
 def build_sheet(sheet: "Sheet") -> list[LinhaPlanilha]:
     bs_list = []
     zero = "0"
-    for bs_action, bs_ticker, bs_type, bs_quantity, bs_price, bs_total in zip(
-        sheet.actions, sheet.tickers, sheet.types, sheet.quantities, sheet.prices, sheet.totals,
-    ):
-        if bs_action == "S":
-            continue
+    for bs_date, trade in zip(sheet.dates, sheet.trades, strict=True):
+        bs_ticker, bs_type, bs_quantity, bs_price, bs_total = trade
         bs_list.append(
             LinhaPlanilha(
-                data=f"{sheet.date:%d/%m/%Y}",
+                data=f"{bs_date:%d/%m/%Y}",
                 ativo=bs_ticker,
                 tipo=bs_type,
-                local="Exterior",
+                local=EXTERIOR,
                 corretora="Avenue",
                 quantidade=_dec2str(bs_quantity),
                 taxa_ativo=zero,
@@ -223,62 +236,51 @@ def build_sheet(sheet: "Sheet") -> list[LinhaPlanilha]:
     return bs_list
 
 
-def read_avenue(file_path: pathlib.Path) -> Sequence["LinhaPlanilha"]:  # noqa: C901, PLR0912, PLR0915
+def iter_avenue(  # noqa: C901, PLR0912
+    file_path: "pathlib.Path | Document",
+    backend: str | None = None,
+    versao_layout: int | None = None,
+) -> Iterator["LinhaPlanilha"]:
 
-    counter = 0
-    date = dt.date(1970, 1, 1)
-    dates = []
-    date_flag = True
-    actions: list[str] = []
-    tickers: list[str] = []
-    types: list[TickerType] = []
-    quantities: list[dec.Decimal] = []
-    prices: list[dec.Decimal] = []
-    totals: list[dec.Decimal] = []
+    total_counter = 0
 
-    flag_v1, flag_v2 = False, False
-    for page_layout in extract_pages(file_path):
-        elements: Iterator["LTTextBoxHorizontal"] = iter(
-            page_layout,  # type: ignore[arg-type]
-        )
+    # com o layout do --inbox, o v2 não procura a marca; o v1 ainda lê a partir da
+    # "Confirmation Date"
+    flag_v1, flag_v2 = False, versao_layout == 2  # noqa: PLR2004
+    for page_layout in extract_pages(file_path, backend):
+        elements = iter(page_layout)
+        # cada negócio leva a sua data: um extrato pode cobrir vários pregões
+        dates: list[dt.date] = []
+        trades = Negocios()
         try:
             while True:
                 element = get_next(elements)
-                if isinstance(element, LTTextBoxHorizontal):
+                if is_text_box(element):
                     text = get_text(element)
                     if (flag_v1 or flag_v2) is False:
                         if "Apex Clearing Corporation" in text:
                             flag_v2 = True
                             continue
-                        elif "Confirmation Date  :  " in text:  # noqa: RET507
+                        elif "Confirmation Date  :  " in text:
                             flag_v1 = True
                     elif flag_v2:
                         if text == "B/S Trade Date Settle Date QTY":
                             (
-                                temp_date,
+                                temp_dates,
                                 temp_actions,
                                 temp_quantities,
                                 temp_tickers,
                                 temp_prices,
                                 temp_totals,
-                            ) = get_data(elements, gd_flag=date_flag)
-                            # TODO @arthurazs: remove date_flag, read date of each line
-                            if date_flag:
-                                date = temp_date
-                                date_flag = False
-                            temp_types = get_types(temp_tickers)
-
-                            counter += len(temp_actions)
-                            actions += temp_actions
-                            tickers += temp_tickers
-                            types += temp_types
-                            quantities += temp_quantities
-                            prices += temp_prices
-                            totals += temp_totals
+                            ) = get_data(elements)
+                            dates.extend(temp_dates)
+                            trades.extend(
+                                get_trades(temp_actions, temp_tickers, temp_quantities, temp_prices, temp_totals),
+                            )
                     else:
                         try:
                             (
-                                temp_counter,
+                                _,
                                 temp_tickers,
                                 temp_actions,
                                 temp_quantities,
@@ -287,24 +289,29 @@ def read_avenue(file_path: pathlib.Path) -> Sequence["LinhaPlanilha"]:  # noqa:
                                 temp_totals,
                             ) = get_data_v1(elements)
 
-                            dates += temp_dates
-                            temp_types = get_types(temp_tickers)
-
-                            counter += len(temp_actions)
-                            actions += temp_actions
-                            tickers += temp_tickers
-                            types += temp_types
-                            quantities += temp_quantities
-                            prices += temp_prices
-                            totals += temp_totals
+                            dates.extend(temp_dates)
+                            trades.extend(
+                                get_trades(temp_actions, temp_tickers, temp_quantities, temp_prices, temp_totals),
+                            )
                         except AttributeError:
                             break
         except StopIteration:
             # TODO @arthurazs: pegar total no fim do pdf e validar com o que foi lido
-            continue
+            pass
+
+        if trades:
+            sheet = Sheet(dates, trades)
+            assert_data_found(sheet)
+            yield from build_sheet(sheet)
+            total_counter += len(trades)
+
+    if total_counter == 0:
+        assert_data_found(Sheet([], Negocios()))
+
 
-    if flag_v1:
-        date = dates[0]
-    sheet = Sheet(date, counter, actions, tickers, types, quantities, prices, totals)
-    assert_data_found(sheet)
-    return build_sheet(sheet)
+def read_avenue(
+    file_path: "pathlib.Path | Document",
+    backend: str | None = None,
+    versao_layout: int | None = None,
+) -> Sequence["LinhaPlanilha"]:
+    return list(iter_avenue(file_path, backend, versao_layout))
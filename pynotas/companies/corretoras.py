@@ -0,0 +1,28 @@
+from pynotas.registry import Corretora
+
+XP = Corretora(
+    "xp",
+    "XP",
+    "3",
+    "pynotas.companies.xp:iter_xp",
+    ((("C/VTipomercado",), 1), (("Datapregão",), 1)),
+)
+NU = Corretora(
+    "nu",
+    "Nu",
+    "3",
+    "pynotas.companies.nu:iter_nu",
+    (
+        (("C/VC/V", "ResumodosNegócios"), 2),  # NuInvest
+        (("C/VC/V",), 1),  # EasyInvest
+        (("DataPregão",), 1),
+    ),
+)
+AVENUE = Corretora(
+    "avenue",
+    "Avenue",
+    "4",
+    "pynotas.companies.avenue:iter_avenue",
+    ((("ApexClearingCorporation",), 2), (("ConfirmationDate",), 1)),
+)
+EMBUTIDAS = (XP, NU, AVENUE)
@@ -1,34 +1,45 @@
 import datetime as dt
 import decimal as dec
-import pathlib
 from typing import TYPE_CHECKING, Iterator, Sequence
 
-import pytz as tz
-from pdfminer.high_level import extract_pages
-from pdfminer.layout import LTTextBoxHorizontal
-
-from pynotas.models import Planilha, ProcessedDataType
+from pynotas import profiling
+from pynotas.backends import Document, extract_pages, is_text_box
+from pynotas.companies.corretoras import NU
+from pynotas.models import Negocios, Planilha
 from pynotas.parser import (
+    COMPRA,
     SEPARADORES_NU,
+    VENDA,
+    assinar_vendas,
     get_next,
     get_next_text,
     get_text,
     montar_planilha,
     processar_dados,
     to_dec,
+    to_dec_dc,
     to_dt,
 )
+from pynotas.profiling import profiled
 
 if TYPE_CHECKING:
-    from pynotas.models import LinhaPlanilha
+    import pathlib
+
+    from pynotas.models import LinhaPlanilha, TextElement
 
+PARSER_VERSION = NU.versao
+OPERACOES = (COMPRA, VENDA)
+RESUMO_NUINVEST = "Resumo dos Negócios\nResumo dos Negócios"
 
+
+@profiled
 def data_pregao(dp_texto: str) -> dt.datetime:
     dp_texto = dp_texto.split("\n")[1]
     return to_dt(dp_texto)
 
 
-def ativo(a_elementos: Iterator["LTTextBoxHorizontal"], a_flag: int, a_texto: str) -> tuple[list[str], list[str]]:
+@profiled
+def ativo(a_elementos: Iterator["TextElement"], a_flag: int, a_texto: str) -> tuple[list[str], list[str]]:
 
     a_lista = []
     a_tipos = []
@@ -56,7 +67,7 @@ def ativo(a_elementos: Iterator["LTTextBoxHorizontal"], a_flag: int, a_texto: st
             continue
 
 
-def _add_dec2list_v2(adl_elementos: Iterator["LTTextBoxHorizontal"], adl_flag: int) -> tuple[
+def _add_dec2list_v2(adl_elementos: Iterator["TextElement"], adl_flag: int) -> tuple[
     list[dec.Decimal], list[dec.Decimal],
 ]:
     adl_lista1 = []
@@ -64,8 +75,8 @@ def _add_dec2list_v2(adl_elementos: Iterator["LTTextBoxHorizontal"], adl_flag: i
     adl_contador = 0
     while True:
         adl_texto = get_next_text(adl_elementos)
-        if " D" in adl_texto:
-            adl_lista2.append(to_dec(adl_texto.replace(" D", "")))
+        if adl_texto.endswith((" D", " C")):
+            adl_lista2.append(to_dec_dc(adl_texto))
         else:
             adl_lista1.append(to_dec(adl_texto))
         adl_contador += 1
@@ -74,7 +85,7 @@ def _add_dec2list_v2(adl_elementos: Iterator["LTTextBoxHorizontal"], adl_flag: i
 
 
 def _add_dec2list(
-    adl_elementos: Iterator["LTTextBoxHorizontal"],
+    adl_elementos: Iterator["TextElement"],
     adl_flag: int,
     adl_texto: str | None = None,
 ) -> list[dec.Decimal]:
@@ -93,34 +104,38 @@ def _add_dec2list(
         adl_contador += 1
 
 
-def generico(g_elementos: Iterator["LTTextBoxHorizontal"], g_vezes: int = 1) -> "dec.Decimal":
+@profiled
+def generico(g_elementos: Iterator["TextElement"], g_vezes: int = 1) -> "dec.Decimal":
     return abs(to_dec(get_next_text(g_elementos, g_vezes)))
 
 
+@profiled
 def quantidade(
-    q_elementos: Iterator["LTTextBoxHorizontal"],
+    q_elementos: Iterator["TextElement"],
     q_flag: int,
     q_texto: str | None = None,
 ) -> list[dec.Decimal]:
     return _add_dec2list(q_elementos, q_flag, q_texto)
 
 
-def preco(p_elementos: Iterator["LTTextBoxHorizontal"], p_flag: int) -> list[dec.Decimal]:
+def preco(p_elementos: Iterator["TextElement"], p_flag: int) -> list[dec.Decimal]:
     return _add_dec2list(p_elementos, p_flag)
 
 
-def total(t_elementos: Iterator["LTTextBoxHorizontal"], t_flag: int) -> list[dec.Decimal]:
+def total(t_elementos: Iterator["TextElement"], t_flag: int) -> list[dec.Decimal]:
     return _add_dec2list(t_elementos, t_flag)
 
 
-def preco_total(p_elementos: Iterator["LTTextBoxHorizontal"], p_flag: int) -> tuple[
+@profiled
+def preco_total(p_elementos: Iterator["TextElement"], p_flag: int) -> tuple[
     list[dec.Decimal], list[dec.Decimal],
 ]:
     return _add_dec2list_v2(p_elementos, p_flag)
 
 
+@profiled
 def clearing(
-    c_elementos: Iterator["LTTextBoxHorizontal"],
+    c_elementos: Iterator["TextElement"],
 ) -> tuple[dec.Decimal, dec.Decimal]:
     c_texto = get_next_text(c_elementos)
     while True:
@@ -135,23 +150,26 @@ def clearing(
     return c_total, c_liquidacao
 
 
-def bolsa(b_elementos: Iterator["LTTextBoxHorizontal"]) -> dec.Decimal:
+@profiled
+def bolsa(b_elementos: Iterator["TextElement"]) -> dec.Decimal:
     return abs(to_dec(get_next_text(b_elementos, 5)))
 
 
-def liquido(l_elementos: Iterator["LTTextBoxHorizontal"]) -> dec.Decimal:
+@profiled
+def liquido(l_elementos: Iterator["TextElement"]) -> dec.Decimal:
     return abs(to_dec(get_next_text(l_elementos).split()[0]))
 
 
+@profiled
 def _alternative(
-    a_elements: Iterator["LTTextBoxHorizontal"],
+    a_elements: Iterator["TextElement"],
 ) -> tuple[list[str] | None, list[str], int, str]:
     a_list: list[str] = []
     a_types: list[str] = []
     a_counter = 0
     while True:
         a_text = get_next_text(a_elements)
-        if a_text == "C":
+        if a_text in OPERACOES:
             return None, [], 0, a_text
         if a_text in ("FRACIONARIO", "D2S", "NOR", "VISTA", "#"):
             continue
@@ -171,38 +189,42 @@ def _alternative(
             return a_list, a_types, a_counter, a_text
 
 
-def read_nu(file_path: pathlib.Path) -> Sequence["LinhaPlanilha"]:  # noqa: C901, PLR0912, PLR0915
+def iter_nu(  # noqa: C901, PLR0912, PLR0915
+    file_path: "pathlib.Path | Document",
+    backend: str | None = None,
+    versao_layout: int | None = None,
+) -> Iterator["LinhaPlanilha"]:
 
     versao: int | None = None
-    data_nota = dt.datetime(1970, 1, 1, tzinfo=tz.utc)
-    contador = 0
-    contador_alt = 0
-    ativos: list[str] = []
-    tipos: list[str] = []
-    quantidades: list[dec.Decimal] = []
-    precos: list[dec.Decimal] = []
-    totais: list[dec.Decimal] = []
+    data_nota = dt.datetime(1970, 1, 1, tzinfo=dt.timezone.utc)
+    contador_nota = 0
+    negocios_nota = Negocios()
     taxa_liquidacao = dec.Decimal(-1)
     taxa_emolumento = dec.Decimal(-1)
     nota_total_sem_taxa = dec.Decimal(-1)
     nota_total_com_taxa = dec.Decimal(-1)
-    linhas_planilha: list["LinhaPlanilha"] = []
-    dados_processados: ProcessedDataType = {}
-
-    for page_layout in extract_pages(file_path):
+    irrf = dec.Decimal(0)
+
+    # negócios se acumulam página a página; os totais valem os da última página que os trouxer
+    for page_layout in extract_pages(file_path, backend):
+        contador = 0
+        contador_alt = 0
+        ativos: list[str] = []
+        tipos: list[str] = []
+        quantidades: list[dec.Decimal] = []
+        precos: list[dec.Decimal] = []
+        totais: list[dec.Decimal] = []
         try:
-            elementos: Iterator["LTTextBoxHorizontal"] = iter(
-                page_layout,  # type: ignore[arg-type]
-            )
+            elementos = iter(page_layout)
             while True:
                 elemento = get_next(elementos)
-                if isinstance(elemento, LTTextBoxHorizontal):
+                if is_text_box(elemento):
                     texto = get_text(elemento)
                     if "Data Pregão" in texto:
                         data_nota = data_pregao(texto)
                     elif "C/VC/V" in texto:
                         texto = get_next_text(elementos)
-                        while texto != "C":
+                        while texto not in OPERACOES:
                             texto = get_next_text(elementos)
                             if texto == "Valor/Ajuste D/CD/C\nValor/Ajuste":
                                 auxiliar, tipos, contador_alt, texto = _alternative(elementos)
@@ -211,7 +233,7 @@ def read_nu(file_path: pathlib.Path) -> Sequence["LinhaPlanilha"]:  # noqa: C901
                                 ativos = auxiliar
                                 quantidades = quantidade(elementos, contador_alt, texto)
                                 precos, totais = preco_total(elementos, contador_alt)
-                        while texto == "C":
+                        while texto in OPERACOES:
                             contador += 1
                             texto = get_next_text(elementos)
                         if contador_alt == contador:
@@ -219,7 +241,9 @@ def read_nu(file_path: pathlib.Path) -> Sequence["LinhaPlanilha"]:  # noqa: C901
                         ativos, tipos = ativo(elementos, contador, texto)
 
                         texto = get_next_text(elementos)
-                        if texto == "Resumo dos Negócios\nResumo dos Negócios":
+                        # o --inbox já sabe o layout pela primeira página
+                        nuinvest = texto == RESUMO_NUINVEST if versao_layout is None else versao_layout == 2  # noqa: PLR2004
+                        if nuinvest:
                             versao = 2  # NuInvest
                             while texto != "Outras":
                                 texto = get_next_text(elementos)
@@ -232,6 +256,8 @@ def read_nu(file_path: pathlib.Path) -> Sequence["LinhaPlanilha"]:  # noqa: C901
                             versao = 1  # EasyInvest
                             quantidades = quantidade(elementos, contador, texto)
                             precos, totais = preco_total(elementos, contador)
+                    elif texto.startswith("I.R.R.F."):
+                        irrf = generico(elementos)
                     elif contador_alt > 0:
                         if "Líquido para" in texto:
                             nota_total_com_taxa = liquido(elementos)  # Liquido
@@ -244,20 +270,32 @@ def read_nu(file_path: pathlib.Path) -> Sequence["LinhaPlanilha"]:  # noqa: C901
                     elif "Líquido para" in texto:
                         nota_total_com_taxa = liquido(elementos)  # Liquido
         except StopIteration:
-            planilha = Planilha(
-                data_nota,
-                contador,
-                ativos,
-                tipos,
-                quantidades,
-                precos,
-                totais,
-                taxa_liquidacao,
-                taxa_emolumento,
-                nota_total_sem_taxa,
-                nota_total_com_taxa,
-            )
-            dados_processados = processar_dados(planilha)
+            contador_nota += contador
+            negocios_nota.extend(Negocios(ativos, tipos, assinar_vendas(quantidades, totais), precos, totais))
+
+    planilha = Planilha(
+        data_nota,
+        contador_nota,
+        negocios_nota,
+        taxa_liquidacao,
+        taxa_emolumento,
+        nota_total_sem_taxa,
+        nota_total_com_taxa,
+        irrf=irrf,
+    )
+    # o parser já está importado quando o --profile é ativado: é medido aqui
+    with profiling.stage("parser.processar_dados"):
+        dados_processados = processar_dados(planilha)
 
+    linhas_planilha: list["LinhaPlanilha"] = []
+    with profiling.stage("parser.montar_planilha"):
         montar_planilha(planilha, dados_processados, linhas_planilha, "Nu")
-    return linhas_planilha
+    yield from linhas_planilha
+
+
+def read_nu(
+    file_path: "pathlib.Path | Document",
+    backend: str | None = None,
+    versao_layout: int | None = None,
+) -> Sequence["LinhaPlanilha"]:
+    return list(iter_nu(file_path, backend, versao_layout))
@@ -1,15 +1,14 @@
 import datetime as dt
 import decimal as dec
-import pathlib
 from typing import TYPE_CHECKING, Iterator, Sequence
 
-import pytz as tz
-from pdfminer.high_level import extract_pages
-from pdfminer.layout import LTTextBoxHorizontal
-
-from pynotas.models import Planilha
+from pynotas import profiling
+from pynotas.backends import Document, extract_pages, is_text_box
+from pynotas.companies.corretoras import XP
+from pynotas.models import Negocios, Planilha
 from pynotas.parser import (
     SEPARADORES_XP,
+    assinar_vendas,
     get_next,
     get_next_text,
     get_text,
@@ -18,26 +17,32 @@ from pynotas.parser import (
     to_dec,
     to_dt,
 )
+from pynotas.profiling import profiled
 
 if TYPE_CHECKING:
-    from pynotas.models import LinhaPlanilha
+    import pathlib
+
+    from pynotas.models import LinhaPlanilha, TextElement
+
+PARSER_VERSION = XP.versao
 
 
 def _dec_split(ds_texto: str, ds_indice: int) -> "dec.Decimal":
     return to_dec(ds_texto.split()[ds_indice])
 
 
-def _dec_split_next(dsn_elementos: Iterator["LTTextBoxHorizontal"], dsn_indice: int) -> "dec.Decimal":
+def _dec_split_next(dsn_elementos: Iterator["TextElement"], dsn_indice: int) -> "dec.Decimal":
     dsn_texto = get_next_text(dsn_elementos)
     return to_dec(dsn_texto.split()[dsn_indice])
 
 
-def _next_lista_decimal(nld_elementos: Iterator["LTTextBoxHorizontal"], nld_vezes: int = 1) -> list["dec.Decimal"]:
+def _next_lista_decimal(nld_elementos: Iterator["TextElement"], nld_vezes: int = 1) -> list["dec.Decimal"]:
     nld_texto = get_next_text(nld_elementos, nld_vezes)
     return _lista_decimal(nld_texto)
 
 
-def data_pregao(dp_elementos: Iterator["LTTextBoxHorizontal"]) -> dt.datetime:
+@profiled
+def data_pregao(dp_elementos: Iterator["TextElement"]) -> dt.datetime:
     dp_texto = get_next_text(dp_elementos)
     return to_dt(dp_texto)
 
@@ -46,7 +51,18 @@ def _lista_decimal(ld_texto: str) -> list["dec.Decimal"]:
     return [to_dec(ld_decimal) for ld_decimal in ld_texto.split()]
 
 
-def ativo(a_elementos: Iterator["LTTextBoxHorizontal"]) -> tuple[list[str], list[str]]:
+def _lista_total(lt_texto: str) -> list["dec.Decimal"]:
+    lt_totais: list[dec.Decimal] = []
+    for lt_valor in lt_texto.split():
+        if lt_valor == "C":  # crédito: venda
+            lt_totais[-1] = -lt_totais[-1]
+        elif lt_valor != "D":
+            lt_totais.append(to_dec(lt_valor))
+    return lt_totais
+
+
+@profiled
+def ativo(a_elementos: Iterator["TextElement"]) -> tuple[list[str], list[str]]:
     a_texto = get_next_text(a_elementos)  # Titulo
     if a_texto == "Valor Operação / Ajuste":
         a_texto = get_next_text(a_elementos)
@@ -65,7 +81,8 @@ def ativo(a_elementos: Iterator["LTTextBoxHorizontal"]) -> tuple[list[str], list
     return a_ativos, a_tipos
 
 
-def quantidade(q_elementos: Iterator["LTTextBoxHorizontal"]) -> list[dec.Decimal]:
+@profiled
+def quantidade(q_elementos: Iterator["TextElement"]) -> list[dec.Decimal]:
     q_texto = get_next_text(q_elementos, 2)
     while True:
         try:
@@ -75,64 +92,94 @@ def quantidade(q_elementos: Iterator["LTTextBoxHorizontal"]) -> list[dec.Decimal
             q_texto = get_next_text(q_elementos)
 
 
-def preco(p_elementos: Iterator["LTTextBoxHorizontal"]) -> list[dec.Decimal]:
+@profiled
+def preco(p_elementos: Iterator["TextElement"]) -> list[dec.Decimal]:
     return _next_lista_decimal(p_elementos)
 
 
-def total(t_elementos: Iterator["LTTextBoxHorizontal"]) -> list[dec.Decimal]:
+@profiled
+def total(t_elementos: Iterator["TextElement"]) -> list[dec.Decimal]:
     t_texto = get_next_text(t_elementos)
     while True:
         try:
             int(t_texto[4])
-            return _lista_decimal(t_texto[4:].replace(" D", ""))
+            return _lista_total(t_texto[4:])
         except (ValueError, IndexError):
             t_texto = get_next_text(t_elementos)
 
 
+@profiled
 def clearing(
-    c_elementos: Iterator["LTTextBoxHorizontal"],
+    c_elementos: Iterator["TextElement"],
 ) -> tuple[dec.Decimal, dec.Decimal]:
     c_texto = get_next_text(c_elementos)
     return _dec_split(c_texto, 0), _dec_split(c_texto, 1)
 
 
-def bolsa(b_elementos: Iterator["LTTextBoxHorizontal"]) -> dec.Decimal:
+@profiled
+def bolsa(b_elementos: Iterator["TextElement"]) -> dec.Decimal:
     return _dec_split_next(b_elementos, 2)
 
 
-def liquido(l_elementos: Iterator["LTTextBoxHorizontal"]) -> dec.Decimal:
+@profiled
+def custos(c_texto: str) -> tuple[dec.Decimal, dec.Decimal] | None:
+    # Taxa Operacional, Execução, Taxa de Custódia e Impostos, e o I.R.R.F. por último
+    try:
+        *c_custos, c_irrf = _lista_decimal(c_texto)
+    except (dec.InvalidOperation, ValueError):
+        return None
+    if len(c_custos) != 4:  # noqa: PLR2004
+        return None
+    return sum(c_custos, dec.Decimal(0)), c_irrf
+
+
+@profiled
+def liquido(l_elementos: Iterator["TextElement"]) -> dec.Decimal:
     return _dec_split_next(l_elementos, 1)
 
 
-def read_xp(file_path: pathlib.Path) -> Sequence["LinhaPlanilha"]:
+def iter_xp(  # noqa: C901, PLR0915
+    file_path: "pathlib.Path | Document",
+    backend: str | None = None,
+    # a XP tem um layout só
+    versao_layout: int | None = None,  # noqa: ARG001
+) -> Iterator["LinhaPlanilha"]:
 
-    data_nota = dt.datetime(1970, 1, 1, tzinfo=tz.utc)
-    contador = 0
+    data_nota = dt.datetime(1970, 1, 1, tzinfo=dt.timezone.utc)
+    contador_nota = 0
 
-    ativos: list[str] = []
-    tipos: list[str] = []
-    quantidades: list[dec.Decimal] = []
-    precos: list[dec.Decimal] = []
-    totais: list[dec.Decimal] = []
+    negocios_nota = Negocios()
     taxa_liquidacao = dec.Decimal(-1)
     taxa_emolumento = dec.Decimal(-1)
     nota_total_sem_taxa = dec.Decimal(-1)
     nota_total_com_taxa = dec.Decimal(-1)
-    linhas_planilha: list["LinhaPlanilha"] = []
-
-    for page_layout in extract_pages(file_path):
+    custos_operacionais = dec.Decimal(0)
+    irrf = dec.Decimal(0)
+    custos_pendentes = False
+
+    # negócios se acumulam página a página; o resumo financeiro vem só na última
+    for page_layout in extract_pages(file_path, backend):
+        contador = 0
+        ativos: list[str] = []
+        tipos: list[str] = []
+        quantidades: list[dec.Decimal] = []
+        precos: list[dec.Decimal] = []
+        totais: list[dec.Decimal] = []
         try:
-            elementos: Iterator["LTTextBoxHorizontal"] = iter(
-                page_layout,  # type: ignore[arg-type]
-            )
+            elementos = iter(page_layout)
             while True:
                 elemento = get_next(elementos)
-                if isinstance(elemento, LTTextBoxHorizontal):
+                if is_text_box(elemento):
                     texto = get_text(elemento)
-                    if texto == "Data pregão":
+                    # os custos operacionais, quando a nota os traz, vêm logo depois da bolsa
+                    custos_lidos = custos(texto) if custos_pendentes else None
+                    custos_pendentes = False
+                    if custos_lidos is not None:
+                        custos_operacionais, irrf = custos_lidos
+                    elif texto == "Data pregão":
                         data_nota = data_pregao(elementos)
                     elif "C/V Tipo mercado" in texto:
-                        contador = texto.count("C VISTA")  # Tipo mercado
+                        contador = texto.count("C VISTA") + texto.count("V VISTA")  # Tipo mercado
                     elif texto == "Preço / Ajuste":
                         ativos, tipos = ativo(elementos)
                         quantidades = quantidade(elementos)  # Quantidade
@@ -144,23 +191,37 @@ def read_xp(file_path: pathlib.Path) -> Sequence["LinhaPlanilha"]:
                     ):
                         nota_total_sem_taxa, taxa_liquidacao = clearing(elementos)  # Clearing
                         taxa_emolumento = bolsa(elementos)  # Bolsa
+                        custos_pendentes = True
                     elif "Total Custos / Despesas\nLíquido para " in texto:
                         nota_total_com_taxa = liquido(elementos)  # Liquido
         except StopIteration:
-            planilha = Planilha(
-                data_nota,
-                contador,
-                ativos,
-                tipos,
-                quantidades,
-                precos,
-                totais,
-                taxa_liquidacao,
-                taxa_emolumento,
-                nota_total_sem_taxa,
-                nota_total_com_taxa,
-            )
-            dados_processados = processar_dados(planilha)
+            contador_nota += contador
+            negocios_nota.extend(Negocios(ativos, tipos, assinar_vendas(quantidades, totais), precos, totais))
+
+    planilha = Planilha(
+        data_nota,
+        contador_nota,
+        negocios_nota,
+        taxa_liquidacao,
+        taxa_emolumento,
+        nota_total_sem_taxa,
+        nota_total_com_taxa,
+        custos_operacionais,
+        irrf,
+    )
+    # o parser já está importado quando o --profile é ativado: é medido aqui
+    with profiling.stage("parser.processar_dados"):
+        dados_processados = processar_dados(planilha)
 
+    linhas_planilha: list["LinhaPlanilha"] = []
+    with profiling.stage("parser.montar_planilha"):
         montar_planilha(planilha, dados_processados, linhas_planilha, "XP")
-    return linhas_planilha
+    yield from linhas_planilha
+
+
+def read_xp(
+    file_path: "pathlib.Path | Document",
+    backend: str | None = None,
+    versao_layout: int | None = None,
+) -> Sequence["LinhaPlanilha"]:
+    return list(iter_xp(file_path, backend, versao_layout))
@@ -0,0 +1,162 @@
+import datetime as dt
+import decimal as dec
+import json
+import pathlib
+from typing import Any, Final, Iterator, Mapping, NamedTuple
+
+from pynotas.models import TickerType
+from pynotas.utils import substituir
+
+ACAO: Final[str] = "Ação"
+FII: Final[str] = "FII"
+CLASSES: Final[tuple[str, ...]] = (ACAO, FII, *(tipo.value for tipo in TickerType))
+ALIQUOTAS: Final[Mapping[str, dec.Decimal]] = {ACAO: dec.Decimal("0.15"), FII: dec.Decimal("0.20")}
+ISENCAO_ACOES: Final[dec.Decimal] = dec.Decimal(20000)
+DARF_MINIMO: Final[dec.Decimal] = dec.Decimal(10)
+ZERO: Final[dec.Decimal] = dec.Decimal(0)
+
+
+class Apuracao(NamedTuple):
+    mes: str
+    classe: str
+    vendas: dec.Decimal
+    resultado: dec.Decimal
+    isento: bool
+    compensado: dec.Decimal
+    base: dec.Decimal
+    imposto: dec.Decimal
+    prejuizo: dec.Decimal
+
+
+class Darf(NamedTuple):
+    mes: str
+    apuracoes: list[Apuracao]
+    imposto: dec.Decimal
+    acumulado: dec.Decimal
+    a_pagar: dec.Decimal
+
+
+def mes_de(data: dt.date) -> str:
+    return f"{data:%Y-%m}"
+
+
+# Swing trade, apurado mês a mês: ações isentas com vendas até R$ 20 mil no mês e 15%
+# sobre o ganho, FIIs a 20% sem isenção, prejuízo de cada um compensado nos meses
+# seguintes e DARF abaixo de R$ 10 somado ao do mês seguinte. Stocks, ETFs e REITs no
+# exterior só são agregados (o imposto deles é anual, não vai para DARF). Os agregados
+# e o estado que passa de um mês para o outro ficam salvos, então um mês novo só
+# recalcula a partir dele.
+class TaxRollup:
+    def __init__(self) -> None:
+        self.meses: dict[str, dict[str, list[dec.Decimal]]] = {}
+        self.darfs: dict[str, Darf] = {}
+        self._sujo: str | None = None
+
+    def add(self, data: dt.date, classe: str, venda: dec.Decimal, resultado: dec.Decimal) -> None:
+        mes = mes_de(data)
+        agregado = self.meses.setdefault(mes, {}).setdefault(classe, [ZERO, ZERO])
+        agregado[0] += venda
+        agregado[1] += resultado
+        if self._sujo is None or mes < self._sujo:
+            self._sujo = mes
+
+    def apurar(self) -> Mapping[str, Darf]:
+        if self._sujo is None:
+            return self.darfs
+        meses = sorted(self.meses)
+        inicio = meses.index(self._sujo)
+        anterior = self.darfs.get(meses[inicio - 1]) if inicio else None
+        prejuizos = dict.fromkeys(ALIQUOTAS, ZERO)
+        acumulado = ZERO
+        if anterior is not None:
+            prejuizos.update((a.classe, a.prejuizo) for a in anterior.apuracoes if a.classe in ALIQUOTAS)
+            acumulado = anterior.acumulado
+        for mes in meses[inicio:]:
+            self.darfs[mes] = darf = self._apurar_mes(mes, prejuizos, acumulado)
+            acumulado = darf.acumulado
+        self._sujo = None
+        return self.darfs
+
+    def _apurar_mes(self, mes: str, prejuizos: dict[str, dec.Decimal], acumulado: dec.Decimal) -> Darf:
+        apuracoes = []
+        imposto_mes = ZERO
+        for classe in CLASSES:
+            vendas, resultado = self.meses[mes].get(classe, (ZERO, ZERO))
+            if classe not in ALIQUOTAS:
+                if vendas:
+                    apuracoes.append(Apuracao(mes, classe, vendas, resultado, False, ZERO, ZERO, ZERO, ZERO))  # noqa: FBT003
+                continue
+            isento = classe == ACAO and vendas <= ISENCAO_ACOES and resultado > 0
+            compensado = base = imposto = ZERO
+            if resultado < 0:
+                prejuizos[classe] -= resultado
+            elif not isento:
+                compensado = min(prejuizos[classe], resultado)
+                prejuizos[classe] -= compensado
+                base = resultado - compensado
+                imposto = (base * ALIQUOTAS[classe]).quantize(dec.Decimal("0.01"))
+            imposto_mes += imposto
+            if vendas or prejuizos[classe]:
+                apuracoes.append(
+                    Apuracao(mes, classe, vendas, resultado, isento, compensado, base, imposto, prejuizos[classe]),
+                )
+        total = imposto_mes + acumulado
+        if total < DARF_MINIMO:
+            return Darf(mes, apuracoes, imposto_mes, total, ZERO)
+        return Darf(mes, apuracoes, imposto_mes, ZERO, total)
+
+    def __iter__(self) -> Iterator[Darf]:
+        darfs = self.apurar()
+        for mes in sorted(darfs):
+            yield darfs[mes]
+
+    def save(self, path: pathlib.Path) -> None:
+        self.apurar()
+        with substituir(path) as f:
+            json.dump(
+                {
+                    "meses": {
+                        mes: {classe: [str(v), str(r)] for classe, (v, r) in classes.items()}
+                        for mes, classes in self.meses.items()
+                    },
+                    "darfs": {mes: _darf2json(darf) for mes, darf in self.darfs.items()},
+                },
+                f,
+            )
+
+    @classmethod
+    def load(cls, path: pathlib.Path) -> "TaxRollup":
+        rollup = cls()
+        with path.open(encoding="utf-8") as f:
+            dados = json.load(f)
+        for mes, classes in dados["meses"].items():
+            rollup.meses[mes] = {classe: [dec.Decimal(v), dec.Decimal(r)] for classe, (v, r) in classes.items()}
+        rollup.darfs = {mes: _json2darf(mes, darf) for mes, darf in dados["darfs"].items()}
+        return rollup
+
+
+def _darf2json(darf: Darf) -> dict[str, Any]:
+    return {
+        "imposto": str(darf.imposto),
+        "acumulado": str(darf.acumulado),
+        "a_pagar": str(darf.a_pagar),
+        "apuracoes": [
+            [a.classe, str(a.vendas), str(a.resultado), a.isento, str(a.compensado), str(a.base), str(a.imposto),
+             str(a.prejuizo)]
+            for a in darf.apuracoes
+        ],
+    }
+
+
+def _json2darf(mes: str, dados: dict[str, Any]) -> Darf:
+    return Darf(
+        mes,
+        [
+            Apuracao(mes, classe, dec.Decimal(v), dec.Decimal(r), isento, dec.Decimal(c), dec.Decimal(b),
+                     dec.Decimal(i), dec.Decimal(p))
+            for classe, v, r, isento, c, b, i, p in dados["apuracoes"]
+        ],
+        dec.Decimal(dados["imposto"]),
+        dec.Decimal(dados["acumulado"]),
+        dec.Decimal(dados["a_pagar"]),
+    )
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import logging
+import os
+import pathlib
+from typing import Any, Final, Iterable, Iterator, NamedTuple
+
+from pynotas import registry
+from pynotas.utils import substituir
+
+logger = logging.getLogger(__name__)
+
+EXTENSAO: Final[str] = ".pdf"
+DETECCOES_PATH: Final[pathlib.Path] = pathlib.Path("data") / ".inbox.json"
+
+
+class Classificacao(NamedTuple):
+    corretora: str
+    versao: int
+
+
+def primeira_pagina(file_path: pathlib.Path) -> str:
+    import pymupdf
+
+    # só o texto cru da página 1, na ordem do content stream: sem análise de layout
+    document: Any = pymupdf.open(file_path)  # type: ignore[no-untyped-call]
+    try:
+        return "" if document.page_count == 0 else str(document[0].get_text())
+    finally:
+        document.close()
+
+
+# As marcas de cada corretora são os mesmos textos que o leitor dela procura, sem espaços
+# nem quebras de linha (o texto cru da página não junta as caixas como a análise de
+# layout): o primeiro grupo de marcas que casar com o texto da primeira página decide a
+# corretora e a versão do layout. Sem corretoras, usa as do registry.
+def classificar(
+    file_path: pathlib.Path,
+    corretoras: Iterable[registry.Corretora] | None = None,
+) -> Classificacao | None:
+    if corretoras is None:
+        corretoras = registry.corretoras().values()
+    try:
+        texto = "".join(primeira_pagina(file_path).split())
+    except (RuntimeError, ValueError) as exc:
+        logger.debug("detect: %s não abre: %s", file_path, exc)
+        return None
+    for corretora in corretoras:
+        for marcas, versao in corretora.marcas:
+            if all(marca in texto for marca in marcas):
+                return Classificacao(corretora.nome, versao)
+    return None
+
+
+def notas(pasta: pathlib.Path) -> Iterator[pathlib.Path]:
+    for raiz, pastas, arquivos in os.walk(pasta):
+        pastas.sort()
+        for arquivo in sorted(arquivos):
+            if arquivo.lower().endswith(EXTENSAO):
+                yield pathlib.Path(raiz) / arquivo
+
+
+def _assinatura(corretoras: Iterable[registry.Corretora]) -> str:
+    marcas = [[corretora.nome, corretora.versao, corretora.marcas] for corretora in corretoras]
+    return hashlib.sha256(json.dumps(marcas).encode()).hexdigest()
+
+
+# A classificação de cada PDF do --inbox, pelo sha256 do conteúdo (o mesmo digest da
+# chave do ParseCache), para que um -i não abra de novo a primeira página de notas que
+# já viu. Uma nota que nenhuma corretora reconheceu fica salva como None. As entradas
+# valem para um conjunto de corretoras (nome, versão e marcas): um plugin novo ou uma
+# marca nova refaz todas.
+class Deteccoes:
+    def __init__(self, corretoras: Iterable[registry.Corretora], path: pathlib.Path = DETECCOES_PATH) -> None:
+        self.path = path
+        self.assinatura = _assinatura(corretoras)
+        self.notas: dict[str, Classificacao | None] = {}
+        self.alterado = False
+
+    @classmethod
+    def load(cls, corretoras: Iterable[registry.Corretora], path: pathlib.Path = DETECCOES_PATH) -> "Deteccoes":
+        deteccoes = cls(corretoras, path)
+        try:
+            with path.open(encoding="utf-8") as f:
+                salvo = json.load(f)
+            if salvo["assinatura"] == deteccoes.assinatura:
+                deteccoes.notas = {
+                    digest: None if valor is None else Classificacao(*valor) for digest, valor in salvo["notas"].items()
+                }
+        except (OSError, ValueError, KeyError, TypeError):
+            logger.debug("detect: %s ausente ou inválido", path)
+        return deteccoes
+
+    def __contains__(self, digest: object) -> bool:
+        return digest in self.notas
+
+    def __getitem__(self, digest: str) -> Classificacao | None:
+        return self.notas[digest]
+
+    def __setitem__(self, digest: str, classificacao: Classificacao | None) -> None:
+        self.notas[digest] = classificacao
+        self.alterado = True
+
+    def save(self) -> None:
+        if not self.alterado:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with substituir(self.path) as f:
+            json.dump({"assinatura": self.assinatura, "notas": self.notas}, f)
+        self.alterado = False
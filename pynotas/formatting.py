@@ -0,0 +1,57 @@
+import decimal as dec
+from typing import Final, Iterable, Mapping
+
+VIRGULA: Final[str] = ","
+PONTO: Final[str] = "."
+
+
+# Decimal -> texto sem notação científica e sem perder zero significativo: "10" fica
+# "10", "0.5" fica "0,5" e zero fica "0". Sem precisão para a coluna o valor sai
+# inteiro, só sem zeros à direita da fração; com precisão sai com exatamente essas
+# casas (ROUND_HALF_EVEN). parse() desfaz format_value() para o mesmo separador.
+class DecimalFormatter:
+    def __init__(self, separador: str = VIRGULA, precisoes: Mapping[str, int] | None = None) -> None:
+        self.separador = separador
+        self.precisoes = dict(precisoes or {})
+        self._quanta = {coluna: dec.Decimal(1).scaleb(-casas) for coluna, casas in self.precisoes.items()}
+
+    def format_value(self, valor: dec.Decimal, coluna: str | None = None) -> str:
+        if coluna is not None and coluna in self._quanta:
+            valor = valor.quantize(self._quanta[coluna])
+            return f"{abs(valor) if valor.is_zero() else valor:f}".replace(".", self.separador)
+        texto = str(valor)
+        if "E" in texto or not valor:
+            return _fixo(valor).replace(".", self.separador)
+        if "." in texto:
+            return texto.rstrip("0").rstrip(".").replace(".", self.separador)
+        return texto
+
+    def parse(self, texto: str) -> dec.Decimal:
+        return dec.Decimal(texto.replace(self.separador, "."))
+
+    def row(self, valores: Mapping[str, dec.Decimal]) -> dict[str, str]:
+        return {coluna: self.format_value(valor, coluna) for coluna, valor in valores.items()}
+
+    def column(self, coluna: str | None, valores: Iterable[dec.Decimal]) -> list[str]:
+        if coluna in self._quanta:
+            return [self.format_value(valor, coluna) for valor in valores]
+        separador = self.separador
+        # o caminho comum num laço só, sem chamada por valor; notação científica e zero
+        # (que pode vir como -0 ou 0E-23) ficam com _fixo
+        return [
+            (texto.rstrip("0").rstrip(".").replace(".", separador) if "." in texto else texto)
+            if "E" not in (texto := str(valor)) and valor
+            else _fixo(valor).replace(".", separador)
+            for valor in valores
+        ]
+
+
+def _fixo(valor: dec.Decimal) -> str:
+    if not valor:
+        return "0"
+    texto = f"{valor:f}"
+    return texto.rstrip("0").rstrip(".") if "." in texto else texto
+
+
+PT_BR: Final[DecimalFormatter] = DecimalFormatter(VIRGULA)
+PLAIN: Final[DecimalFormatter] = DecimalFormatter(PONTO)
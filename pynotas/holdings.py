@@ -0,0 +1,62 @@
+import bisect
+import datetime as dt
+import decimal as dec
+import json
+import pathlib
+
+from pynotas.models import Position
+from pynotas.utils import substituir
+
+
+# Every change of a ticker's position, as parallel arrays sorted by date: the day
+# (ordinal), and the quantity and cost right after that day's trades. The portfolio on
+# any date is one bisect per ticker, without reading all.csv or a single PDF.
+class HoldingsIndex:
+    def __init__(self) -> None:
+        self.datas: dict[str, list[int]] = {}
+        self.quantidades: dict[str, list[dec.Decimal]] = {}
+        self.custos: dict[str, list[dec.Decimal]] = {}
+
+    def record(self, ativo: str, data: dt.date, posicao: Position) -> None:
+        datas = self.datas.setdefault(ativo, [])
+        quantidades = self.quantidades.setdefault(ativo, [])
+        custos = self.custos.setdefault(ativo, [])
+        dia = data.toordinal()
+        if datas and datas[-1] == dia:
+            quantidades[-1], custos[-1] = posicao
+            return
+        if datas and datas[-1] > dia:
+            msg = f"{ativo}: evento em {data:%d/%m/%Y} fora de ordem"
+            raise ValueError(msg)
+        datas.append(dia)
+        quantidades.append(posicao.quantidade)
+        custos.append(posicao.custo)
+
+    def at(self, data: dt.date) -> dict[str, Position]:
+        dia = data.toordinal()
+        carteira = {}
+        for ativo, datas in self.datas.items():
+            indice = bisect.bisect_right(datas, dia) - 1
+            if indice >= 0 and self.quantidades[ativo][indice]:
+                carteira[ativo] = Position(self.quantidades[ativo][indice], self.custos[ativo][indice])
+        return carteira
+
+    def save(self, path: pathlib.Path) -> None:
+        with substituir(path) as f:
+            json.dump(
+                {
+                    ativo: [datas, list(map(str, self.quantidades[ativo])), list(map(str, self.custos[ativo]))]
+                    for ativo, datas in self.datas.items()
+                },
+                f,
+            )
+
+    @classmethod
+    def load(cls, path: pathlib.Path) -> "HoldingsIndex":
+        index = cls()
+        with path.open(encoding="utf-8") as f:
+            for ativo, (datas, quantidades, custos) in json.load(f).items():
+                index.datas[ativo] = datas
+                index.quantidades[ativo] = list(map(dec.Decimal, quantidades))
+                index.custos[ativo] = list(map(dec.Decimal, custos))
+        return index
@@ -0,0 +1,280 @@
+import collections
+import csv
+import datetime as dt
+import decimal as dec
+import hashlib
+import io
+import json
+import logging
+import pathlib
+from typing import Any, Final, Iterable, Iterator, Sequence, TextIO
+
+from pynotas.darf import TaxRollup
+from pynotas.holdings import HoldingsIndex
+from pynotas.models import LinhaConvertida, LinhaGanho, Position
+from pynotas.parser import _dec2str, to_dec, to_dt
+from pynotas.utils import CABECALHO, CABECALHO_GANHOS, EXTERIOR, substituir
+
+logger = logging.getLogger(__name__)
+
+ZERO = dec.Decimal(0)
+
+
+def data_linha(linha: LinhaConvertida) -> dt.date:
+    return to_dt(linha["data"]).date()
+
+
+def ordenar(linhas: Iterable[LinhaConvertida]) -> list[LinhaConvertida]:
+    # estável: notas do mesmo dia mantêm a ordem em que foram lidas
+    return sorted(linhas, key=data_linha)
+
+
+class VendaDescobertaError(ValueError):
+    pass
+
+
+class SemCambioError(ValueError):
+    pass
+
+
+def total_brl(linha: LinhaConvertida) -> dec.Decimal:
+    # all.csv sem a tabela PTAX deixa as colunas em reais vazias nas linhas do exterior
+    if linha["local"] != EXTERIOR:
+        return to_dec(linha["total_investido"])
+    if not linha.get("total_investido_brl"):
+        msg = f"{linha['ativo']} em {linha['data']} sem câmbio"
+        raise SemCambioError(msg)
+    return to_dec(linha["total_investido_brl"])
+
+
+# Position per ticker, fees included, in reais: total_investido for B3 rows and
+# total_investido_brl (PTAX of the trade date) for rows abroad, so ganhos.csv, the
+# HoldingsIndex and the TaxRollup never mix dollars in. A purchase adds it to the cost.
+# A sale (negative quantidade) takes quantity out and realizes a gain against its cost:
+# the running average for B3 assets, and the oldest lots first (FIFO, one deque per
+# ticker) for assets abroad. Each row is amortized O(1), so a snapshot plus the rows of
+# a new note is all it takes to bring every position up to date. A sale of more than
+# the position (a note that was never read, or a short sale) is left out: run() keeps it
+# in descobertas and the positions stay as they were. A row abroad without the PTAX
+# rate is left out the same way, in sem_cambio.
+class Ledger:
+    def __init__(
+        self,
+        posicoes: dict[str, Position] | None = None,
+        data: dt.date | None = None,
+        index: HoldingsIndex | None = None,
+        lotes: dict[str, collections.deque[list[dec.Decimal]]] | None = None,
+        rollup: TaxRollup | None = None,
+    ) -> None:
+        self.posicoes = posicoes if posicoes is not None else {}
+        self.data = data
+        self.index = index
+        self.lotes = lotes if lotes is not None else {}
+        self.rollup = rollup
+        self.realizados: list[LinhaGanho] = []
+        self.descobertas: list[LinhaConvertida] = []
+        self.sem_cambio: list[LinhaConvertida] = []
+
+    def apply(self, linha: LinhaConvertida) -> LinhaConvertida:
+        data = data_linha(linha)
+        if self.data is not None and data < self.data:
+            msg = f"{linha['ativo']} em {linha['data']} é anterior à posição de {self.data:%d/%m/%Y}"
+            raise ValueError(msg)
+        quantidade = to_dec(linha["quantidade"])
+        total = total_brl(linha)
+        self.data = data
+
+        anterior = self.posicoes.get(linha["ativo"], Position(ZERO, ZERO))
+        fifo = linha["local"] == EXTERIOR
+        if quantidade >= 0:
+            posicao = Position(anterior.quantidade + quantidade, anterior.custo + total)
+            if fifo and quantidade:
+                self.lotes.setdefault(linha["ativo"], collections.deque()).append([quantidade, total / quantidade])
+        else:
+            vendida = -quantidade
+            if vendida > anterior.quantidade:
+                msg = f"{linha['ativo']} em {linha['data']}: venda de {vendida} com posição de {anterior.quantidade}"
+                raise VendaDescobertaError(msg)
+            custo = self._consumir(linha["ativo"], vendida) if fifo else anterior.preco_medio * vendida
+            final = anterior.quantidade - vendida
+            posicao = Position(final, anterior.custo - custo if final > 0 else ZERO)
+            self._realizar(linha, vendida, -total, custo)
+            if self.rollup is not None:
+                self.rollup.add(data, linha["tipo"], -total, -total - custo)
+        self.posicoes[linha["ativo"]] = posicao
+        if self.index is not None:
+            self.index.record(linha["ativo"], data, posicao)
+        return {
+            **linha,
+            "quantidade_final": _dec2str(posicao.quantidade),
+            "preco_medio": _dec2str(posicao.preco_medio),
+        }
+
+    def _consumir(self, ativo: str, vendida: dec.Decimal) -> dec.Decimal:
+        lotes = self.lotes.get(ativo, collections.deque())
+        custo = ZERO
+        while vendida and lotes:
+            lote = lotes[0]
+            usada = min(lote[0], vendida)
+            custo += usada * lote[1]
+            vendida -= usada
+            lote[0] -= usada
+            if not lote[0]:
+                lotes.popleft()
+        return custo
+
+    def _realizar(self, linha: LinhaConvertida, vendida: dec.Decimal, venda: dec.Decimal, custo: dec.Decimal) -> None:
+        self.realizados.append(
+            LinhaGanho(
+                data=linha["data"],
+                ativo=linha["ativo"],
+                tipo=linha["tipo"],
+                local=linha["local"],
+                corretora=linha["corretora"],
+                quantidade=_dec2str(vendida),
+                venda=_dec2str(venda),
+                custo=_dec2str(custo),
+                resultado=_dec2str(venda - custo),
+            ),
+        )
+
+    def run(self, linhas: Iterable[LinhaConvertida]) -> Iterator[LinhaConvertida]:
+        for linha in linhas:
+            try:
+                aplicada = self.apply(linha)
+            except VendaDescobertaError as exc:
+                logger.error("ledger: %s, fica de fora", exc)  # noqa: TRY400
+                self.descobertas.append(linha)
+                continue
+            except SemCambioError as exc:
+                logger.error("ledger: %s, fica de fora", exc)  # noqa: TRY400
+                self.sem_cambio.append(linha)
+                continue
+            yield aplicada
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "versao": VERSAO,
+            "data": None if self.data is None else self.data.isoformat(),
+            "posicoes": {ativo: [str(p.quantidade), str(p.custo)] for ativo, p in self.posicoes.items()},
+            "lotes": {ativo: [[str(q), str(c)] for q, c in lotes] for ativo, lotes in self.lotes.items() if lotes},
+        }
+
+    @classmethod
+    def restore(
+        cls,
+        snapshot: dict[str, Any],
+        index: HoldingsIndex | None = None,
+        rollup: TaxRollup | None = None,
+    ) -> "Ledger":
+        return cls(
+            {ativo: Position(dec.Decimal(q), dec.Decimal(c)) for ativo, (q, c) in snapshot["posicoes"].items()},
+            None if snapshot["data"] is None else dt.date.fromisoformat(snapshot["data"]),
+            index,
+            {
+                ativo: collections.deque([dec.Decimal(q), dec.Decimal(c)] for q, c in lotes)
+                for ativo, lotes in snapshot.get("lotes", {}).items()
+            },
+            rollup,
+        )
+
+
+def _escrever(ledger: Ledger, linhas: Iterable[LinhaConvertida], saida: TextIO, ganhos: TextIO) -> None:
+    csv_saida = csv.DictWriter(saida, CABECALHO, dialect="unix")
+    csv_ganhos = csv.DictWriter(ganhos, CABECALHO_GANHOS, dialect="unix")
+    for linha in ledger.run(linhas):
+        csv_saida.writerow(linha)
+        csv_ganhos.writerows(ledger.realizados)
+        ledger.realizados.clear()
+    if ledger.descobertas:
+        logger.warning("ledger: %d vendas maiores que a posição ficaram de fora", len(ledger.descobertas))
+    if ledger.sem_cambio:
+        logger.warning("ledger: %d linhas do exterior sem câmbio ficaram de fora, veja --ptax", len(ledger.sem_cambio))
+
+
+def _ler(entrada: pathlib.Path, inicio: int) -> Sequence[LinhaConvertida]:
+    with entrada.open("rb") as f:
+        f.seek(inicio)
+        texto = f.read().decode()
+    leitor = csv.DictReader(io.StringIO(texto), CABECALHO if inicio else None, dialect="unix")
+    return list(leitor)  # type: ignore[arg-type]
+
+
+# snapshots de outra versão (custos em dólar, antes da v2) refazem o ledger
+VERSAO: Final[int] = 2
+LEDGER: Final[str] = "ledger.csv"
+GANHOS: Final[str] = "ganhos.csv"
+SNAPSHOT: Final[str] = ".ledger.json"
+HOLDINGS: Final[str] = ".holdings.json"
+DARF: Final[str] = ".darf.json"
+
+
+def _retomavel(
+    snapshot: dict[str, Any],
+    entrada: pathlib.Path,
+    size: int,
+    saida: pathlib.Path,
+    ganhos: pathlib.Path,
+) -> bool:
+    # o snapshot só vale se as saídas existem e all.csv só cresceu desde ele
+    return (
+        snapshot.get("versao") == VERSAO
+        and saida.is_file()
+        and ganhos.is_file()
+        and snapshot["size"] <= size
+        and _prefix_digest(entrada, snapshot["size"]) == snapshot["sha256"]
+    )
+
+
+# ledger.csv is all.csv in date order with running quantidade_final/preco_medio,
+# ganhos.csv has the realized gain of every sale, and the HoldingsIndex and TaxRollup
+# are built from the same pass. The snapshot remembers how much of all.csv it has seen
+# (size and hash of that prefix): rows appended by --incremental are applied on top
+# of it, anything else replays.
+def atualizar(entrada: pathlib.Path, pasta: pathlib.Path) -> Ledger:
+    saida = pasta / LEDGER
+    ganhos = pasta / GANHOS
+    size = entrada.stat().st_size
+    try:
+        with (pasta / SNAPSHOT).open(encoding="utf-8") as f:
+            snapshot = json.load(f)
+        index = HoldingsIndex.load(pasta / HOLDINGS)
+        rollup = TaxRollup.load(pasta / DARF)
+    except (OSError, ValueError, KeyError):
+        snapshot = None
+
+    if snapshot is not None and _retomavel(snapshot, entrada, size, saida, ganhos):
+        ledger = Ledger.restore(snapshot, index, rollup)
+        novas = ordenar(_ler(entrada, snapshot["size"]))
+        if not novas or ledger.data is None or data_linha(novas[0]) >= ledger.data:
+            logger.info("ledger: %d linhas novas", len(novas))
+            with saida.open("a", encoding="utf-8") as f, ganhos.open("a", encoding="utf-8") as g:
+                _escrever(ledger, novas, f, g)
+            if novas:
+                _salvar(pasta, ledger, entrada, size)
+            return ledger
+        logger.info("ledger: nota anterior a %s, refazendo", ledger.data)
+
+    ledger = Ledger(index=HoldingsIndex(), rollup=TaxRollup())
+    with substituir(saida) as f, substituir(ganhos) as g:
+        csv.DictWriter(f, CABECALHO, dialect="unix").writeheader()
+        csv.DictWriter(g, CABECALHO_GANHOS, dialect="unix").writeheader()
+        _escrever(ledger, ordenar(_ler(entrada, 0)), f, g)
+    _salvar(pasta, ledger, entrada, size)
+    return ledger
+
+
+def _prefix_digest(entrada: pathlib.Path, size: int) -> str:
+    sha = hashlib.sha256()
+    with entrada.open("rb") as f:
+        sha.update(f.read(size))
+    return sha.hexdigest()
+
+
+def _salvar(pasta: pathlib.Path, ledger: Ledger, entrada: pathlib.Path, size: int) -> None:
+    if ledger.index is not None:
+        ledger.index.save(pasta / HOLDINGS)
+    if ledger.rollup is not None:
+        ledger.rollup.save(pasta / DARF)
+    with substituir(pasta / SNAPSHOT) as f:
+        json.dump({**ledger.snapshot(), "size": size, "sha256": _prefix_digest(entrada, size)}, f)
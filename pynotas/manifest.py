@@ -0,0 +1,77 @@
+import json
+import logging
+import pathlib
+from typing import Any, Final, Sequence
+
+from pynotas.cache import file_digest
+from pynotas.utils import substituir
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_PATH: Final[pathlib.Path] = pathlib.Path("data") / ".manifest.json"
+
+
+def _unchanged(file_path: pathlib.Path, emitida: dict[str, Any]) -> bool:
+    stat = file_path.stat()
+    if stat.st_size != emitida["size"]:
+        return False
+    if stat.st_mtime_ns == emitida["mtime_ns"]:
+        return True
+    if file_digest(file_path) != emitida["sha256"]:
+        return False
+    emitida["mtime_ns"] = stat.st_mtime_ns
+    return True
+
+
+# Every note whose rows are already in the CSVs, per broker, with the parser version
+# that produced them. pending() lists the notes still to be appended, or None when an
+# emitted note changed or disappeared and the broker has to be rebuilt. size and mtime
+# are compared first and the hash is only read when they differ, so a note that was
+# merely touched is not a change.
+class Manifest:
+    def __init__(self, path: pathlib.Path = MANIFEST_PATH) -> None:
+        self.path = path
+        self.brokers: dict[str, dict[str, Any]] = {}
+
+    @classmethod
+    def load(cls, path: pathlib.Path = MANIFEST_PATH) -> "Manifest":
+        manifest = cls(path)
+        try:
+            with path.open(encoding="utf-8") as f:
+                manifest.brokers = json.load(f)
+        except (OSError, ValueError):
+            logger.info("manifest: %s ausente ou inválido, refazendo tudo", path)
+        return manifest
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with substituir(self.path) as f:
+            json.dump(self.brokers, f, indent=1)
+
+    def pending(self, broker: str, version: str, files: Sequence[pathlib.Path]) -> Sequence[pathlib.Path] | None:
+        registro = self.brokers.get(broker)
+        if registro is None or registro["version"] != version:
+            return None
+        notas: dict[str, dict[str, Any]] = registro["notas"]
+        atuais = {str(file_path) for file_path in files}
+        if any(nome not in atuais for nome in notas):
+            return None
+        novas = []
+        for file_path in files:
+            emitida = notas.get(str(file_path))
+            if emitida is None:
+                novas.append(file_path)
+            elif not _unchanged(file_path, emitida):
+                return None
+        return novas
+
+    def reset(self, broker: str, version: str) -> None:
+        self.brokers[broker] = {"version": version, "notas": {}}
+
+    def record(self, broker: str, file_path: pathlib.Path) -> None:
+        stat = file_path.stat()
+        self.brokers[broker]["notas"][str(file_path)] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": file_digest(file_path),
+        }
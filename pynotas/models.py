@@ -1,12 +1,33 @@
-
+import array
 import datetime as dt
 import decimal as dec
 from enum import Enum
-from typing import Mapping, MutableMapping, NamedTuple, TypedDict, TypeVar
+from typing import (
+    Final,
+    Iterable,
+    Iterator,
+    Mapping,
+    MutableMapping,
+    NamedTuple,
+    Protocol,
+    Sequence,
+    TypedDict,
+    TypeVar,
+    overload,
+)
 
-ProcessedDataType = Mapping[str, MutableMapping[str, dec.Decimal]]
+# (ativo, operação): operação é "C" para compra e "V" para venda
+ProcessedDataType = Mapping[tuple[str, str], MutableMapping[str, dec.Decimal]]
 AnyNumber = TypeVar("AnyNumber", int, dec.Decimal)
 
+# casas das colunas numéricas de Negocios: quantidade 1e-8, e preço e total também
+ESCALA: Final[int] = 8
+_EXATO: Final[dec.Context] = dec.Context(traps=[dec.Inexact, dec.InvalidOperation])
+
+
+class TextElement(Protocol):
+    def get_text(self) -> str: ...
+
 
 class LinhaPlanilha(TypedDict):
     data: str
@@ -25,18 +46,226 @@ class LinhaPlanilha(TypedDict):
     total_investido: str
 
 
+class LinhaConvertida(LinhaPlanilha):
+    cambio: str
+    preco_total_brl: str
+    total_investido_brl: str
+
+
+class LinhaGanho(TypedDict):
+    data: str
+    ativo: str
+    tipo: str
+    local: str
+    corretora: str
+    quantidade: str
+    venda: str
+    custo: str
+    resultado: str
+
+
+def inteiros(valores: Iterable[dec.Decimal], escala: int = ESCALA) -> "array.array[int] | None":
+    # None quando algum valor tem mais casas que a escala ou não cabe em 64 bits
+    try:
+        return array.array("q", [int(valor.scaleb(escala).to_integral_exact(context=_EXATO)) for valor in valores])
+    except (dec.Inexact, dec.InvalidOperation, OverflowError, ValueError):
+        return None
+
+
+# Coluna de Decimal guardada como inteiros de 64 bits na escala de ESCALA casas: 8 bytes
+# por valor num array, em vez de um objeto Decimal por valor numa lista. O valor volta
+# igual, só com zeros à direita ("424" volta "424.00000000"). Se algum valor não cabe na
+# escala, a coluna inteira passa a ser uma lista de Decimal.
+class Decimais:
+    __slots__ = ("_decimais", "_inteiros")
+    _inteiros: "array.array[int] | None"
+    _decimais: list[dec.Decimal] | None
+
+    def __init__(self, valores: "Iterable[dec.Decimal] | array.array[int]" = ()) -> None:
+        # um array vem já na escala de ESCALA, como o de uma fatia
+        if isinstance(valores, array.array):
+            self._inteiros, self._decimais = valores, None
+            return
+        valores = valores if isinstance(valores, (list, tuple)) else list(valores)
+        self._inteiros = inteiros(valores)
+        self._decimais = None if self._inteiros is not None else list(valores)
+
+    @property
+    def escalados(self) -> "array.array[int] | None":
+        return self._inteiros
+
+    def __len__(self) -> int:
+        return len(self._inteiros) if self._inteiros is not None else len(self._decimais or ())
+
+    def __iter__(self) -> Iterator[dec.Decimal]:
+        if self._inteiros is None:
+            return iter(self._decimais or ())
+        escala = -ESCALA
+        return (dec.Decimal(inteiro).scaleb(escala) for inteiro in self._inteiros)
+
+    @overload
+    def __getitem__(self, indice: int) -> dec.Decimal: ...
+    @overload
+    def __getitem__(self, indice: slice) -> "Decimais": ...
+    def __getitem__(self, indice: int | slice) -> "dec.Decimal | Decimais":
+        if isinstance(indice, slice):
+            return Decimais((self._decimais or [])[indice] if self._inteiros is None else self._inteiros[indice])
+        if self._inteiros is None:
+            return (self._decimais or [])[indice]
+        return dec.Decimal(self._inteiros[indice]).scaleb(-ESCALA)
+
+    def append(self, valor: dec.Decimal) -> None:
+        if self._inteiros is not None:
+            try:
+                self._inteiros.append(int(valor.scaleb(ESCALA).to_integral_exact(context=_EXATO)))
+            except (dec.Inexact, dec.InvalidOperation, OverflowError, ValueError):
+                self._decimais, self._inteiros = list(self), None
+            else:
+                return
+        if self._decimais is not None:
+            self._decimais.append(valor)
+
+    def extend(self, valores: Iterable[dec.Decimal]) -> None:
+        if self._inteiros is not None:
+            novos = valores.escalados if isinstance(valores, Decimais) else inteiros(valores := list(valores))
+            if novos is not None:
+                self._inteiros.extend(novos)
+                return
+            self._decimais, self._inteiros = list(self), None
+        if self._decimais is not None:
+            self._decimais.extend(valores)
+
+
+# Coluna de textos repetidos (ativo, tipo): cada texto diferente fica guardado uma vez, e a
+# coluna é um array de índices para ele.
+class Categorias:
+    __slots__ = ("_codigos", "_indices", "_valores")
+
+    def __init__(self, valores: Iterable[str] = ()) -> None:
+        self._codigos = array.array("I")
+        self._valores: list[str] = []
+        self._indices: dict[str, int] = {}
+        self.extend(valores)
+
+    def __len__(self) -> int:
+        return len(self._codigos)
+
+    @property
+    def codigos(self) -> "array.array[int]":
+        return self._codigos
+
+    @property
+    def textos(self) -> Sequence[str]:
+        return self._valores
+
+    def __iter__(self) -> Iterator[str]:
+        return map(self._valores.__getitem__, self._codigos)
+
+    @overload
+    def __getitem__(self, indice: int) -> str: ...
+    @overload
+    def __getitem__(self, indice: slice) -> "Categorias": ...
+    def __getitem__(self, indice: int | slice) -> "str | Categorias":
+        if isinstance(indice, slice):
+            return Categorias(map(self._valores.__getitem__, self._codigos[indice]))
+        return self._valores[self._codigos[indice]]
+
+    def _codigo(self, valor: str) -> int:
+        codigo = self._indices.get(valor)
+        if codigo is None:
+            codigo = self._indices[valor] = len(self._valores)
+            self._valores.append(valor)
+        return codigo
+
+    def append(self, valor: str) -> None:
+        self._codigos.append(self._codigo(valor))
+
+    def extend(self, valores: Iterable[str]) -> None:
+        if isinstance(valores, Categorias):
+            tabela = [self._codigo(valor) for valor in valores.textos]
+            self._codigos.extend([tabela[codigo] for codigo in valores.codigos])
+        else:
+            self._codigos.extend([self._codigo(valor) for valor in valores])
+
+
+# Negócios de uma nota em colunas, na ordem em que aparecem. Vendas têm quantidade e total
+# negativos (o preço fica positivo). As colunas sempre têm o mesmo tamanho: o construtor
+# confere uma vez, e append, extend e as fatias mantêm isso.
+class Negocios:
+    __slots__ = ("ativos", "precos", "quantidades", "tipos", "totais")
+
+    def __init__(
+        self,
+        ativos: Iterable[str] = (),
+        tipos: Iterable[str] = (),
+        quantidades: Iterable[dec.Decimal] = (),
+        precos: Iterable[dec.Decimal] = (),
+        totais: Iterable[dec.Decimal] = (),
+    ) -> None:
+        self.ativos = ativos if isinstance(ativos, Categorias) else Categorias(ativos)
+        self.tipos = tipos if isinstance(tipos, Categorias) else Categorias(tipos)
+        self.quantidades = quantidades if isinstance(quantidades, Decimais) else Decimais(quantidades)
+        self.precos = precos if isinstance(precos, Decimais) else Decimais(precos)
+        self.totais = totais if isinstance(totais, Decimais) else Decimais(totais)
+        for nome, coluna in (
+            ("types", self.tipos),
+            ("quantities", self.quantidades),
+            ("prices", self.precos),
+            ("totals", self.totais),
+        ):
+            if len(coluna) != len(self.ativos):
+                msg = f"missing {nome} in PDF...\nExpected {len(self.ativos)}, got {len(coluna)}"
+                raise SystemError(msg)
+
+    def __len__(self) -> int:
+        return len(self.ativos)
+
+    def __iter__(self) -> Iterator[tuple[str, str, dec.Decimal, dec.Decimal, dec.Decimal]]:
+        return zip(self.ativos, self.tipos, self.quantidades, self.precos, self.totais, strict=True)
+
+    def __getitem__(self, indice: slice) -> "Negocios":
+        return Negocios(
+            self.ativos[indice], self.tipos[indice], self.quantidades[indice], self.precos[indice], self.totais[indice],
+        )
+
+    def append(
+        self, ativo: str, tipo: str, quantidade: dec.Decimal, preco: dec.Decimal, total: dec.Decimal,
+    ) -> None:
+        self.ativos.append(ativo)
+        self.tipos.append(tipo)
+        self.quantidades.append(quantidade)
+        self.precos.append(preco)
+        self.totais.append(total)
+
+    def extend(self, outros: "Negocios") -> None:
+        self.ativos.extend(outros.ativos)
+        self.tipos.extend(outros.tipos)
+        self.quantidades.extend(outros.quantidades)
+        self.precos.extend(outros.precos)
+        self.totais.extend(outros.totais)
+
+
 class Planilha(NamedTuple):
     data_nota: dt.datetime
     contador: int
-    ativos: list[str]
-    tipos: list[str]
-    quantidades: list[dec.Decimal]
-    precos: list[dec.Decimal]
-    totais: list[dec.Decimal]
+    negocios: Negocios
     taxa_liquidacao: dec.Decimal
     taxa_emolumento: dec.Decimal
     nota_total_sem_taxa: dec.Decimal
     nota_total_com_taxa: dec.Decimal
+    # custos operacionais (taxa operacional, execução, custódia e impostos) são rateados
+    # com as taxas; o I.R.R.F. retido na venda só entra na conferência do líquido
+    custos_operacionais: dec.Decimal = dec.Decimal(0)
+    irrf: dec.Decimal = dec.Decimal(0)
+
+
+class Position(NamedTuple):
+    quantidade: dec.Decimal
+    custo: dec.Decimal
+
+    @property
+    def preco_medio(self) -> dec.Decimal:
+        return self.custo / self.quantidade if self.quantidade else dec.Decimal(0)
 
 
 class TickerType(str, Enum):
@@ -46,11 +275,5 @@ class TickerType(str, Enum):
 
 
 class Sheet(NamedTuple):
-    date: dt.date
-    counter: int
-    actions: list[str]
-    tickers: list[str]
-    types: list[TickerType]
-    quantities: list[dec.Decimal]
-    prices: list[dec.Decimal]
-    totals: list[dec.Decimal]
+    dates: Sequence[dt.date]  # uma por negócio
+    trades: Negocios
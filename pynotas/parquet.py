@@ -0,0 +1,133 @@
+import contextlib
+import csv
+import decimal as dec
+import logging
+import pathlib
+from typing import Any, Final, Iterable, Iterator, Mapping, Sequence
+
+import pyarrow as pa  # type: ignore[import-untyped]
+import pyarrow.parquet as pq  # type: ignore[import-untyped]
+
+from pynotas.models import LinhaPlanilha
+from pynotas.parser import to_dec, to_dt
+from pynotas.utils import CABECALHO, DECIMAL2STR, publicar, temporario
+
+logger = logging.getLogger(__name__)
+
+ROW_GROUP: Final[int] = 10000
+CATEGORIAS: Final[Sequence[str]] = ("tipo", "local", "corretora")
+DECIMAL: Final[Any] = pa.decimal128(38, 18)
+QUANTUM: Final[dec.Decimal] = dec.Decimal(1).scaleb(-DECIMAL.scale)
+CONTEXTO: Final[dec.Context] = dec.Context(prec=DECIMAL.precision)
+CSV_SIZE: Final[bytes] = b"pynotas.csv_size"
+
+
+def _tipo(coluna: str) -> Any:  # noqa: ANN401
+    if coluna == "data":
+        return pa.date32()
+    if coluna in CATEGORIAS:
+        return pa.dictionary(pa.int32(), pa.string())
+    if coluna in DECIMAL2STR:
+        return DECIMAL
+    return pa.string()
+
+
+SCHEMA: Final[Any] = pa.schema([pa.field(coluna, _tipo(coluna)) for coluna in CABECALHO])
+
+
+def _decimal(valor: str) -> dec.Decimal | None:
+    return CONTEXTO.quantize(to_dec(valor), QUANTUM) if valor else None
+
+
+def _batch(linhas: Sequence[Mapping[str, str]]) -> Any:  # noqa: ANN401
+    colunas = []
+    for coluna in CABECALHO:
+        valores = [linha.get(coluna, "") for linha in linhas]
+        if coluna == "data":
+            colunas.append(pa.array([to_dt(valor).date() for valor in valores], pa.date32()))
+        elif coluna in DECIMAL2STR:
+            colunas.append(pa.array([_decimal(valor) for valor in valores], DECIMAL))
+        else:
+            colunas.append(pa.array(valores, SCHEMA.field(coluna).type))
+    return pa.RecordBatch.from_arrays(colunas, schema=SCHEMA)
+
+
+class _Escritor:
+    def __init__(self, writer: Any) -> None:  # noqa: ANN401
+        self.writer = writer
+        self.linhas: list[Mapping[str, str]] = []
+
+    def escrever(self, linhas: Iterable[LinhaPlanilha]) -> None:
+        for linha in linhas:
+            self.linhas.append(linha)  # type: ignore[arg-type]
+            if len(self.linhas) >= ROW_GROUP:
+                self.descarregar()
+
+    def descarregar(self) -> None:
+        if self.linhas:
+            self.writer.write_batch(_batch(self.linhas), row_group_size=len(self.linhas))
+            self.linhas.clear()
+
+
+# Cópia colunar de cada <corretora>.csv e de all.csv, em data/*.parquet: data como
+# date32, números em decimal128(38, 18) e tipo/local/corretora como dicionário. As
+# linhas vão saindo em row groups de ROW_GROUP linhas conforme as notas são lidas.
+# Parquet não aceita append, então uma corretora incremental recopia os row groups do
+# arquivo anterior, um de cada vez, antes das linhas novas. O tamanho do CSV que o
+# arquivo espelha fica nos metadados, e um parquet que não bate com o CSV é refeito a
+# partir dele.
+class ParquetSink:
+    def __init__(self, pasta: pathlib.Path) -> None:
+        self.pasta = pasta
+        self.alterado = False
+
+    def path(self, name: str) -> pathlib.Path:
+        return self.pasta / (name + ".parquet")
+
+    def atualizado(self, name: str) -> bool:
+        try:
+            metadata = pq.read_metadata(self.path(name)).metadata or {}
+            csv_size = (self.pasta / (name + ".csv")).stat().st_size
+        except (OSError, pa.ArrowInvalid):
+            return False
+        return metadata.get(CSV_SIZE) == str(csv_size).encode()
+
+    @contextlib.contextmanager
+    def broker(self, name: str, *, anexar: bool) -> Iterator[_Escritor]:
+        destino = self.path(name)
+        with temporario(destino) as tmp_path:
+            try:
+                with pq.ParquetWriter(tmp_path, SCHEMA) as writer:
+                    escritor = _Escritor(writer)
+                    if anexar and self.atualizado(name):
+                        _copiar(destino, writer)
+                    elif anexar:
+                        logger.info("parquet: %s não bate com %s.csv, refazendo", destino, name)
+                        with (self.pasta / (name + ".csv")).open(encoding="utf-8") as csv_file:
+                            escritor.escrever(csv.DictReader(csv_file, dialect="unix"))  # type: ignore[arg-type]
+                    try:
+                        yield escritor
+                    finally:
+                        escritor.descarregar()
+                        # o CSV já está no lugar quando a corretora termina (ou parou no meio)
+                        csv_size = (self.pasta / (name + ".csv")).stat().st_size
+                        writer.add_key_value_metadata({CSV_SIZE: str(csv_size).encode()})
+            except BaseException:
+                # --incremental mantém as notas que já entraram no CSV, e o parquet junto
+                if anexar and tmp_path.exists():
+                    publicar(tmp_path, destino)
+                    self.alterado = True
+                raise
+        self.alterado = True
+
+    def juntar(self, names: Iterable[str]) -> None:
+        with temporario(self.path("all")) as tmp_path, pq.ParquetWriter(tmp_path, SCHEMA) as writer:
+            for name in names:
+                with contextlib.suppress(FileNotFoundError):
+                    _copiar(self.path(name), writer)
+
+
+def _copiar(origem: pathlib.Path, writer: Any) -> None:  # noqa: ANN401
+    arquivo = pq.ParquetFile(origem)
+    for index in range(arquivo.num_row_groups):
+        writer.write_table(arquivo.read_row_group(index), row_group_size=arquivo.metadata.row_group(index).num_rows)
@@ -2,16 +2,16 @@ import datetime as dt
 import decimal as dec
 from typing import TYPE_CHECKING, Iterator, Mapping, MutableMapping, Sequence
 
-import pytz as tz
-
 if TYPE_CHECKING:
-    from pdfminer.layout import LTTextBoxHorizontal
+    from pynotas.models import TextElement
 
 import logging
-import sys
 
-from pynotas.models import LinhaPlanilha, Planilha, ProcessedDataType
+from pynotas.formatting import PT_BR
+from pynotas.models import LinhaPlanilha, Negocios, Planilha, ProcessedDataType
 from pynotas.utils import (
+    BRASIL,
+    IntegridadeError,
     _assert_data_found,
     almost_equal,
     assert_almost_equal,
@@ -19,6 +19,8 @@ from pynotas.utils import (
 
 logger = logging.getLogger(__name__)
 
+COMPRA = "C"
+VENDA = "V"
 SEPARADORES_XP: Sequence[tuple[str | None, int]] = (
     (" CI ER", 0),
     (" CI", 0),
@@ -35,13 +37,14 @@ SEPARADORES_NU: Sequence[tuple[str | None, int]] = (
 )
 
 
-def aprint(elements: Iterator["LTTextBoxHorizontal"]) -> None:
+def aprint(elements: Iterator["TextElement"]) -> None:
     logger.info("aprint: ")
     try:
         while True:
             logger.info("aprint: >>> %s", get_next_text(elements))
     except StopIteration:
-        sys.exit()
+        msg = "aprint"
+        raise SystemError(msg) from None
 
 
 def _add2default(
@@ -55,47 +58,57 @@ def _add2default(
 
 def to_dt(t_text: str) -> dt.datetime:
     ano, mes, dia = map(int, t_text.split("/")[::-1])
-    return dt.datetime(ano, mes, dia, tzinfo=tz.utc)
+    return dt.datetime(ano, mes, dia, tzinfo=dt.timezone.utc)
 
 
 def to_dec(t_number: str) -> dec.Decimal:
     return dec.Decimal(t_number.replace(".", "").replace(",", "."))
 
 
-def get_next(gn_elements: Iterator["LTTextBoxHorizontal"], gn_times: int = 1) -> "LTTextBoxHorizontal":
+def to_dec_dc(t_number: str) -> dec.Decimal:
+    # valores com D/C no fim: crédito (C) é dinheiro entrando, ou seja, uma venda
+    t_valor, _, t_dc = t_number.rpartition(" ")
+    if t_dc not in ("D", "C"):
+        return to_dec(t_number)
+    return -to_dec(t_valor) if t_dc == "C" else to_dec(t_valor)
+
+
+def assinar_vendas(av_quantidades: list[dec.Decimal], av_totais: list[dec.Decimal]) -> list[dec.Decimal]:
+    # vendas têm quantidade e total negativos, o preço continua positivo
+    return [-abs(q) if t < 0 else q for q, t in zip(av_quantidades, av_totais, strict=True)]
+
+
+def get_next(gn_elements: Iterator["TextElement"], gn_times: int = 1) -> "TextElement":
     for _ in range(gn_times - 1):
         next(gn_elements)
     return next(gn_elements)
 
 
-def get_text(gt_element: "LTTextBoxHorizontal") -> str:
+def get_text(gt_element: "TextElement") -> str:
     return gt_element.get_text().strip()
 
 
-def get_next_text(gnt_elements: Iterator["LTTextBoxHorizontal"], gnt_times: int = 1) -> str:
+def get_next_text(gnt_elements: Iterator["TextElement"], gnt_times: int = 1) -> str:
     gnt_element = get_next(gnt_elements, gnt_times)
     return get_text(gnt_element)
 
 
-def montar_dados_nota(
-    mdn_ativos: list[str],
-    mdn_tipos: list[str],
-    mdn_quantidades: list[dec.Decimal],
-    mdn_precos: list[dec.Decimal],
-    mdn_totais: list[dec.Decimal],
-) -> Mapping[str, Mapping[str, list[dec.Decimal]]]:
-    mdn_dados_nota: MutableMapping[str, MutableMapping[str, list[dec.Decimal]]] = {}
-    for mdn_indice_nota, mdn_nome_nota in enumerate(mdn_ativos):
-        mdn_dic_nota = mdn_dados_nota.setdefault(mdn_nome_nota, {})
-        mdn_dic_nota["tipo"] = mdn_tipos[mdn_indice_nota]  # type:ignore[assignment]
-        _add2default(mdn_dic_nota, "quantidade", mdn_quantidades[mdn_indice_nota])
-        _add2default(mdn_dic_nota, "preco_sem_taxa", mdn_precos[mdn_indice_nota])
-        _add2default(mdn_dic_nota, "total_sem_taxa", mdn_totais[mdn_indice_nota])
+def montar_dados_nota(mdn_negocios: "Negocios") -> Mapping[tuple[str, str], Mapping[str, list[dec.Decimal]]]:
+    mdn_dados_nota: MutableMapping[tuple[str, str], MutableMapping[str, list[dec.Decimal]]] = {}
+    for mdn_nome_nota, mdn_tipo, mdn_quantidade, mdn_preco, mdn_total in mdn_negocios:
+        mdn_operacao = VENDA if mdn_quantidade < 0 else COMPRA
+        mdn_dic_nota = mdn_dados_nota.setdefault((mdn_nome_nota, mdn_operacao), {})
+        mdn_dic_nota["tipo"] = mdn_tipo  # type:ignore[assignment]
+        _add2default(mdn_dic_nota, "quantidade", mdn_quantidade)
+        _add2default(mdn_dic_nota, "preco_sem_taxa", mdn_preco)
+        _add2default(mdn_dic_nota, "total_sem_taxa", mdn_total)
     return mdn_dados_nota
 
 
-def montar_dados_processados(mdp_dados_nota: Mapping[str, Mapping[str, list[dec.Decimal]]]) -> ProcessedDataType:
-    mdp_dados_processados: MutableMapping[str, MutableMapping[str, dec.Decimal]] = {}
+def montar_dados_processados(
+    mdp_dados_nota: Mapping[tuple[str, str], Mapping[str, list[dec.Decimal]]],
+) -> ProcessedDataType:
+    mdp_dados_processados: MutableMapping[tuple[str, str], MutableMapping[str, dec.Decimal]] = {}
     for mdp_nome_nota, mdp_ativo_nota in mdp_dados_nota.items():
         mdp_dic_processado = mdp_dados_processados.setdefault(mdp_nome_nota, {})
         mdp_dic_processado["tipo"] = mdp_ativo_nota["tipo"]  # type:ignore[assignment]
@@ -108,13 +121,14 @@ def montar_dados_processados(mdp_dados_nota: Mapping[str, Mapping[str, list[dec.
             mdp_total_processado += (
                 mdp_quantidade_nota * mdp_ativo_nota["preco_sem_taxa"][mdp_indice]
             )
-        if mdp_total_processado != sum(mdp_ativo_nota["total_sem_taxa"]):
+        mdp_total_nota = sum(mdp_ativo_nota["total_sem_taxa"])
+        if mdp_total_processado != mdp_total_nota:
             logger.error(
-                "mdp_nome_nota=%s, mdp_total_processado=%f, sum(mdp_ativo_nota['total'])=%f",
-                mdp_nome_nota, mdp_total_processado, sum(mdp_ativo_nota["total"]),
+                "mdp_nome_nota=%s, mdp_total_processado=%f, sum(mdp_ativo_nota['total_sem_taxa'])=%f",
+                mdp_nome_nota, mdp_total_processado, mdp_total_nota,
             )
-            msg = "mdp_total_processado != sum(mdp_ativo_nota['total'])"
-            raise SystemError(msg)
+            etapa = "total-ativo"
+            raise IntegridadeError(etapa, mdp_total_processado, mdp_total_nota)
         mdp_dic_processado["preco_sem_taxa"] = (
             mdp_total_processado / mdp_dic_processado["quantidade"]
         )
@@ -124,12 +138,22 @@ def montar_dados_processados(mdp_dados_nota: Mapping[str, Mapping[str, list[dec.
 
 def pos_processamento(
     pp_dados_processados: ProcessedDataType,
-    pp_total_sem_taxa: dec.Decimal,
+    pp_volume: dec.Decimal,
     pp_total_taxa: dec.Decimal,
 ) -> None:
+    # a taxa é rateada pelo volume (compras e vendas somam), e reduz o que uma venda recebe
+    if not pp_volume:
+        # só negócios a preço zero: não há por onde ratear, então a nota não pode ter taxa
+        assert_almost_equal(pp_total_taxa, dec.Decimal(0), "taxa-total")
+        for pp_valores_processados in pp_dados_processados.values():
+            pp_valores_processados["taxa_unitaria"] = dec.Decimal(0)
+            pp_valores_processados["taxa_total"] = dec.Decimal(0)
+            pp_valores_processados["preco_com_taxa"] = pp_valores_processados["preco_sem_taxa"]
+            pp_valores_processados["total_com_taxa"] = pp_valores_processados["total_sem_taxa"]
+        return
     pp_soma_final = dec.Decimal(0)
     for pp_valores_processados in pp_dados_processados.values():
-        pp_porcentagem = pp_valores_processados["total_sem_taxa"] / pp_total_sem_taxa
+        pp_porcentagem = abs(pp_valores_processados["total_sem_taxa"]) / pp_volume
         pp_taxa_ativo_total = pp_porcentagem * pp_total_taxa
         pp_taxa_ativo_unitario = (
             pp_taxa_ativo_total / pp_valores_processados["quantidade"]
@@ -166,29 +190,56 @@ def pos_processamento(
         pp_soma_final += pp_soma_parcial
 
 
+DECIMAL = "decimal"
+CENTAVOS = "centavos"
+MOTORES = (DECIMAL, CENTAVOS)
+_motor = DECIMAL
+
+
+def usar_motor(motor: str) -> None:
+    # chamado no processo principal e, via initializer, em cada worker do -j
+    global _motor  # noqa: PLW0603
+    if motor not in MOTORES:
+        msg = f"motor de rateio inválido: {motor}"
+        raise ValueError(msg)
+    _motor = motor
+
+
 def processar_dados(planilha: "Planilha") -> ProcessedDataType:
+    if _motor == CENTAVOS:
+        from pynotas.centavos import processar_centavos
 
-    assert_almost_equal(len(planilha.ativos), planilha.contador, "contador")
-    pd_dados_nota = montar_dados_nota(
-        planilha.ativos, planilha.tipos, planilha.quantidades, planilha.precos, planilha.totais,
-    )
+        pd_centavos = processar_centavos(planilha)
+        if pd_centavos is not None:
+            return pd_centavos
+    return processar_decimal(planilha)
+
+
+def processar_decimal(planilha: "Planilha") -> ProcessedDataType:
+
+    assert_almost_equal(len(planilha.negocios), planilha.contador, "contador")
+    pd_dados_nota = montar_dados_nota(planilha.negocios)
     pd_dados_processados = montar_dados_processados(pd_dados_nota)
     pd_total_sem_taxa = sum(
-        pd_processado["total_sem_taxa"]
-        for pd_processado in pd_dados_processados.values()
+        (pd_processado["total_sem_taxa"] for pd_processado in pd_dados_processados.values()),
+        dec.Decimal(0),
     )
+    # a nota traz o valor líquido das operações sem sinal (o D/C fica de fora)
     assert_almost_equal(
-        # type: ignore[type-var]
-        pd_total_sem_taxa,
+        abs(pd_total_sem_taxa),
         planilha.nota_total_sem_taxa,
         "nota-total",
     )
-    pd_taxa_total = planilha.taxa_liquidacao + planilha.taxa_emolumento
-    pd_total_com_taxa = pd_total_sem_taxa + pd_taxa_total
-    assert_almost_equal(pd_total_com_taxa, planilha.nota_total_com_taxa, "nota-total-taxa")
+    pd_taxa_total = planilha.taxa_liquidacao + planilha.taxa_emolumento + planilha.custos_operacionais
+    pd_total_com_taxa = pd_total_sem_taxa + pd_taxa_total + planilha.irrf
+    assert_almost_equal(abs(pd_total_com_taxa), planilha.nota_total_com_taxa, "nota-total-taxa")
+    pd_volume = sum(
+        abs(pd_processado["total_sem_taxa"])
+        for pd_processado in pd_dados_processados.values()
+    )
     pos_processamento(
         pd_dados_processados,
-        pd_total_sem_taxa,  # type: ignore[arg-type]
+        pd_volume,  # type: ignore[arg-type]
         pd_taxa_total,
     )
 
@@ -205,8 +256,7 @@ def processar_dados(planilha: "Planilha") -> ProcessedDataType:
     return pd_dados_processados
 
 
-def _dec2str(value: dec.Decimal) -> str:
-    return str(value).replace(",", "").replace(".", ",").strip("0")
+_dec2str = PT_BR.format_value
 
 
 def montar_planilha(
@@ -217,13 +267,13 @@ def montar_planilha(
 ) -> None:
     _assert_data_found(planilha)
 
-    for mp_nome, mp_dados in mp_dados_processados.items():
+    for (mp_nome, _), mp_dados in mp_dados_processados.items():
         mp_linhas_planilha.append(
             LinhaPlanilha(
                 data=f"{planilha.data_nota:%d/%m/%Y}",
                 ativo=mp_nome,
                 tipo=mp_dados["tipo"],  # type:ignore[typeddict-item]
-                local="Brasil",
+                local=BRASIL,
                 corretora=mp_local,
                 quantidade=_dec2str(mp_dados["quantidade"]),
                 taxa_ativo="0",
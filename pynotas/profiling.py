@@ -0,0 +1,127 @@
+import contextlib
+import cProfile
+import functools
+import json
+import logging
+import math
+import pathlib
+import time
+from typing import Any, Callable, Iterator, Mapping, Sequence, TypeVar, cast
+
+logger = logging.getLogger(__name__)
+
+FuncType = TypeVar("FuncType", bound=Callable[..., Any])
+
+SLOWEST: int = 10
+
+
+def _percentile(values: Sequence[float], percent: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+def _summary(values: Sequence[float]) -> Mapping[str, float]:
+    return {
+        "count": len(values),
+        "total": sum(values),
+        "p50": _percentile(values, 50),
+        "p95": _percentile(values, 95),
+        "max": max(values),
+    }
+
+
+class Profiler:
+    def __init__(self, note: pathlib.Path | None = None, note_output: pathlib.Path | None = None) -> None:
+        self.records: dict[pathlib.Path, dict[str, Any]] = {}
+        self.note = note.resolve() if note is not None else None
+        self.note_output = note_output
+        self._current: dict[str, float] | None = None
+
+    @contextlib.contextmanager
+    def file(self, broker: str, file_path: pathlib.Path) -> Iterator[None]:
+        record = self.records.setdefault(file_path, {"broker": broker, "file": str(file_path), "stages": {}})
+        previous, self._current = self._current, record["stages"]
+        profile = None
+        if self.note is not None and file_path.resolve() == self.note:
+            profile = cProfile.Profile()
+            profile.enable()
+        try:
+            with self.stage("total"):
+                yield
+        finally:
+            self._current = previous
+            if profile is not None:
+                profile.disable()
+                output = self.note_output or file_path.with_suffix(".pstats")
+                profile.dump_stats(output)
+                logger.warning("pstats de %s salvo em %s", file_path, output)
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        stages = self._current
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if stages is not None:
+                stages[name] = stages.get(name, 0.0) + time.perf_counter() - start
+
+    def report(self) -> Mapping[str, Any]:
+        stages: dict[str, list[float]] = {}
+        brokers: dict[str, dict[str, list[float]]] = {}
+        for record in self.records.values():
+            for name, seconds in record["stages"].items():
+                stages.setdefault(name, []).append(seconds)
+                brokers.setdefault(record["broker"], {}).setdefault(name, []).append(seconds)
+        slowest = sorted(self.records.values(), key=lambda record: record["stages"].get("total", 0.0), reverse=True)
+        return {
+            "files": len(self.records),
+            "stages": {name: _summary(values) for name, values in sorted(stages.items())},
+            "brokers": {
+                broker: {name: _summary(values) for name, values in sorted(broker_stages.items())}
+                for broker, broker_stages in brokers.items()
+            },
+            "slowest": slowest[:SLOWEST],
+        }
+
+    def write(self, output: pathlib.Path) -> None:
+        with output.open("w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2)
+
+
+_active: Profiler | None = None
+
+
+def activate(profiler: Profiler | None) -> None:
+    global _active  # noqa: PLW0603
+    _active = profiler
+
+
+def stage(name: str) -> contextlib.AbstractContextManager[None]:
+    if _active is None:
+        return contextlib.nullcontext()
+    return _active.stage(name)
+
+
+def file(broker: str, file_path: pathlib.Path) -> contextlib.AbstractContextManager[None]:
+    if _active is None:
+        return contextlib.nullcontext()
+    return _active.file(broker, file_path)
+
+
+def profiled(func: FuncType) -> FuncType:
+    # Sem --profile a função fica como está, sem um frame a mais por chamada. Por isso o
+    # profiler é ativado antes de o leitor da corretora ser importado (o registry só o
+    # importa na primeira nota).
+    if _active is None:
+        return func
+    name = f"{func.__module__.rsplit('.', 1)[-1]}.{func.__qualname__}"
+
+    @functools.wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:  # noqa: ANN401
+        if _active is None:
+            return func(*args, **kwargs)
+        with _active.stage(name):
+            return func(*args, **kwargs)
+
+    return cast("FuncType", wrapper)
@@ -0,0 +1,117 @@
+import array
+import bisect
+import datetime as dt
+import decimal as dec
+import logging
+import pathlib
+from typing import Final
+
+from pynotas.models import LinhaConvertida, LinhaPlanilha
+from pynotas.parser import _dec2str, to_dec, to_dt
+from pynotas.utils import EXTERIOR
+
+logger = logging.getLogger(__name__)
+
+PTAX_PATH: Final[pathlib.Path] = pathlib.Path("data") / "ptax.csv"
+MOEDA: Final[str] = "USD"
+ESCALA: Final[int] = 4
+# feriado emendado em fim de semana ainda cai aqui; mais que isso é tabela desatualizada
+MAX_ATRASO: Final[int] = 7
+
+
+def _data(texto: str) -> dt.date:
+    if "/" in texto:
+        return dt.datetime.strptime(texto, "%d/%m/%Y").date()  # noqa: DTZ007
+    return dt.datetime.strptime(texto, "%d%m%Y").date()  # noqa: DTZ007
+
+
+def _taxa(texto: str) -> int:
+    return int(to_dec(texto).scaleb(ESCALA).to_integral_value())
+
+
+# Cotações PTAX do dólar, lidas uma vez: datas (ordinais) e taxas de compra e venda em
+# décimos de milésimo, em arrays paralelos e ordenados. Uma data sem boletim (fim de
+# semana, feriado) usa o último dia útil antes dela, achado por bisect. Aceita o CSV
+# diário do Banco Central (DDMMAAAA;código;tipo;moeda;compra;venda;...) ou um CSV
+# simples data;compra;venda com DD/MM/AAAA.
+class PtaxTable:
+    def __init__(self) -> None:
+        self.datas = array.array("l")
+        self.compra = array.array("q")
+        self.venda = array.array("q")
+
+    @classmethod
+    def load(cls, path: pathlib.Path = PTAX_PATH) -> "PtaxTable":
+        cotacoes: dict[int, tuple[int, int]] = {}
+        with path.open(encoding="utf-8") as f:
+            for numero, linha in enumerate(f, 1):
+                campos = linha.strip().split(";")
+                if len(campos) >= 6:  # noqa: PLR2004
+                    if campos[3] != MOEDA:
+                        continue
+                    campos = [campos[0], campos[4], campos[5]]
+                if len(campos) != 3:  # noqa: PLR2004
+                    continue
+                try:
+                    data = _data(campos[0])
+                except ValueError:
+                    if numero > 1:
+                        logger.warning("%s:%d: data inválida %r", path, numero, campos[0])
+                    continue
+                cotacoes[data.toordinal()] = (_taxa(campos[1]), _taxa(campos[2]))
+        tabela = cls()
+        for ordinal in sorted(cotacoes):
+            tabela.datas.append(ordinal)
+            tabela.compra.append(cotacoes[ordinal][0])
+            tabela.venda.append(cotacoes[ordinal][1])
+        logger.info("ptax: %d cotações em %s", len(tabela.datas), path)
+        return tabela
+
+    def __len__(self) -> int:
+        return len(self.datas)
+
+    def cotacao(self, data: dt.date, *, venda: bool) -> dec.Decimal | None:
+        ordinal = data.toordinal()
+        index = bisect.bisect_right(self.datas, ordinal) - 1
+        if index < 0 or ordinal - self.datas[index] > MAX_ATRASO:
+            return None
+        taxas = self.venda if venda else self.compra
+        return dec.Decimal(taxas[index]).scaleb(-ESCALA)
+
+
+# Brasil já está em reais (câmbio 1). No exterior a compra usa a PTAX de venda e a venda
+# usa a PTAX de compra, as duas da data do pregão, como pede a Receita.
+class Conversor:
+    def __init__(self, tabela: PtaxTable | None) -> None:
+        self.tabela = tabela
+        self._avisado = False
+
+    def __call__(self, linha: LinhaPlanilha) -> LinhaConvertida:
+        if linha["local"] != EXTERIOR:
+            return {
+                **linha,
+                "cambio": "1",
+                "preco_total_brl": linha["preco_total"],
+                "total_investido_brl": linha["total_investido"],
+            }
+        cambio = self._cambio(linha)
+        if cambio is None:
+            return {**linha, "cambio": "", "preco_total_brl": "", "total_investido_brl": ""}
+        return {
+            **linha,
+            "cambio": _dec2str(cambio),
+            "preco_total_brl": _dec2str(to_dec(linha["preco_total"]) * cambio),
+            "total_investido_brl": _dec2str(to_dec(linha["total_investido"]) * cambio),
+        }
+
+    def _cambio(self, linha: LinhaPlanilha) -> dec.Decimal | None:
+        if self.tabela is None:
+            if not self._avisado:
+                logger.warning("sem tabela PTAX, linhas do exterior ficam sem valor em reais")
+                self._avisado = True
+            return None
+        data = to_dt(linha["data"]).date()
+        cambio = self.tabela.cotacao(data, venda=not linha["quantidade"].startswith("-"))
+        if cambio is None:
+            logger.warning("ptax: sem cotação para %s (%s), linha sem valor em reais", linha["data"], linha["ativo"])
+        return cambio
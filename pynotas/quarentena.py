@@ -0,0 +1,45 @@
+import datetime as dt
+import json
+import logging
+import pathlib
+from typing import Final
+
+from pynotas.utils import NotaError, substituir
+
+logger = logging.getLogger(__name__)
+
+QUARENTENA_PATH: Final[pathlib.Path] = pathlib.Path("data") / "quarentena.json"
+
+
+# Notas que falharam num --keep-going. Elas ficam fora dos CSVs, do banco, do parquet e
+# do manifest, então o próximo -i tenta de novo. O relatório em JSON traz uma entrada
+# por nota: arquivo, corretora, etapa, motivo e, nas conferências de total, o valor
+# esperado (o da nota) e o encontrado (a soma das linhas).
+class Quarentena:
+    def __init__(self, path: pathlib.Path = QUARENTENA_PATH) -> None:
+        self.path = path
+        self.inicio = dt.datetime.now(dt.timezone.utc)
+        self.lidas = 0
+        self.notas: dict[pathlib.Path, NotaError] = {}
+
+    def __len__(self) -> int:
+        return len(self.notas)
+
+    def __contains__(self, file_path: object) -> bool:
+        return file_path in self.notas
+
+    def registrar(self, erro: NotaError) -> None:
+        logger.warning("quarentena: %s", erro)
+        self.notas[erro.file_path] = erro
+
+    def salvar(self) -> None:
+        relatorio = {
+            "inicio": self.inicio.isoformat(timespec="seconds"),
+            "fim": dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds"),
+            "lidas": self.lidas,
+            "quarentena": len(self.notas),
+            "notas": [erro.diagnostico() for erro in self.notas.values()],
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with substituir(self.path) as f:
+            json.dump(relatorio, f, indent=1, ensure_ascii=False)
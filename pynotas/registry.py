@@ -0,0 +1,100 @@
+import contextlib
+import functools
+import importlib
+import json
+import logging
+import pathlib
+import sys
+from typing import TYPE_CHECKING, Any, Callable, Final, Iterable, Mapping, NamedTuple, Sequence
+
+from pynotas.utils import substituir
+
+if TYPE_CHECKING:
+    from pynotas.backends import Document
+    from pynotas.models import LinhaPlanilha
+
+logger = logging.getLogger(__name__)
+
+GRUPO: Final[str] = "pynotas.corretoras"
+PLUGINS_PATH: Final[pathlib.Path] = pathlib.Path("data") / ".corretoras.json"
+
+Leitor = Callable[["Document", str | None, int | None], Iterable["LinhaPlanilha"]]
+
+
+# Uma corretora que o pynotas sabe ler. nome é a pasta em data/ e o <nome>.csv, rotulo
+# vai na coluna corretora, versao entra no manifest e no cache (mude junto com o
+# leitor) e leitor é "módulo:função", importado só quando a primeira nota da corretora
+# é lida. marcas são os textos da primeira página que o --inbox usa para reconhecer a
+# corretora, com a versão do layout de cada grupo; o leitor recebe o documento, o
+# backend e essa versão (None quando a nota não passou pela detecção).
+class Corretora(NamedTuple):
+    nome: str
+    rotulo: str
+    versao: str
+    leitor: str
+    marcas: Sequence[tuple[Sequence[str], int]] = ()
+
+
+def _carregar(valor: str) -> object:
+    modulo, _, atributo = valor.partition(":")
+    return functools.reduce(getattr, atributo.split("."), importlib.import_module(modulo.strip()))
+
+
+@functools.cache
+def leitor(corretora: Corretora) -> Leitor:
+    return _carregar(corretora.leitor)  # type: ignore[return-value]
+
+
+def _assinatura() -> list[list[Any]]:
+    # instalar ou remover um pacote muda o mtime da pasta dele no sys.path
+    assinatura = []
+    for entrada in sys.path:
+        with contextlib.suppress(OSError):
+            assinatura.append([entrada, pathlib.Path(entrada or ".").stat().st_mtime_ns])
+    return assinatura
+
+
+def _pontos_de_entrada(path: pathlib.Path) -> dict[str, str]:
+    # importlib.metadata sozinho custa dezenas de ms de import: a lista dos entry points
+    # fica salva e só é refeita quando algo no sys.path mudou
+    assinatura = _assinatura()
+    try:
+        with path.open(encoding="utf-8") as f:
+            salvo = json.load(f)
+        if salvo["assinatura"] == assinatura:
+            return dict(salvo["corretoras"])
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    import importlib.metadata
+
+    pontos = {ponto.name: ponto.value for ponto in importlib.metadata.entry_points(group=GRUPO)}
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with substituir(path) as f:
+            json.dump({"assinatura": assinatura, "corretoras": pontos}, f)
+    except OSError as exc:
+        logger.debug("registry: não salvou %s: %s", path, exc)
+    return pontos
+
+
+# Corretoras embutidas, na ordem de sempre, e depois as de outros pacotes que declaram
+# um entry point no grupo pynotas.corretoras apontando para uma Corretora. O módulo
+# apontado é importado aqui, então deve ser leve: o leitor fica em outro módulo.
+@functools.cache
+def corretoras(path: pathlib.Path = PLUGINS_PATH) -> Mapping[str, Corretora]:
+    from pynotas.companies.corretoras import EMBUTIDAS
+
+    registradas = {corretora.nome: corretora for corretora in EMBUTIDAS}
+    for nome, valor in _pontos_de_entrada(path).items():
+        try:
+            corretora = _carregar(valor)
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("registry: corretora %s (%s) não carrega: %s", nome, valor, exc)
+            continue
+        if not isinstance(corretora, Corretora):
+            logger.warning("registry: %s (%s) não é uma Corretora", nome, valor)
+        elif registradas.get(corretora.nome, corretora) != corretora:
+            logger.warning("registry: %s (%s) tem o nome de outra corretora, ignorando", nome, valor)
+        else:
+            registradas[corretora.nome] = corretora
+    return registradas
@@ -0,0 +1,311 @@
+import contextlib
+import http.server
+import json
+import logging
+import pathlib
+import socket
+import socketserver
+import tempfile
+import threading
+import time
+import urllib.parse
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FuturoTimeout
+from typing import TYPE_CHECKING, Any, Callable, Final, Iterator, Mapping, Sequence
+
+from pynotas import detect, registry
+from pynotas.backends import BACKENDS
+from pynotas.utils import NotaError
+
+if TYPE_CHECKING:
+    from pynotas.models import LinhaPlanilha
+
+logger = logging.getLogger(__name__)
+
+HOST: Final[str] = "127.0.0.1"
+PORTA: Final[int] = 8765
+FILA: Final[int] = 16
+TIMEOUT: Final[float] = 30.0
+TAMANHO_MAXIMO: Final[int] = 20 * 1024 * 1024
+
+Leitor = Callable[[str, pathlib.Path, str | None, int | None], Sequence["LinhaPlanilha"]]
+
+
+class Resposta(Exception):  # noqa: N818
+    def __init__(self, status: int, corpo: Mapping[str, Any], **headers: str) -> None:
+        super().__init__(status, corpo)
+        self.status = status
+        self.corpo = corpo
+        self.headers = headers
+
+
+def _cronometrado(
+    ler: Leitor,
+    name: str,
+    file_path: pathlib.Path,
+    backend: str | None,
+    versao_layout: int | None,
+) -> tuple[Sequence["LinhaPlanilha"], float, float]:
+    # roda no worker; o relógio monotônico é o mesmo do processo que atendeu o pedido
+    inicio = time.monotonic()
+    linhas = ler(name, file_path, backend, versao_layout)
+    return linhas, inicio, time.monotonic()
+
+
+def _detectar(file_path: pathlib.Path, timings: dict[str, float]) -> detect.Classificacao:
+    inicio = time.monotonic()
+    classificacao = detect.classificar(file_path)
+    timings["detectar"] = time.monotonic() - inicio
+    if classificacao is None:
+        raise Resposta(422, {"erro": "corretora não reconhecida", "arquivo": str(file_path)})
+    return classificacao
+
+
+# O que as threads que atendem os pedidos compartilham: o pool de workers já aquecidos
+# e as vagas. Cabem `workers` notas sendo lidas e `fila` esperando um worker; além
+# disso o pedido volta na hora com 503, e não fica pendurado.
+class Servico:
+    def __init__(  # noqa: PLR0913
+        self,
+        executor: ProcessPoolExecutor,
+        ler: Leitor,
+        backends: Mapping[str, str],
+        workers: int,
+        fila: int = FILA,
+        timeout: float = TIMEOUT,
+        tamanho_maximo: int = TAMANHO_MAXIMO,
+    ) -> None:
+        self.executor = executor
+        self.ler = ler
+        self.backends = backends
+        self.workers = workers
+        self.fila = fila
+        self.timeout = timeout
+        self.tamanho_maximo = tamanho_maximo
+        self._vagas = threading.BoundedSemaphore(workers + fila)
+        self._lock = threading.Lock()
+        self._em_andamento = 0
+        self._atendidos = 0
+
+    def saude(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "fila": self.fila,
+                "em_andamento": self._em_andamento,
+                "atendidos": self._atendidos,
+            }
+
+    def _liberar(self, _: object) -> None:
+        with self._lock:
+            self._em_andamento -= 1
+            self._atendidos += 1
+        self._vagas.release()
+
+    def ler_nota(
+        self,
+        file_path: pathlib.Path,
+        corretora: str | None,
+        backend: str | None,
+        timings: dict[str, float],
+    ) -> dict[str, Any]:
+        if corretora is not None and corretora not in registry.corretoras():
+            raise Resposta(400, {"erro": f"corretora desconhecida: {corretora}"})
+        if backend is not None and backend not in BACKENDS:
+            raise Resposta(400, {"erro": f"backend desconhecido: {backend}"})
+
+        # a detecção abre o PDF nesta thread: ela também ocupa uma vaga, senão uma
+        # rajada de pedidos sem ?corretora= passa por cima do limite
+        if not self._vagas.acquire(blocking=False):
+            raise Resposta(503, {"erro": "fila cheia", **self.saude()}, **{"Retry-After": "1"})
+        with self._lock:
+            self._em_andamento += 1
+        try:
+            # com ?corretora= o leitor acha o layout sozinho
+            corretora, versao_layout = (corretora, None) if corretora else _detectar(file_path, timings)
+            backend = backend or self.backends[corretora]
+            enviado = time.monotonic()
+            futuro = self.executor.submit(_cronometrado, self.ler, corretora, file_path, backend, versao_layout)
+        except BaseException:
+            self._liberar(None)
+            raise
+        # a vaga só volta quando o worker termina, mesmo que o pedido tenha desistido antes
+        futuro.add_done_callback(self._liberar)
+        try:
+            linhas, inicio, fim = futuro.result(self.timeout)
+        except FuturoTimeout:
+            futuro.cancel()
+            raise Resposta(504, {"erro": f"nota não lida em {self.timeout}s", "arquivo": str(file_path)}) from None
+        except NotaError as exc:
+            raise Resposta(422, {"erro": "nota não lida", **exc.diagnostico()}) from exc
+        except BrokenExecutor as exc:
+            logger.error("serve: pool de workers quebrado: %s", exc)  # noqa: TRY400
+            raise Resposta(500, {"erro": "pool de workers quebrado, reinicie o serviço"}) from exc
+        timings["fila"] = inicio - enviado
+        timings["leitura"] = fim - inicio
+        return {"arquivo": str(file_path), "corretora": corretora, "backend": backend, "linhas": list(linhas)}
+
+
+class Pedido(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "pynotas"
+    timeout = TIMEOUT
+
+    def setup(self) -> None:
+        super().setup()
+        # cabeçalho e corpo saem em dois writes: com o Nagle, o segundo espera o ACK
+        # atrasado do cliente (~40 ms) em toda conexão keep-alive. O socket Unix não tem
+        if isinstance(self.client_address, tuple):
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, True)  # noqa: FBT003
+
+    @property
+    def servico(self) -> Servico:
+        return self.server.servico  # type: ignore[attr-defined,no-any-return]
+
+    def address_string(self) -> str:
+        # no socket Unix o cliente não tem endereço
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002, ANN401
+        logger.info("serve: %s %s", self.address_string(), format % args)
+
+    def do_GET(self) -> None:
+        self._atender(com_corpo=False)
+
+    def do_POST(self) -> None:
+        self._atender(com_corpo=True)
+
+    def _atender(self, *, com_corpo: bool) -> None:
+        inicio = time.monotonic()
+        timings: dict[str, float] = {}
+        url = urllib.parse.urlsplit(self.path)
+        parametros = {chave: valores[-1] for chave, valores in urllib.parse.parse_qs(url.query).items()}
+        try:
+            corpo = self._responder(url.path, parametros, timings, com_corpo=com_corpo)
+        except Resposta as resposta:
+            self._enviar(resposta.status, resposta.corpo, timings, inicio, resposta.headers)
+            return
+        self._enviar(200, corpo, timings, inicio)
+
+    def _responder(
+        self,
+        caminho: str,
+        parametros: Mapping[str, str],
+        timings: dict[str, float],
+        *,
+        com_corpo: bool,
+    ) -> Mapping[str, Any]:
+        if caminho == "/saude" and not com_corpo:
+            return self.servico.saude()
+        if caminho != "/notas":
+            self.close_connection = com_corpo
+            raise Resposta(404, {"erro": f"caminho desconhecido: {caminho}"})
+        with self._nota(parametros, timings, com_corpo=com_corpo) as file_path:
+            return self.servico.ler_nota(file_path, parametros.get("corretora"), parametros.get("backend"), timings)
+
+    @contextlib.contextmanager
+    def _nota(
+        self,
+        parametros: Mapping[str, str],
+        timings: dict[str, float],
+        *,
+        com_corpo: bool,
+    ) -> Iterator[pathlib.Path]:
+        try:
+            tamanho = int(self.headers.get("Content-Length") or 0) if com_corpo else 0
+        except ValueError:
+            tamanho = -1
+        if tamanho < 0:
+            # sem saber onde o corpo termina, a conexão não serve para o próximo pedido
+            self.close_connection = True
+            raise Resposta(400, {"erro": f"Content-Length inválido: {self.headers.get('Content-Length')}"})
+        if tamanho > self.servico.tamanho_maximo:
+            # o corpo não foi lido: a conexão não serve para o próximo pedido
+            self.close_connection = True
+            raise Resposta(413, {"erro": f"nota maior que {self.servico.tamanho_maximo} bytes"})
+        if not tamanho:
+            if "path" not in parametros:
+                raise Resposta(400, {"erro": "mande o PDF no corpo do POST ou o caminho em ?path="})
+            file_path = pathlib.Path(parametros["path"])
+            if not file_path.is_file():
+                raise Resposta(404, {"erro": "arquivo não encontrado", "arquivo": str(file_path)})
+            yield file_path
+            return
+        inicio = time.monotonic()
+        # o worker lê de um arquivo: a nota enviada passa por um temporário
+        with tempfile.NamedTemporaryFile(prefix="pynotas-", suffix=".pdf") as tmp:
+            restante = tamanho
+            while restante:
+                bloco = self.rfile.read(min(restante, 64 * 1024))
+                if not bloco:
+                    self.close_connection = True
+                    raise Resposta(400, {"erro": "corpo menor que o Content-Length"})
+                tmp.write(bloco)
+                restante -= len(bloco)
+            tmp.flush()
+            timings["upload"] = time.monotonic() - inicio
+            yield pathlib.Path(tmp.name)
+
+    def _enviar(
+        self,
+        status: int,
+        corpo: Mapping[str, Any],
+        timings: Mapping[str, float],
+        inicio: float,
+        headers: Mapping[str, str] | None = None,
+    ) -> None:
+        dados = json.dumps(corpo, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(dados)))
+        # tempos em ms: upload, detectar, fila (esperando um worker), leitura e total
+        self.send_header(
+            "Server-Timing",
+            ", ".join(
+                f"{nome};dur={segundos * 1000:.1f}"
+                for nome, segundos in {**timings, "total": time.monotonic() - inicio}.items()
+            ),
+        )
+        for nome, valor in (headers or {}).items():
+            self.send_header(nome, valor)
+        self.end_headers()
+        self.wfile.write(dados)
+
+
+class ServidorTcp(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 64
+    servico: Servico
+
+
+class ServidorUnix(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 64
+    servico: Servico
+
+    def server_bind(self) -> None:
+        # um socket que sobrou de um serviço que não terminou direito
+        pathlib.Path(self.server_address).unlink(missing_ok=True)  # type: ignore[arg-type]
+        super().server_bind()
+
+
+# Atende até um KeyboardInterrupt (ou SIGTERM, se quem chamou o mapeou para ele), com
+# uma thread por conexão; quem lê as notas são os workers do Servico.
+def servir(servico: Servico, host: str = HOST, porta: int = PORTA, unix: pathlib.Path | None = None) -> None:
+    servidor: ServidorTcp | ServidorUnix
+    if unix is None:
+        servidor = ServidorTcp((host, porta), Pedido)
+        endereco = f"http://{host}:{servidor.server_address[1]}"
+    else:
+        servidor = ServidorUnix(str(unix), Pedido)
+        endereco = f"unix:{unix}"
+    servidor.servico = servico
+    logger.info("serve: %s, %d workers, fila de %d", endereco, servico.workers, servico.fila)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("serve: parando")
+    finally:
+        servidor.server_close()
+        if unix is not None:
+            unix.unlink(missing_ok=True)
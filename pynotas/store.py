@@ -0,0 +1,99 @@
+import contextlib
+import logging
+import pathlib
+from typing import Final, Iterable, Iterator, Mapping, Sequence
+
+from pynotas.models import LinhaPlanilha
+from pynotas.parser import to_dec, to_dt
+from pynotas.utils import CABECALHO, DECIMAL2STR
+
+logger = logging.getLogger(__name__)
+
+STORE_PATH: Final[pathlib.Path] = pathlib.Path("data") / "pynotas.db"
+# a tabela e as colunas são constantes: nenhum dado entra no SQL fora dos parâmetros ?
+TABELA: Final[str] = "linhas"
+LOTE: Final[int] = 5000
+COLUNAS: Final[Sequence[str]] = ("arquivo", *CABECALHO)
+
+
+def _tipo(coluna: str) -> str:
+    return "REAL" if coluna in DECIMAL2STR else "TEXT NOT NULL"
+
+
+SCHEMA: Final[Sequence[str]] = (
+    f"CREATE TABLE {TABELA} (id INTEGER PRIMARY KEY, {', '.join(f'{c} {_tipo(c)}' for c in COLUNAS)})",
+    f"CREATE INDEX {TABELA}_ativo_data ON {TABELA} (ativo, data)",
+    f"CREATE INDEX {TABELA}_corretora_data ON {TABELA} (corretora, data)",
+    f"CREATE INDEX {TABELA}_arquivo ON {TABELA} (arquivo)",
+)
+INSERT: Final[str] = f"INSERT INTO {TABELA} ({', '.join(COLUNAS)}) VALUES ({', '.join('?' * len(COLUNAS))})"  # noqa: S608
+
+
+def _valores(arquivo: str, linha: LinhaPlanilha) -> tuple[str | float | None, ...]:
+    campos: Mapping[str, str] = linha  # type: ignore[assignment]
+    valores: list[str | float | None] = [arquivo, to_dt(linha["data"]).date().isoformat()]
+    for coluna in CABECALHO[1:]:
+        valor = campos.get(coluna, "")
+        if coluna in DECIMAL2STR:
+            valores.append(float(to_dec(valor)) if valor else None)
+        else:
+            valores.append(valor)
+    return tuple(valores)
+
+
+# Cópia de all.csv em SQLite, com data ISO e números de verdade em vez de texto com
+# vírgula. Cada linha sabe de que nota veio (arquivo), então gravar() troca as linhas
+# de uma nota e refazer() as de uma corretora inteira (da pasta dela ou do --inbox),
+# sempre dentro de transacao(): quem lê o banco vê a nota inteira ou nada. Os INSERTs
+# vão em lotes de executemany.
+# O schema sai de CABECALHO; se a tabela existente não bate com ele, é recriada e o
+# banco fica como novo (a corretora precisa ser relida).
+class SqliteStore:
+    def __init__(self, path: pathlib.Path = STORE_PATH) -> None:
+        import sqlite3
+
+        self.path = path
+        self.conexao = sqlite3.connect(path, isolation_level=None)
+        self.conexao.execute("PRAGMA journal_mode=WAL")
+        self.novo = False
+        self._pendentes: list[tuple[str | float | None, ...]] = []
+        colunas = [linha[1] for linha in self.conexao.execute(f"PRAGMA table_info({TABELA})")]
+        if colunas != ["id", *COLUNAS]:
+            if colunas:
+                logger.info("store: schema de %s mudou, recriando", path)
+            with self.transacao():
+                self.conexao.execute(f"DROP TABLE IF EXISTS {TABELA}")
+                for comando in SCHEMA:
+                    self.conexao.execute(comando)
+            self.novo = True
+
+    def close(self) -> None:
+        self.conexao.close()
+
+    @contextlib.contextmanager
+    def transacao(self) -> Iterator[None]:
+        self.conexao.execute("BEGIN")
+        try:
+            yield
+            self._descarregar()
+        except BaseException:
+            self._pendentes.clear()
+            self.conexao.execute("ROLLBACK")
+            raise
+        self.conexao.execute("COMMIT")
+
+    def refazer(self, corretora: str) -> None:
+        self._descarregar()
+        self.conexao.execute(f"DELETE FROM {TABELA} WHERE corretora = ?", (corretora,))  # noqa: S608
+
+    def gravar(self, file_path: pathlib.Path, linhas: Iterable[LinhaPlanilha]) -> None:
+        self.conexao.execute(f"DELETE FROM {TABELA} WHERE arquivo = ?", (str(file_path),))  # noqa: S608
+        for linha in linhas:
+            self._pendentes.append(_valores(str(file_path), linha))
+            if len(self._pendentes) >= LOTE:
+                self._descarregar()
+
+    def _descarregar(self) -> None:
+        if self._pendentes:
+            self.conexao.executemany(INSERT, self._pendentes)
+            self._pendentes.clear()
@@ -1,14 +1,12 @@
+import contextlib
 import datetime as dt
 import decimal as dec
 import logging
+import os
 import pathlib
-import sys
-from typing import TYPE_CHECKING, Any, Final, Sequence
-
-import pytz as tz
-from pdfminer.pdfdocument import PDFDocument
-from pdfminer.pdfparser import PDFParser
-from pdfminer.pdftypes import resolve1
+import stat
+import tempfile
+from typing import TYPE_CHECKING, Any, Final, Iterator, Sequence, TextIO
 
 if TYPE_CHECKING:
     from pynotas.models import AnyNumber, Planilha
@@ -29,6 +27,9 @@ DECIMAL2STR: Final[Sequence[str]] = (
     "preco_total",
     "taxa_total",
     "total_investido",
+    "cambio",
+    "preco_total_brl",
+    "total_investido_brl",
 )
 CABECALHO: Final[Sequence[str]] = (
     "data",
@@ -39,12 +40,110 @@ CABECALHO: Final[Sequence[str]] = (
     *DECIMAL2STR,
 )
 
+CABECALHO_GANHOS: Final[Sequence[str]] = (
+    "data",
+    "ativo",
+    "tipo",
+    "local",
+    "corretora",
+    "quantidade",
+    "venda",
+    "custo",
+    "resultado",
+)
+BRASIL: Final[str] = "Brasil"
+EXTERIOR: Final[str] = "Exterior"
+
+
+# Conferência de um total da nota que não fechou: etapa é o nome da conferência
+# ("nota-total", "taxa-total", ...), encontrado é o que as linhas somam e esperado é o
+# que a nota diz.
+class IntegridadeError(SystemError):
+    def __init__(self, etapa: str, encontrado: object, esperado: object) -> None:
+        super().__init__(etapa, encontrado, esperado)
+        self.etapa = etapa
+        self.encontrado = encontrado
+        self.esperado = esperado
+
+    def __str__(self) -> str:
+        return f"[{self.etapa}] {self.encontrado} != {self.esperado}"
+
+
+class NotaError(Exception):
+    def __init__(  # noqa: PLR0913
+        self,
+        file_path: pathlib.Path,
+        motivo: str,
+        *,
+        corretora: str = "",
+        etapa: str = "",
+        esperado: object = None,
+        encontrado: object = None,
+    ) -> None:
+        super().__init__(file_path, motivo)
+        self.file_path = file_path
+        self.motivo = motivo
+        self.corretora = corretora
+        self.etapa = etapa
+        self.esperado = esperado
+        self.encontrado = encontrado
+
+    def __str__(self) -> str:
+        return f"{self.file_path}: {self.motivo}"
+
+    def diagnostico(self) -> dict[str, str | None]:
+        return {
+            "arquivo": str(self.file_path),
+            "corretora": self.corretora,
+            "etapa": self.etapa,
+            "motivo": self.motivo,
+            "esperado": None if self.esperado is None else str(self.esperado),
+            "encontrado": None if self.encontrado is None else str(self.encontrado),
+        }
+
+
+def _modo(destino: pathlib.Path) -> int:
+    try:
+        return stat.S_IMODE(destino.stat().st_mode)
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+def publicar(tmp_path: pathlib.Path, destino: pathlib.Path) -> None:
+    # o mkstemp cria o temporário com 0600: o arquivo novo fica com o modo do antigo, ou
+    # com o que o umask daria a um arquivo criado direto
+    tmp_path.chmod(_modo(destino))
+    tmp_path.replace(destino)
+
+
+@contextlib.contextmanager
+def temporario(destino: pathlib.Path) -> Iterator[pathlib.Path]:
+    fd, tmp_name = tempfile.mkstemp(dir=destino.parent, suffix=".tmp")
+    os.close(fd)
+    tmp_path = pathlib.Path(tmp_name)
+    try:
+        yield tmp_path
+        publicar(tmp_path, destino)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+@contextlib.contextmanager
+def substituir(destino: pathlib.Path) -> Iterator[TextIO]:
+    # quem acompanha o CSV nunca o vê truncado: a versão nova só aparece no replace
+    with temporario(destino) as tmp_path, tmp_path.open("w", encoding="utf-8") as f:
+        yield f
+
 
 def eprint(*args: Any) -> None:  # noqa: ANN401
     logger.info("eprint: ")
     for index, arg in enumerate(args):
         logger.info("eprint: %d %s", index, arg)
-    sys.exit()
+    # para só a nota que está sendo lida, não o processo inteiro
+    msg = "eprint"
+    raise SystemError(msg)
 
 
 def almost_equal(a: "AnyNumber", b: "AnyNumber", precision: dec.Decimal = FLOATING_ERROR_PRECISION) -> bool:
@@ -59,45 +158,20 @@ def assert_almost_equal(
 ) -> None:
     if not almost_equal(a, b, precision):
         logger.error("\na=%f\nb=%f", a, b)
-        msg = f"[{text}] a != b"
-        raise SystemError(msg)
-
-
-def assert1page(file_path: pathlib.Path) -> None:
-    with file_path.open("rb") as f:
-        parser = PDFParser(f)
-        doc = PDFDocument(parser)
-        parser.set_document(doc)
-        pages = resolve1(doc.catalog["Pages"])
-        pages_count = pages.get("Count", 0)
-        if pages_count != 1:
-            msg = "Only works for PDFs with one page..."
-            raise NotImplementedError(msg)
+        raise IntegridadeError(text, a, b)
 
 
-def _assert_data_found(planilha: "Planilha") -> None:  # noqa: C901
+def _assert_data_found(planilha: "Planilha") -> None:
 
-    if planilha.data_nota == dt.datetime(1970, 1, 1, tzinfo=tz.utc):
+    if planilha.data_nota == dt.datetime(1970, 1, 1, tzinfo=dt.timezone.utc):
         msg = "data_nota not found in PDF"
         raise SystemError(msg)
     if planilha.contador < 1:
         msg = "no assets in PDF?"
         raise SystemError(msg)
-    if len(planilha.ativos) == 0:
+    if len(planilha.negocios) == 0:
         msg = "no assets in PDF?"
         raise SystemError(msg)
-    if len(planilha.tipos) == 0:
-        msg = "no types in PDF?"
-        raise SystemError(msg)
-    if len(planilha.quantidades) == 0:
-        msg = "no quantities in PDF?"
-        raise SystemError(msg)
-    if len(planilha.precos) == 0:
-        msg = "no prices in PDF?"
-        raise SystemError(msg)
-    if len(planilha.totais) == 0:
-        msg = "no totals in PDF?"
-        raise SystemError(msg)
     if planilha.taxa_liquidacao < 0:
         msg = "no liquidation fee in PDF?"
         raise SystemError(msg)
@@ -0,0 +1,242 @@
+import abc
+import contextlib
+import logging
+import os
+import pathlib
+import select
+import struct
+import sys
+import time
+from typing import Callable, Collection, Final, Iterable, Sequence
+
+from pynotas.detect import EXTENSAO
+
+logger = logging.getLogger(__name__)
+
+ESPERA: Final[float] = 1.0
+INTERVALO: Final[float] = 2.0
+# uma nota que nunca ganha o %%EOF (PDF truncado) vai para o leitor depois disso, e o
+# leitor decide
+SEM_EOF: Final[float] = 60.0
+FIM: Final[bytes] = b"%%EOF"
+
+IN_MODIFY: Final[int] = 0x2
+IN_CLOSE_WRITE: Final[int] = 0x8
+IN_MOVED_FROM: Final[int] = 0x40
+IN_MOVED_TO: Final[int] = 0x80
+IN_CREATE: Final[int] = 0x100
+IN_DELETE: Final[int] = 0x200
+IN_Q_OVERFLOW: Final[int] = 0x4000
+IN_IGNORED: Final[int] = 0x8000
+IN_ISDIR: Final[int] = 0x40000000
+IN_MASCARA: Final[int] = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENTO: Final[struct.Struct] = struct.Struct("iIII")
+
+Assinatura = tuple[int, int] | None
+
+
+def _pdf(path: pathlib.Path) -> bool:
+    return path.name.lower().endswith(EXTENSAO)
+
+
+def _assinatura(path: pathlib.Path) -> Assinatura:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _completo(path: pathlib.Path) -> bool:
+    # quem grava o PDF aos poucos ainda não escreveu o trailer
+    if not path.is_file():
+        return True
+    try:
+        with path.open("rb") as f:
+            f.seek(max(0, path.stat().st_size - 1024))
+            return FIM in f.read()
+    except OSError:
+        return False
+
+
+class Fonte(abc.ABC):
+    @abc.abstractmethod
+    def eventos(self, timeout: float | None) -> set[pathlib.Path]: ...
+
+    # o Polling não segura nenhum descritor
+    def close(self) -> None:  # noqa: B027
+        pass
+
+
+# Relê as pastas a cada intervalo e compara tamanho e mtime de cada PDF: funciona em
+# qualquer sistema e em pasta de rede, onde o inotify não vê o que outra máquina grava.
+class Polling(Fonte):
+    def __init__(self, pastas: Sequence[pathlib.Path], intervalo: float = INTERVALO) -> None:
+        self.pastas = pastas
+        self.intervalo = intervalo
+        self._fotos = self._foto()
+
+    def _foto(self) -> dict[pathlib.Path, Assinatura]:
+        fotos = {}
+        for pasta in self.pastas:
+            for raiz, _, arquivos in os.walk(pasta):
+                for arquivo in arquivos:
+                    path = pathlib.Path(raiz) / arquivo
+                    if _pdf(path):
+                        fotos[path] = _assinatura(path)
+        return fotos
+
+    def eventos(self, timeout: float | None) -> set[pathlib.Path]:
+        time.sleep(self.intervalo if timeout is None else min(timeout, self.intervalo))
+        antes, self._fotos = self._fotos, self._foto()
+        return {path for path in antes.keys() | self._fotos.keys() if antes.get(path) != self._fotos.get(path)}
+
+
+# inotify pela libc (ctypes, sem dependência nova). Cada pasta e subpasta tem o seu
+# watch; subpastas criadas depois ganham um na hora. Se a fila do kernel estoura,
+# devolve as pastas inteiras e quem chamou relê tudo.
+class Inotify(Fonte):
+    def __init__(self, pastas: Sequence[pathlib.Path]) -> None:
+        # o ctypes.util puxa o subprocess: só quem roda o watch paga
+        import ctypes
+        import ctypes.util
+
+        self._ctypes = ctypes
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        self.pastas = pastas
+        self._watches: dict[int, pathlib.Path] = {}
+        try:
+            for pasta in pastas:
+                for raiz, _, _ in os.walk(pasta):
+                    self._observar(pathlib.Path(raiz))
+        except OSError:
+            self.close()
+            raise
+
+    def _observar(self, pasta: pathlib.Path) -> None:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(pasta), IN_MASCARA)
+        if wd < 0:
+            errno = self._ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), str(pasta))
+        self._watches[wd] = pasta
+
+    def eventos(self, timeout: float | None) -> set[pathlib.Path]:
+        paths: set[pathlib.Path] = set()
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return paths
+        with contextlib.suppress(BlockingIOError):
+            while dados := os.read(self.fd, 64 * 1024):
+                paths |= self._ler(dados)
+        return paths
+
+    def _ler(self, dados: bytes) -> set[pathlib.Path]:
+        paths: set[pathlib.Path] = set()
+        inicio = 0
+        while inicio < len(dados):
+            wd, mascara, _, tamanho = EVENTO.unpack_from(dados, inicio)
+            corpo = inicio + EVENTO.size
+            inicio = corpo + tamanho
+            nome = dados[corpo:inicio].rstrip(b"\0")
+            if mascara & IN_Q_OVERFLOW:
+                logger.warning("watch: fila do inotify cheia, relendo as pastas")
+                paths.update(self.pastas)
+                continue
+            if mascara & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            pasta = self._watches.get(wd)
+            if pasta is None or not nome:
+                continue
+            path = pasta / os.fsdecode(nome)
+            if mascara & IN_ISDIR:
+                if mascara & (IN_CREATE | IN_MOVED_TO):
+                    # a pasta pode ter chegado já com notas dentro
+                    for raiz, _, arquivos in os.walk(path):
+                        self._observar(pathlib.Path(raiz))
+                        paths.update(pathlib.Path(raiz) / arquivo for arquivo in arquivos)
+                continue
+            paths.add(path)
+        return {path for path in paths if path in self.pastas or _pdf(path)}
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def fonte(pastas: Sequence[pathlib.Path], intervalo: float = INTERVALO, *, polling: bool = False) -> Fonte:
+    if not polling and sys.platform.startswith("linux"):
+        try:
+            return Inotify(pastas)
+        except (OSError, AttributeError, TypeError) as exc:
+            logger.warning("watch: sem inotify (%s), relendo as pastas a cada %.1fs", exc, intervalo)
+    return Polling(pastas, intervalo)
+
+
+# Um PDF só vai para o leitor quando tamanho e mtime ficam parados por `espera`
+# segundos e ele já tem o %%EOF no fim: o fetcher pode estar gravando a nota aos
+# poucos. Um arquivo removido sai na hora (a corretora é refeita sem ele).
+class Espera:
+    def __init__(self, espera: float = ESPERA, sem_eof: float = SEM_EOF) -> None:
+        self.espera = espera
+        self.sem_eof = sem_eof
+        self._pendentes: dict[pathlib.Path, tuple[Assinatura, float, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._pendentes)
+
+    @property
+    def pendentes(self) -> Collection[pathlib.Path]:
+        return self._pendentes.keys()
+
+    def marcar(self, paths: Iterable[pathlib.Path], agora: float) -> None:
+        for path in paths:
+            primeiro = self._pendentes[path][2] if path in self._pendentes else agora
+            self._pendentes[path] = (_assinatura(path), agora + self.espera, primeiro)
+
+    def proximo(self, agora: float) -> float | None:
+        if not self._pendentes:
+            return None
+        return max(0.0, min(prazo for _, prazo, _ in self._pendentes.values()) - agora)
+
+    def prontos(self, agora: float) -> list[pathlib.Path]:
+        prontos = []
+        for path, (assinatura, prazo, primeiro) in list(self._pendentes.items()):
+            if prazo > agora:
+                continue
+            atual = _assinatura(path)
+            if atual != assinatura:
+                self._pendentes[path] = (atual, agora + self.espera, primeiro)
+            elif atual is None or _completo(path) or agora - primeiro >= self.sem_eof:
+                del self._pendentes[path]
+                prontos.append(path)
+            else:
+                self._pendentes[path] = (atual, agora + self.espera, primeiro)
+        return sorted(prontos)
+
+
+# Fica rodando até um KeyboardInterrupt (ou SIGTERM, se quem chamou o mapeou para ele).
+# ao_chegar recebe as notas prontas e as que ainda estão sendo gravadas, que quem lê as
+# pastas inteiras deve pular. O watch é armado antes da primeira chamada, com a lista
+# vazia, que põe em dia o que chegou com o processo parado: nada que chegue nesse meio
+# tempo se perde.
+def observar(
+    pastas: Sequence[pathlib.Path],
+    ao_chegar: Callable[[Sequence[pathlib.Path], Collection[pathlib.Path]], None],
+    *,
+    espera: float = ESPERA,
+    intervalo: float = INTERVALO,
+    polling: bool = False,
+) -> None:
+    with contextlib.closing(fonte(pastas, intervalo, polling=polling)) as eventos:
+        logger.info("watch: %s em %s", type(eventos).__name__, ", ".join(map(str, pastas)))
+        fila = Espera(espera)
+        ao_chegar([], fila.pendentes)
+        while True:
+            fila.marcar(eventos.eventos(fila.proximo(time.monotonic())), time.monotonic())
+            prontos = fila.prontos(time.monotonic())
+            if prontos:
+                ao_chegar(prontos, fila.pendentes)
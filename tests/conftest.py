@@ -0,0 +1,11 @@
+import pytest
+
+from tests.synthetic import LAYOUTS, Corpus, build_corpus
+
+
+@pytest.fixture(scope="session")
+def corpus(tmp_path_factory: pytest.TempPathFactory) -> Corpus:
+    # two notes of each synthetic layout, on one page and split over two
+    base = tmp_path_factory.mktemp("corpus")
+    notes = 2 * len(LAYOUTS)
+    return [*build_corpus(base / "one-page", notes, 3, 1), *build_corpus(base / "two-pages", notes, 6, 2)]
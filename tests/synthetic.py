@@ -0,0 +1,321 @@
+import datetime as dt
+import decimal as dec
+import pathlib
+import random
+from typing import Callable, Mapping, NamedTuple, Sequence
+
+import pymupdf
+
+from pynotas.models import Negocios, Planilha
+
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+MARGIN = 40
+FONT_SIZE = 6
+LINE_HEIGHT = 8
+BOX_GAP = 8
+
+CENT = dec.Decimal("0.01")
+B3_TICKERS: Sequence[tuple[str, str]] = (
+    ("PN N2", "PETR4"),
+    ("ON NM", "VALE3"),
+    ("PN N1", "ITUB4"),
+    ("PN N1", "BBDC4"),
+    ("ON NM", "WEGE3"),
+    ("ON", "ABEV3"),
+)
+US_TICKERS: Sequence[str] = ("AMD", "NFLX", "TSLA", "DIS", "AMZN", "MA", "PG", "NVDA", "VTI", "BND")
+
+NoteWriter = Callable[[pathlib.Path, int, int, int], None]
+Corpus = Sequence[tuple[str, pathlib.Path]]
+
+
+class PageOverflowError(ValueError):
+    pass
+
+
+class Trade(NamedTuple):
+    spec: str
+    ticker: str
+    action: str
+    quantity: int
+    price: dec.Decimal
+
+    @property
+    def total(self) -> dec.Decimal:
+        return self.quantity * self.price
+
+    @property
+    def signed_total(self) -> dec.Decimal:
+        return -self.total if self.action == "S" else self.total
+
+    @property
+    def dc(self) -> str:
+        return "C" if self.action == "S" else "D"
+
+
+def _brl(value: dec.Decimal) -> str:
+    return f"{value:,.2f}".replace(",", "_").replace(".", ",").replace("_", ".")
+
+
+def _usd(value: dec.Decimal) -> str:
+    return f"{value:,.2f}"
+
+
+def trades_for(trades: int, seed: int, *, us: bool = False, sells: bool = False) -> list[Trade]:
+    rng = random.Random(seed)
+    result = []
+    for _ in range(trades):
+        if us:
+            ticker = rng.choice(US_TICKERS)
+            spec = ""
+        else:
+            spec, ticker = rng.choice(B3_TICKERS)
+        action = "S" if sells and rng.random() < 0.3 else "B"  # noqa: PLR2004
+        quantity = rng.randint(1, 500)
+        price = (dec.Decimal(rng.randint(100, 50000)) / 100).quantize(CENT)
+        result.append(Trade(spec, ticker, action, quantity, price))
+    return result
+
+
+def _split(items: Sequence[Trade], pages: int) -> list[Sequence[Trade]]:
+    if pages < 1:
+        msg = "pages must be >= 1"
+        raise ValueError(msg)
+    size, extra = divmod(len(items), pages)
+    chunks = []
+    start = 0
+    for index in range(pages):
+        end = start + size + (1 if index < extra else 0)
+        chunks.append(items[start:end])
+        start = end
+    return chunks
+
+
+def _fees(total: dec.Decimal) -> tuple[dec.Decimal, dec.Decimal]:
+    liquidation = (total * dec.Decimal("0.00025")).quantize(CENT) + CENT
+    emolument = (total * dec.Decimal("0.00005")).quantize(CENT) + CENT
+    return liquidation, emolument
+
+
+def irrf_for(trades: Sequence[Trade]) -> dec.Decimal:
+    # withheld on sales only, 0.005% of what was sold
+    sold = sum((trade.total for trade in trades if trade.action == "S"), dec.Decimal(0))
+    return (sold * dec.Decimal("0.00005")).quantize(CENT) + CENT if sold else dec.Decimal(0)
+
+
+def planilha_for(trades: int, seed: int) -> Planilha:
+    # the Planilha a note with these trades parses into, for the fee engines alone
+    all_trades = trades_for(trades, seed, sells=True)
+    totals = [trade.signed_total for trade in all_trades]
+    net = sum(totals, dec.Decimal(0))
+    volume = sum(map(abs, totals), dec.Decimal(0))
+    liquidacao = (volume * dec.Decimal("0.000250")).quantize(CENT)
+    emolumento = (volume * dec.Decimal("0.000050")).quantize(CENT)
+    return Planilha(
+        data_nota=dt.datetime(2023, 1, 2, tzinfo=dt.timezone.utc),
+        contador=len(all_trades),
+        negocios=Negocios(
+            [trade.ticker for trade in all_trades],
+            ["Ação"] * len(all_trades),
+            [
+                dec.Decimal(-trade.quantity if total < 0 else trade.quantity)
+                for trade, total in zip(all_trades, totals, strict=True)
+            ],
+            [trade.price for trade in all_trades],
+            totals,
+        ),
+        taxa_liquidacao=liquidacao,
+        taxa_emolumento=emolumento,
+        nota_total_sem_taxa=abs(net),
+        nota_total_com_taxa=abs(net + liquidacao + emolumento),
+    )
+
+
+def write_pdf(file_path: pathlib.Path, pages: Sequence[Sequence[str]]) -> None:
+    # one text box per entry, top to bottom in a single column and further apart than
+    # pdfminer's line margin, so layout analysis yields exactly these boxes in this
+    # order, followed by the footer rule the Avenue readers use to find a table's end
+    doc = pymupdf.open()  # type: ignore[no-untyped-call]
+    for boxes in pages:
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        y = MARGIN
+        for box in boxes:
+            lines = box.count("\n") + 1
+            if y + lines * LINE_HEIGHT > PAGE_HEIGHT - MARGIN:
+                msg = f"too many text boxes for one page ({len(boxes)})"
+                raise PageOverflowError(msg)
+            page.insert_text((MARGIN, y), box, fontsize=FONT_SIZE, fontname="helv", lineheight=LINE_HEIGHT / FONT_SIZE)
+            y += lines * LINE_HEIGHT + BOX_GAP
+        footer = pymupdf.Rect(MARGIN, PAGE_HEIGHT - MARGIN + 10, PAGE_WIDTH - MARGIN, PAGE_HEIGHT - MARGIN + 12)  # type: ignore[no-untyped-call]
+        page.draw_rect(footer)
+    doc.save(file_path)  # type: ignore[no-untyped-call]
+    doc.close()  # type: ignore[no-untyped-call]
+
+
+def xp_note(file_path: pathlib.Path, trades: int = 3, pages: int = 1, seed: int = 0, *, sells: bool = False) -> None:
+    date = dt.date(2023, 1, 2) + dt.timedelta(days=seed % 365)
+    all_trades = trades_for(trades, seed, sells=sells)
+    total = sum((trade.signed_total for trade in all_trades), dec.Decimal(0))
+    liquidation, emolument = _fees(sum((trade.total for trade in all_trades), dec.Decimal(0)))
+    irrf = irrf_for(all_trades)
+    boxes_per_page = []
+    chunks = _split(all_trades, pages)
+    for index, chunk in enumerate(chunks):
+        boxes = [
+            "NOTA DE CORRETAGEM",
+            "Data pregão",
+            f"{date:%d/%m/%Y}",
+            f"Folha {index + 1}",
+            "C/V Tipo mercado\n"
+            + "\n".join(f"1-BOVESPA {'V' if trade.action == 'S' else 'C'} VISTA" for trade in chunk),
+            "Preço / Ajuste",
+            "\n".join(f"{trade.spec} {trade.ticker}" for trade in chunk),
+            "Obs. (*)",
+            "\n".join(str(trade.quantity) for trade in chunk),
+            "\n".join(_brl(trade.price) for trade in chunk),
+            "D/C " + "\n".join(f"{_brl(trade.total)} {trade.dc}" for trade in chunk),
+        ]
+        if index == len(chunks) - 1:
+            boxes += [
+                "Resumo Financeiro",
+                "Taxa Operacional\nExecução\nTaxa de Custódia\nImpostos\nI.R.R.F.",
+                f"{_brl(abs(total))} {_brl(liquidation)}",
+                f"0,00 0,00 {_brl(emolument)}",
+                f"0,00 0,00 0,00 0,00 {_brl(irrf)}",
+                f"Total Custos / Despesas\nLíquido para {date:%d/%m/%Y}",
+                f"{date:%d/%m/%Y} {_brl(abs(total + liquidation + emolument + irrf))}",
+            ]
+        else:
+            boxes.append("CONTINUA...")
+        boxes_per_page.append(boxes)
+    write_pdf(file_path, boxes_per_page)
+
+
+def nu_note(  # noqa: PLR0913
+    file_path: pathlib.Path,
+    trades: int = 3,
+    pages: int = 1,
+    seed: int = 0,
+    version: int = 2,
+    *,
+    sells: bool = False,
+) -> None:
+    date = dt.date(2023, 1, 2) + dt.timedelta(days=seed % 365)
+    all_trades = trades_for(trades, seed, sells=sells)
+    total = sum((trade.signed_total for trade in all_trades), dec.Decimal(0))
+    liquidation, emolument = _fees(sum((trade.total for trade in all_trades), dec.Decimal(0)))
+    irrf = irrf_for(all_trades)
+    boxes_per_page = []
+    chunks = _split(all_trades, pages)
+    for index, chunk in enumerate(chunks):
+        last = index == len(chunks) - 1
+        boxes = [
+            f"Data Pregão\n{date:%d/%m/%Y}",
+            "Negócios Realizados",
+            "C/VC/V",
+            "Mercado",
+            *("V" if trade.action == "S" else "C" for trade in chunk),
+            *(f"{trade.ticker}F {trade.spec}" for trade in chunk),
+        ]
+        if version == 2:  # noqa: PLR2004
+            boxes += ["Resumo dos Negócios\nResumo dos Negócios", "Debêntures", "Outras"]
+        boxes += [str(trade.quantity) for trade in chunk]
+        for trade in chunk:
+            boxes += [_brl(trade.price), f"{_brl(trade.total)} {trade.dc}"]
+        if version == 2:  # noqa: PLR2004
+            boxes += [_brl(abs(total)), f"-{_brl(liquidation)}", "0,00", "0,00", "0,00", "0,00", f"-{_brl(emolument)}"]
+        elif last:
+            boxes += ["Outras", "Valor das operações", _brl(abs(total)), f"-{_brl(liquidation)}"]
+            boxes += ["0,00", "0,00", "0,00", "0,00", f"-{_brl(emolument)}"]
+        if last:
+            boxes += ["I.R.R.F. s/ operações", f"-{_brl(irrf)}"]
+            boxes += [f"Líquido para {date:%d/%m/%Y}", f"-{_brl(abs(total + liquidation + emolument + irrf))} D"]
+        boxes_per_page.append(boxes)
+    write_pdf(file_path, boxes_per_page)
+
+
+def avenue_note(  # noqa: PLR0913
+    file_path: pathlib.Path,
+    trades: int = 3,
+    pages: int = 1,
+    seed: int = 0,
+    version: int = 2,
+    *,
+    sells: bool = False,
+) -> None:
+    date = dt.date(2023, 1, 2) + dt.timedelta(days=seed % 365)
+    all_trades = trades_for(trades, seed, us=True, sells=sells)
+    # um pregão por negócio: o extrato cobre vários dias
+    dates = iter([date + dt.timedelta(days=day) for day in range(len(all_trades))])
+    boxes_per_page = []
+    for index, chunk in enumerate(_split(all_trades, pages)):
+        if version == 2:  # noqa: PLR2004
+            boxes = ["Apex Clearing Corporation"] if index == 0 else []
+            boxes.append("B/S Trade Date Settle Date QTY")
+            for trade in chunk:
+                boxes += [
+                    "Buy" if trade.action == "B" else "Sell",
+                    f"{next(dates):%m/%d/%y}",
+                    f"{trade.quantity}",
+                    trade.ticker,
+                    _usd(trade.price),
+                    _usd(trade.total),
+                ]
+            boxes.append("End of trades")
+        else:
+            boxes = [f"Confirmation Date  :  {date:%m/%d/%Y}"] if index == 0 else []
+            boxes.append("Account Number")
+            for trade in chunk:
+                trade_date = next(dates)
+                boxes += [
+                    trade.ticker,
+                    "Buy" if trade.action == "B" else "Sell",
+                    f"{trade.quantity}",
+                    _usd(trade.price),
+                    f"{trade_date.month}/{trade_date.day}/{trade_date.year}",
+                    "Net Amount",
+                ]
+            boxes.append("Capacity")
+            for position, trade in enumerate(chunk):
+                if position:
+                    boxes.append("Principal")
+                boxes += [_usd(trade.total), "Agent", "Fee", "Commission", "Other"]
+        boxes_per_page.append(boxes)
+    write_pdf(file_path, boxes_per_page)
+
+
+LAYOUTS: Mapping[str, tuple[str, NoteWriter]] = {
+    "xp": ("xp", xp_note),
+    "nu-v1": ("nu", lambda path, trades, pages, seed: nu_note(path, trades, pages, seed, version=1)),
+    "nu-v2": ("nu", lambda path, trades, pages, seed: nu_note(path, trades, pages, seed, version=2)),
+    "avenue-v1": ("avenue", lambda path, trades, pages, seed: avenue_note(path, trades, pages, seed, version=1)),
+    "avenue-v2": ("avenue", lambda path, trades, pages, seed: avenue_note(path, trades, pages, seed, version=2)),
+}
+
+
+def _write_spilling(write: NoteWriter, file_path: pathlib.Path, trades: int, pages: int, seed: int) -> None:
+    # a layout with more boxes per trade (avenue-v1) fits fewer trades on a page: the
+    # trades that do not fit spill onto one more page, up to one trade per page
+    for spilled in range(pages, max(pages, trades) + 1):
+        try:
+            write(file_path, trades, spilled, seed)
+        except PageOverflowError:
+            if spilled >= trades:
+                raise
+        else:
+            return
+
+
+def build_corpus(base: pathlib.Path, notes: int, trades: int, pages: int) -> Corpus:
+    corpus = []
+    for seed in range(notes):
+        layout = list(LAYOUTS)[seed % len(LAYOUTS)]
+        broker, write = LAYOUTS[layout]
+        folder = base / broker
+        folder.mkdir(parents=True, exist_ok=True)
+        file_path = folder / f"{seed:06d}-{layout}.pdf"
+        if not file_path.exists():
+            _write_spilling(write, file_path, trades, pages, seed)
+        corpus.append((broker, file_path))
+    return corpus
@@ -0,0 +1,17 @@
+import pytest
+
+from pynotas import read_avenue, read_nu, read_xp
+from pynotas.backends import PDFMINER, PYMUPDF
+from tests.synthetic import LAYOUTS, Corpus
+
+READERS = {"xp": read_xp, "nu": read_nu, "avenue": read_avenue}
+
+
+@pytest.mark.parametrize("layout", LAYOUTS)
+def test_pdfminer_and_pymupdf_read_the_same_rows(corpus: Corpus, layout: str) -> None:
+    notes = [(broker, file_path) for broker, file_path in corpus if file_path.stem.endswith(f"-{layout}")]
+    assert notes
+    for broker, file_path in notes:
+        rows = list(READERS[broker](file_path, PDFMINER))
+        assert rows
+        assert rows == list(READERS[broker](file_path, PYMUPDF)), file_path
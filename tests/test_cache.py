@@ -0,0 +1,101 @@
+import datetime as dt
+import os
+import pathlib
+import time
+
+import pytest
+
+from pynotas.__main__ import ler_nota
+from pynotas.backends import NonTextBox, TextBox
+from pynotas.cache import LayoutCache, ParseCache, decode_layout, encode_layout, file_digest
+from pynotas.models import LinhaPlanilha
+from tests.synthetic import Corpus
+
+LINHAS = [
+    LinhaPlanilha(
+        data="02/01/2023",
+        ativo="PETR4",
+        tipo="Ação",
+        local="Brasil",
+        corretora="XP",
+        quantidade="100",
+        taxa_ativo="0",
+        quantidade_final="100",
+        preco="30",
+        taxa_unitaria="0,01",
+        preco_medio="30,01",
+        preco_total="3000",
+        taxa_total="1",
+        total_investido="3001",
+    ),
+]
+
+
+@pytest.fixture
+def cache(tmp_path: pathlib.Path) -> ParseCache:
+    return ParseCache(tmp_path / "cache", layout=False)
+
+
+def _idade(cache: ParseCache, key: str, dias: float) -> None:
+    antes = time.time() - dias * 24 * 60 * 60
+    os.utime(cache.path / f"{key}.json", (antes, antes))
+
+
+def test_a_new_digest_or_parser_version_misses(cache: ParseCache, tmp_path: pathlib.Path) -> None:
+    nota = tmp_path / "nota.pdf"
+    nota.write_bytes(b"%PDF nota 1")
+    cache.store(ParseCache.key("xp", "3", file_digest(nota)), LINHAS)
+    assert cache.load(ParseCache.key("xp", "3", file_digest(nota))) == LINHAS
+
+    assert cache.load(ParseCache.key("xp", "4", file_digest(nota))) is None
+    nota.write_bytes(b"%PDF nota 2")
+    assert cache.load(ParseCache.key("xp", "3", file_digest(nota))) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_eviction_drops_the_least_recently_used_over_the_size_limit(cache: ParseCache) -> None:
+    for dias, key in enumerate(["nova", "usada", "velha"]):
+        cache.store(key, LINHAS)
+        _idade(cache, key, dias)
+    # ler uma entrada a coloca de volta no fim da fila
+    assert cache.load("usada") == LINHAS
+    _idade(cache, "nova", 1.5)
+    cache.max_bytes = 2 * (cache.path / "nova.json").stat().st_size
+    assert cache.evict() == 1
+    assert sorted(entry.stem for entry in cache.path.glob("*.json")) == ["nova", "usada"]
+
+
+def test_eviction_drops_entries_older_than_max_age(cache: ParseCache) -> None:
+    cache.store("antiga", LINHAS)
+    cache.store("recente", LINHAS)
+    _idade(cache, "antiga", 10)
+    cache.max_age = dt.timedelta(days=7)
+    assert cache.evict() == 1
+    assert [entry.stem for entry in cache.path.glob("*.json")] == ["recente"]
+
+
+def test_the_layout_encoding_round_trips() -> None:
+    # as coordenadas vão como float de 32 bits: estas são exatas nele
+    paginas: list[list[TextBox | NonTextBox]] = [
+        [TextBox(40.0, 12.5, 300.25, 20.0, "Negócios realizados\nPETR4 ON"), NonTextBox(40.0, 800.0, 555.0, 802.0)],
+        [],
+        [TextBox(0.0, 0.0, 1.0, 1.0, "")],
+    ]
+    assert decode_layout(encode_layout(paginas)) == paginas
+    with pytest.raises(ValueError, match="not a layout"):
+        decode_layout(b"{}")
+
+
+def test_a_replayed_layout_reads_the_same_rows(
+    corpus: Corpus,
+    tmp_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    # o registry grava a lista dos entry points em data/
+    monkeypatch.chdir(tmp_path)
+    layout = LayoutCache(tmp_path / "layout")
+    for name, file_path in corpus:
+        lidas = ler_nota(name, file_path)
+        assert ler_nota(name, file_path, layout=layout) == lidas
+        assert ler_nota(name, file_path, layout=layout) == lidas
+    assert (layout.hits, layout.misses) == (len(corpus), len(corpus))
@@ -0,0 +1,59 @@
+import datetime as dt
+import decimal as dec
+from typing import Callable
+
+import pytest
+
+from pynotas.centavos import processar_centavos
+from pynotas.models import Negocios, Planilha, ProcessedDataType
+from pynotas.parser import processar_decimal
+from pynotas.utils import IntegridadeError
+from tests.synthetic import CENT, planilha_for
+
+ZERO = dec.Decimal(0)
+Engine = Callable[[Planilha], ProcessedDataType | None]
+ENGINES: list[Engine] = [processar_decimal, processar_centavos]
+
+
+def _sem_volume(taxa: dec.Decimal) -> Planilha:
+    # bonificação e afins: negócios a preço zero
+    return Planilha(
+        data_nota=dt.datetime(2023, 1, 2, tzinfo=dt.timezone.utc),
+        contador=2,
+        negocios=Negocios(["PETR4", "VALE3"], ["Ação"] * 2, [dec.Decimal(10), dec.Decimal(5)], [ZERO] * 2, [ZERO] * 2),
+        taxa_liquidacao=taxa,
+        taxa_emolumento=ZERO,
+        nota_total_sem_taxa=ZERO,
+        nota_total_com_taxa=taxa,
+    )
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_both_engines_agree(seed: int) -> None:
+    # mesmos grupos, quantidades e totais; a taxa de cada ativo difere em menos de um
+    # centavo e a soma é exatamente a taxa da nota
+    planilha = planilha_for(40, seed)
+    decimal_rows = processar_decimal(planilha)
+    centavos_rows = processar_centavos(planilha)
+    assert centavos_rows is not None
+    assert list(centavos_rows) == list(decimal_rows)
+    taxa = planilha.taxa_liquidacao + planilha.taxa_emolumento
+    assert sum(row["taxa_total"] for row in centavos_rows.values()) == taxa
+    for key, row in decimal_rows.items():
+        assert centavos_rows[key]["quantidade"] == row["quantidade"]
+        assert centavos_rows[key]["total_sem_taxa"] == row["total_sem_taxa"]
+        assert abs(centavos_rows[key]["taxa_total"] - row["taxa_total"]) < CENT
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_a_note_without_volume_gets_no_fee(engine: Engine) -> None:
+    rows = engine(_sem_volume(ZERO))
+    assert rows is not None
+    assert [row["taxa_total"] for row in rows.values()] == [ZERO, ZERO]
+    assert [row["total_com_taxa"] for row in rows.values()] == [ZERO, ZERO]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_a_fee_without_volume_is_an_integrity_error(engine: Engine) -> None:
+    with pytest.raises(IntegridadeError, match="taxa-total"):
+        engine(_sem_volume(CENT))
@@ -0,0 +1,83 @@
+import csv
+import json
+import pathlib
+import shutil
+import sys
+
+import pytest
+
+from pynotas.__main__ import cli
+from pynotas.parser import to_dec, to_dt
+from pynotas.utils import CABECALHO, DECIMAL2STR
+from tests.synthetic import Corpus
+
+
+@pytest.fixture
+def data(corpus: Corpus, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> pathlib.Path:
+    monkeypatch.chdir(tmp_path)
+    for index, (broker, file_path) in enumerate(corpus):
+        pasta = tmp_path / "data" / broker
+        pasta.mkdir(parents=True, exist_ok=True)
+        shutil.copy(file_path, pasta / f"{index:02d}-{file_path.name}")
+    return tmp_path / "data"
+
+
+def _rodar(monkeypatch: pytest.MonkeyPatch, *args: str) -> None:
+    monkeypatch.setattr(sys, "argv", ["pynotas", *args])
+    cli()
+
+
+def _csvs(data: pathlib.Path) -> dict[str, str]:
+    return {str(csv.relative_to(data)): csv.read_text(encoding="utf-8") for csv in sorted(data.rglob("*.csv"))}
+
+
+def test_keep_going_quarantines_a_broken_note_and_writes_the_others(
+    data: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    _rodar(monkeypatch, "--no-cache")
+    esperado = _csvs(data)
+
+    quebrada = data / "xp" / "00-quebrada.pdf"
+    quebrada.write_bytes(b"nem PDF")
+    with pytest.raises(SystemExit) as saida:
+        _rodar(monkeypatch, "--no-cache", "--keep-going")
+    assert saida.value.code == 1
+
+    relatorio = json.loads((data / "quarentena.json").read_text(encoding="utf-8"))
+    assert relatorio["quarentena"] == 1
+    [nota] = relatorio["notas"]
+    assert nota["arquivo"] == str(quebrada.relative_to(data.parent))
+    assert (nota["corretora"], nota["etapa"]) == ("xp", "abrir")
+    assert _csvs(data) == esperado
+
+
+def test_four_workers_write_the_same_as_a_serial_run(data: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    _rodar(monkeypatch, "--no-cache", "--ledger")
+    serial = _csvs(data)
+    _rodar(monkeypatch, "--no-cache", "--ledger", "-j", "4")
+    assert _csvs(data) == serial
+
+
+def test_the_parquet_copy_has_the_schema_and_values_of_all_csv(
+    data: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    pq = pytest.importorskip("pyarrow.parquet")
+    from pynotas.parquet import CONTEXTO, QUANTUM, SCHEMA
+
+    _rodar(monkeypatch, "--no-cache", "--format", "parquet")
+    tabela = pq.read_table(data / "all.parquet")
+    assert tabela.schema.remove_metadata() == SCHEMA
+    with (data / "all.csv").open(encoding="utf-8") as csv_file:
+        linhas = list(csv.DictReader(csv_file, dialect="unix"))
+    assert len(linhas) == tabela.num_rows > 0
+    for linha, copia in zip(linhas, tabela.to_pylist(), strict=True):
+        assert copia["data"] == to_dt(linha["data"]).date()
+        for coluna in CABECALHO[1:]:
+            valor = linha[coluna]
+            if coluna in DECIMAL2STR:
+                # a célula vazia do CSV vira nulo
+                assert copia[coluna] == (CONTEXTO.quantize(to_dec(valor), QUANTUM) if valor else None)
+            else:
+                assert copia[coluna] == valor
@@ -0,0 +1,65 @@
+import datetime as dt
+import decimal as dec
+import pathlib
+
+import pytest
+
+from pynotas.darf import ACAO, FII, TaxRollup
+
+JAN, FEV, MAR = dt.date(2023, 1, 10), dt.date(2023, 2, 10), dt.date(2023, 3, 10)
+
+
+def _rollup(*vendas: tuple[dt.date, str, int, int]) -> TaxRollup:
+    rollup = TaxRollup()
+    for data, classe, venda, resultado in vendas:
+        rollup.add(data, classe, dec.Decimal(venda), dec.Decimal(resultado))
+    return rollup
+
+
+def _reais(*valores: str) -> tuple[dec.Decimal, ...]:
+    return tuple(map(dec.Decimal, valores))
+
+
+@pytest.mark.parametrize(("vendas", "imposto"), [(20000, "0"), (20001, "150.00")])
+def test_stocks_are_exempt_up_to_20k_of_sales_in_the_month(vendas: int, imposto: str) -> None:
+    darf = _rollup((JAN, ACAO, vendas, 1000)).apurar()["2023-01"]
+    assert darf.imposto == dec.Decimal(imposto)
+    assert darf.apuracoes[0].isento is (imposto == "0")
+
+
+def test_stocks_pay_15_percent_and_fiis_20_percent_without_exemption() -> None:
+    darf = _rollup((JAN, ACAO, 50000, 1000), (JAN, FII, 5000, 1000)).apurar()["2023-01"]
+    assert {a.classe: a.imposto for a in darf.apuracoes} == {ACAO: dec.Decimal("150.00"), FII: dec.Decimal("200.00")}
+    assert darf.a_pagar == dec.Decimal("350.00")
+
+
+def test_a_loss_is_carried_forward_within_its_class() -> None:
+    # o mês isento não consome o prejuízo, e o prejuízo em FII não abate ações
+    rollup = _rollup(
+        (JAN, ACAO, 30000, -1000),
+        (JAN, FII, 30000, -5000),
+        (FEV, ACAO, 10000, 500),
+        (MAR, ACAO, 30000, 1500),
+    )
+    darfs = rollup.apurar()
+    assert darfs["2023-02"].imposto == 0
+    acoes = next(a for a in darfs["2023-03"].apuracoes if a.classe == ACAO)
+    assert (acoes.compensado, acoes.base, acoes.imposto, acoes.prejuizo) == _reais("1000", "500", "75.00", "0")
+    fiis = next(a for a in darfs["2023-03"].apuracoes if a.classe == FII)
+    assert fiis.prejuizo == 5000
+
+
+def test_a_darf_under_10_reais_is_paid_with_the_next_month() -> None:
+    darfs = _rollup((JAN, ACAO, 30000, 50), (FEV, ACAO, 30000, 30)).apurar()
+    assert (darfs["2023-01"].a_pagar, darfs["2023-01"].acumulado) == _reais("0", "7.50")
+    assert (darfs["2023-02"].a_pagar, darfs["2023-02"].acumulado) == _reais("12.00", "0")
+
+
+def test_a_new_month_after_load_matches_a_full_rollup(tmp_path: pathlib.Path) -> None:
+    meses = [(JAN, ACAO, 30000, -1000), (JAN, ACAO, 30000, 50), (FEV, ACAO, 30000, 1030), (MAR, FII, 100, 40)]
+    rollup = _rollup(*meses[:2])
+    rollup.save(tmp_path / "darf.json")
+    retomado = TaxRollup.load(tmp_path / "darf.json")
+    for data, classe, venda, resultado in meses[2:]:
+        retomado.add(data, classe, dec.Decimal(venda), dec.Decimal(resultado))
+    assert list(retomado) == list(_rollup(*meses))
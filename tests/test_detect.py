@@ -0,0 +1,94 @@
+import decimal as dec
+import pathlib
+import shutil
+
+import pytest
+
+from pynotas import detect, read_nu, registry
+from pynotas.__main__ import Inbox
+from tests.synthetic import Corpus
+
+
+@pytest.fixture
+def inbox(corpus: Corpus, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> pathlib.Path:
+    monkeypatch.chdir(tmp_path)
+    pasta = tmp_path / "inbox"
+    pasta.mkdir()
+    for index, (_, file_path) in enumerate(corpus[:6]):
+        shutil.copy(file_path, pasta / f"{index}-{file_path.name}")
+    (pasta / "nada.pdf").write_bytes(b"nem PDF")
+    return pasta
+
+
+@pytest.fixture
+def abertas(monkeypatch: pytest.MonkeyPatch) -> list[pathlib.Path]:
+    abertas = []
+    classificar = detect.classificar
+
+    def contando(file_path: pathlib.Path, *args: object) -> detect.Classificacao | None:
+        abertas.append(file_path)
+        return classificar(file_path, *args)  # type: ignore[arg-type]
+
+    monkeypatch.setattr(detect, "classificar", contando)
+    return abertas
+
+
+def _detectar(
+    pastas: list[pathlib.Path],
+) -> tuple[dict[str, list[pathlib.Path]], dict[pathlib.Path, str], dict[pathlib.Path, int]]:
+    caixa = Inbox(pastas)
+    caixa.atualizar(())
+    return caixa.detectadas(None)
+
+
+def test_the_inbox_opens_each_note_once(inbox: pathlib.Path, abertas: list[pathlib.Path]) -> None:
+    primeira, digests, _ = _detectar([inbox])
+    assert len(abertas) == 7
+    assert set(digests) == set(inbox.iterdir()) - {inbox / "nada.pdf"}
+    assert sum(map(len, primeira.values())) == 6
+
+    segunda, _, _ = _detectar([inbox])
+    assert segunda == primeira
+    assert len(abertas) == 7
+
+
+def test_the_watch_classifies_only_the_paths_of_an_event(inbox: pathlib.Path, abertas: list[pathlib.Path]) -> None:
+    caixa = Inbox([inbox])
+    caixa.atualizar(())
+    antes, _, _ = caixa.detectadas(None)
+    abertas.clear()
+
+    nova = inbox / "sub" / "nova.pdf"
+    nova.parent.mkdir()
+    shutil.copy(antes["xp"][0], nova)
+    removida = antes["nu"][0]
+    removida.unlink()
+    caixa.atualizar([nova, removida])
+    depois, _, _ = caixa.detectadas(None)
+    assert abertas == []  # a cópia tem o digest de uma nota já classificada
+    assert depois["xp"] == [*antes["xp"], nova]
+    assert depois["nu"] == antes["nu"][1:]
+
+    (inbox / "outra.pdf").write_bytes(b"nem PDF, outro")
+    caixa.atualizar([inbox / "outra.pdf"])
+    assert abertas == [inbox / "outra.pdf"]
+
+
+def test_new_brokers_detect_again(inbox: pathlib.Path) -> None:
+    _detectar([inbox])
+    corretoras = list(registry.corretoras().values())
+    assert len(detect.Deteccoes.load(corretoras).notas) == 7
+    outra = corretoras[0]._replace(marcas=[(["OutraCorretora"], 1)])
+    assert not detect.Deteccoes.load([outra, *corretoras[1:]]).notas
+
+
+def test_the_reader_gets_the_layout_of_the_first_page(inbox: pathlib.Path) -> None:
+    _, _, layouts = _detectar([inbox])
+    versionadas = {file_path: versao for file_path, versao in layouts.items() if "-v" in file_path.stem}
+    assert versionadas
+    assert all(file_path.stem.endswith(f"-v{versao}") for file_path, versao in versionadas.items())
+    # com a versão dada o leitor não procura a marca do layout: a errada não lê a nota
+    nu_v2 = next(file_path for file_path in versionadas if file_path.stem.endswith("nu-v2"))
+    assert read_nu(nu_v2, versao_layout=2) == read_nu(nu_v2)
+    with pytest.raises(dec.InvalidOperation):
+        read_nu(nu_v2, versao_layout=1)
@@ -0,0 +1,69 @@
+import decimal as dec
+
+from hypothesis import example, given
+from hypothesis import strategies as st
+
+from pynotas.formatting import PLAIN, PT_BR, DecimalFormatter
+from pynotas.parser import to_dec
+
+# valores finitos de qualquer expoente, inclusive 1E+3, 0E-23 e -0
+DECIMAIS = st.decimals(allow_nan=False, allow_infinity=False)
+FORMATADORES = st.sampled_from([PT_BR, PLAIN])
+
+
+@given(DECIMAIS, FORMATADORES)
+@example(dec.Decimal("1E+3"), PT_BR)
+@example(dec.Decimal("1.50"), PT_BR)
+@example(dec.Decimal("0E-23"), PLAIN)
+@example(dec.Decimal("-0"), PLAIN)
+def test_parse_undoes_format(valor: dec.Decimal, formatador: DecimalFormatter) -> None:
+    texto = formatador.format_value(valor)
+    assert formatador.parse(texto) == valor
+    assert "E" not in texto
+    assert not texto.endswith(formatador.separador)
+    if formatador.separador in texto:
+        assert not texto.endswith("0")
+    if not valor:
+        assert texto == "0"
+
+
+# normalize() e quantize() arredondam além de 28 dígitos, a precisão do contexto
+@given(st.integers(min_value=-(10**24), max_value=10**24))
+@example(10)
+@example(-1200)
+def test_trailing_zeros_of_integers_are_significant(inteiro: int) -> None:
+    assert PT_BR.format_value(dec.Decimal(inteiro)) == str(inteiro)
+    # o mesmo inteiro com outro expoente (10 como 1E+1 ou 10.000) sai igual
+    assert PT_BR.format_value(dec.Decimal(inteiro).normalize()) == str(inteiro)
+    assert PT_BR.format_value(dec.Decimal(inteiro).quantize(dec.Decimal("0.001"))) == str(inteiro)
+
+
+@given(st.integers(min_value=-(10**12), max_value=10**12), st.integers(min_value=1, max_value=6))
+@example(10, 2)
+def test_fraction_zeros_are_dropped(inteiro: int, casas: int) -> None:
+    valor = dec.Decimal(inteiro).scaleb(-casas)
+    esperado = f"{valor:f}".rstrip("0").rstrip(".") if inteiro else "0"
+    assert PT_BR.format_value(valor) == esperado.replace(".", ",")
+
+
+@given(DECIMAIS)
+def test_pt_br_reads_back_with_to_dec(valor: dec.Decimal) -> None:
+    assert to_dec(PT_BR.format_value(valor)) == valor
+
+
+@given(st.lists(DECIMAIS), FORMATADORES)
+def test_column_matches_format(valores: list[dec.Decimal], formatador: DecimalFormatter) -> None:
+    assert formatador.column(None, valores) == [formatador.format_value(valor) for valor in valores]
+
+
+@given(DECIMAIS.filter(lambda valor: abs(valor) < 10**15), st.integers(min_value=0, max_value=4))
+@example(dec.Decimal("-0.001"), 2)
+@example(dec.Decimal("10"), 2)
+def test_a_column_with_precision_keeps_exactly_its_places(valor: dec.Decimal, casas: int) -> None:
+    formatador = DecimalFormatter(precisoes={"imposto": casas})
+    texto = formatador.format_value(valor, "imposto")
+    inteiros, _, fracao = texto.partition(",")
+    assert len(fracao) == casas
+    assert formatador.parse(texto) == valor.quantize(dec.Decimal(1).scaleb(-casas))
+    assert not inteiros.startswith("-") or formatador.parse(texto) < 0
+    assert formatador.column("imposto", [valor]) == [texto]
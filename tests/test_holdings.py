@@ -0,0 +1,54 @@
+import datetime as dt
+import decimal as dec
+import pathlib
+
+import pytest
+
+from pynotas.holdings import HoldingsIndex
+from pynotas.models import Position
+
+
+def _posicao(quantidade: int, custo: int) -> Position:
+    return Position(dec.Decimal(quantidade), dec.Decimal(custo))
+
+
+@pytest.fixture
+def index() -> HoldingsIndex:
+    index = HoldingsIndex()
+    index.record("PETR4", dt.date(2023, 1, 10), _posicao(100, 3000))
+    index.record("VALE3", dt.date(2023, 1, 15), _posicao(10, 700))
+    index.record("PETR4", dt.date(2023, 1, 20), _posicao(0, 0))
+    return index
+
+
+@pytest.mark.parametrize(
+    ("data", "carteira"),
+    [
+        (dt.date(2023, 1, 9), {}),
+        (dt.date(2023, 1, 10), {"PETR4": _posicao(100, 3000)}),
+        (dt.date(2023, 1, 19), {"PETR4": _posicao(100, 3000), "VALE3": _posicao(10, 700)}),
+        # a posição zerada sai da carteira, e depois do último evento vale o último
+        (dt.date(2023, 1, 20), {"VALE3": _posicao(10, 700)}),
+        (dt.date(2030, 1, 1), {"VALE3": _posicao(10, 700)}),
+    ],
+)
+def test_at_finds_the_position_before_between_and_after_the_trades(
+    index: HoldingsIndex,
+    data: dt.date,
+    carteira: dict[str, Position],
+) -> None:
+    assert index.at(data) == carteira
+
+
+def test_the_same_day_keeps_the_last_position_and_the_past_is_refused(index: HoldingsIndex) -> None:
+    index.record("VALE3", dt.date(2023, 1, 15), _posicao(15, 1000))
+    assert index.at(dt.date(2023, 1, 15))["VALE3"] == _posicao(15, 1000)
+    with pytest.raises(ValueError, match="fora de ordem"):
+        index.record("VALE3", dt.date(2023, 1, 14), _posicao(1, 70))
+
+
+def test_load_reads_back_what_save_wrote(index: HoldingsIndex, tmp_path: pathlib.Path) -> None:
+    index.save(tmp_path / "holdings.json")
+    lido = HoldingsIndex.load(tmp_path / "holdings.json")
+    for dia in range(8, 22):
+        assert lido.at(dt.date(2023, 1, dia)) == index.at(dt.date(2023, 1, dia))
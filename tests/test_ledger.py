@@ -0,0 +1,125 @@
+import collections
+import datetime as dt
+import decimal as dec
+import random
+
+import pytest
+
+from pynotas.formatting import PT_BR
+from pynotas.ledger import Ledger
+from pynotas.models import LinhaConvertida
+from pynotas.parser import to_dec
+from pynotas.utils import BRASIL, EXTERIOR, almost_equal
+
+ZERO = dec.Decimal(0)
+TICKERS = ("PETR4", "VALE3", "ITUB4")
+
+
+def _linha(data: dt.date, ativo: str, local: str, quantidade: int, total: dec.Decimal) -> LinhaConvertida:
+    # o câmbio muda todo dia no exterior, para o custo em reais não sair do custo em dólar
+    cambio = dec.Decimal(1) if local == BRASIL else dec.Decimal(5) + dec.Decimal(data.toordinal() % 97) / 100
+    return LinhaConvertida(
+        data=f"{data:%d/%m/%Y}",
+        ativo=ativo,
+        tipo="Ação" if local == BRASIL else "Stock",
+        local=local,
+        corretora="XP" if local == BRASIL else "Avenue",
+        quantidade=PT_BR.format_value(dec.Decimal(quantidade)),
+        taxa_ativo="0",
+        quantidade_final=PT_BR.format_value(dec.Decimal(quantidade)),
+        preco=PT_BR.format_value(abs(total / quantidade)),
+        taxa_unitaria="0",
+        preco_medio=PT_BR.format_value(abs(total / quantidade)),
+        preco_total=PT_BR.format_value(total),
+        taxa_total="0",
+        total_investido=PT_BR.format_value(total),
+        cambio=PT_BR.format_value(cambio),
+        preco_total_brl=PT_BR.format_value(total * cambio),
+        total_investido_brl=PT_BR.format_value(total * cambio),
+    )
+
+
+def _historico(local: str, seed: int, linhas: int = 300) -> list[LinhaConvertida]:
+    # compras em vários lotes e vendas parciais, sem nunca vender mais que a posição
+    rng = random.Random(seed)
+    posicoes: collections.Counter[str] = collections.Counter()
+    historico = []
+    for dia in range(linhas):
+        ativo = rng.choice(TICKERS)
+        quantidade = rng.randint(1, 300)
+        if posicoes[ativo] and rng.random() < 0.4:
+            quantidade = -rng.randint(1, posicoes[ativo])
+        posicoes[ativo] += quantidade
+        total = quantidade * dec.Decimal(rng.randint(100, 50000)) / 100
+        historico.append(_linha(dt.date(2023, 1, 2) + dt.timedelta(days=dia), ativo, local, quantidade, total))
+    return historico
+
+
+def _custo_medio(anteriores: list[LinhaConvertida], vendida: dec.Decimal) -> dec.Decimal:
+    quantidade = custo = ZERO
+    for linha in anteriores:
+        q, total = to_dec(linha["quantidade"]), to_dec(linha["total_investido_brl"])
+        if q > 0:
+            quantidade, custo = quantidade + q, custo + total
+        else:
+            quantidade, custo = quantidade + q, custo + custo / quantidade * q
+    return custo / quantidade * vendida
+
+
+def _custo_fifo(anteriores: list[LinhaConvertida], vendida: dec.Decimal) -> dec.Decimal:
+    # a venda leva as ações [já vendidas, já vendidas + vendida) na ordem das compras
+    inicio = -sum((to_dec(linha["quantidade"]) for linha in anteriores if linha["quantidade"][0] == "-"), ZERO)
+    fim = inicio + vendida
+    custo = comprado = ZERO
+    for linha in anteriores:
+        q, total = to_dec(linha["quantidade"]), to_dec(linha["total_investido_brl"])
+        if q > 0:
+            usada = max(ZERO, min(fim, comprado + q) - max(inicio, comprado))
+            custo += usada * total / q
+            comprado += q
+    return custo
+
+
+@pytest.mark.parametrize("local", [BRASIL, EXTERIOR])
+def test_realized_gains_match_a_naive_rescan(local: str) -> None:
+    historico = _historico(local, seed=len(local))
+    ledger = Ledger()
+    realizados = []
+    for _ in ledger.run(historico):
+        realizados.extend(ledger.realizados)
+        ledger.realizados.clear()
+    assert not ledger.descobertas
+
+    custo_de = _custo_fifo if local == EXTERIOR else _custo_medio
+    vendas = [i for i, linha in enumerate(historico) if linha["quantidade"][0] == "-"]
+    assert len(vendas) == len(realizados) > 50
+    for i, realizado in zip(vendas, realizados, strict=True):
+        venda = historico[i]
+        anteriores = [linha for linha in historico[:i] if linha["ativo"] == venda["ativo"]]
+        custo = custo_de(anteriores, -to_dec(venda["quantidade"]))
+        assert almost_equal(to_dec(realizado["custo"]), custo), venda
+        assert almost_equal(to_dec(realizado["resultado"]), -to_dec(venda["total_investido_brl"]) - custo), venda
+
+
+def test_a_sale_above_the_position_is_left_out() -> None:
+    dia = dt.date(2023, 1, 2)
+    compra = _linha(dia, "PETR4", BRASIL, 10, dec.Decimal(300))
+    descoberta = _linha(dia, "PETR4", BRASIL, -15, dec.Decimal(-480))
+    venda = _linha(dia, "PETR4", BRASIL, -4, dec.Decimal(-140))
+    ledger = Ledger()
+    aplicadas = list(ledger.run([compra, descoberta, venda]))
+    assert [linha["quantidade"] for linha in aplicadas] == [compra["quantidade"], venda["quantidade"]]
+    assert ledger.descobertas == [descoberta]
+    assert ledger.posicoes["PETR4"].quantidade == 6
+    assert [ganho["resultado"] for ganho in ledger.realizados] == [PT_BR.format_value(dec.Decimal(20))]
+
+
+def test_a_row_abroad_without_the_ptax_rate_is_left_out() -> None:
+    dia = dt.date(2023, 1, 2)
+    compra = _linha(dia, "AMD", EXTERIOR, 10, dec.Decimal(300))
+    sem_cambio = LinhaConvertida(**{**compra, "cambio": "", "preco_total_brl": "", "total_investido_brl": ""})
+    ledger = Ledger()
+    aplicadas = list(ledger.run([sem_cambio, compra]))
+    assert [linha["cambio"] for linha in aplicadas] == [compra["cambio"]]
+    assert ledger.sem_cambio == [sem_cambio]
+    assert aplicadas[0]["preco_medio"] == PT_BR.format_value(to_dec(compra["total_investido_brl"]) / 10)
@@ -0,0 +1,87 @@
+import os
+import pathlib
+
+import pytest
+
+from pynotas import manifest as manifest_module
+from pynotas.cache import file_digest
+from pynotas.manifest import Manifest
+
+VERSAO = "3"
+
+
+@pytest.fixture
+def hashes(monkeypatch: pytest.MonkeyPatch) -> list[pathlib.Path]:
+    # quais notas tiveram o conteúdo lido para o hash
+    lidas: list[pathlib.Path] = []
+
+    def contar(file_path: pathlib.Path) -> str:
+        lidas.append(file_path)
+        return file_digest(file_path)
+
+    monkeypatch.setattr(manifest_module, "file_digest", contar)
+    return lidas
+
+
+@pytest.fixture
+def nota(tmp_path: pathlib.Path) -> pathlib.Path:
+    nota = tmp_path / "xp" / "nota.pdf"
+    nota.parent.mkdir()
+    nota.write_bytes(b"%PDF nota 1")
+    return nota
+
+
+def _salvo(nota: pathlib.Path) -> Manifest:
+    manifest = Manifest(nota.parent / "manifest.json")
+    manifest.reset("xp", VERSAO)
+    manifest.record("xp", nota)
+    manifest.save()
+    return Manifest.load(manifest.path)
+
+
+def _mtime(nota: pathlib.Path, mais_ns: int) -> None:
+    stat = nota.stat()
+    os.utime(nota, ns=(stat.st_atime_ns, stat.st_mtime_ns + mais_ns))
+
+
+def test_an_unchanged_note_is_not_read_again(nota: pathlib.Path, hashes: list[pathlib.Path]) -> None:
+    manifest = _salvo(nota)
+    nova = nota.with_name("nova.pdf")
+    nova.write_bytes(b"%PDF nota 2")
+    hashes.clear()
+    assert manifest.pending("xp", VERSAO, [nota, nova]) == [nova]
+    assert not hashes
+
+
+def test_a_touched_note_with_the_same_bytes_is_unchanged(nota: pathlib.Path, hashes: list[pathlib.Path]) -> None:
+    manifest = _salvo(nota)
+    _mtime(nota, 10**9)
+    hashes.clear()
+    assert manifest.pending("xp", VERSAO, [nota]) == []
+    assert hashes == [nota]
+    # o mtime novo fica no manifesto: a próxima vez não relê a nota
+    hashes.clear()
+    assert manifest.pending("xp", VERSAO, [nota]) == []
+    assert not hashes
+
+
+@pytest.mark.parametrize("conteudo", [b"%PDF nota 9", b"%PDF outra nota"])
+def test_a_modified_note_rebuilds_the_broker(
+    nota: pathlib.Path,
+    hashes: list[pathlib.Path],
+    conteudo: bytes,
+) -> None:
+    manifest = _salvo(nota)
+    nota.write_bytes(conteudo)
+    _mtime(nota, 10**9)
+    hashes.clear()
+    assert manifest.pending("xp", VERSAO, [nota]) is None
+    # com outro tamanho nem precisa do hash
+    assert hashes == ([nota] if len(conteudo) == len(b"%PDF nota 1") else [])
+
+
+def test_a_removed_note_or_a_new_parser_rebuilds_the_broker(nota: pathlib.Path) -> None:
+    manifest = _salvo(nota)
+    assert manifest.pending("xp", "4", [nota]) is None
+    assert manifest.pending("xp", VERSAO, []) is None
+    assert manifest.pending("nu", VERSAO, []) is None
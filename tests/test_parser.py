@@ -0,0 +1,45 @@
+import pathlib
+from typing import Iterator
+
+import pytest
+
+from pynotas import read_avenue, read_nu, read_xp
+from pynotas.parser import DECIMAL, MOTORES, usar_motor
+from tests.synthetic import avenue_note, irrf_for, nu_note, trades_for, xp_note
+
+SEED = 1
+
+
+@pytest.fixture(params=MOTORES)
+def motor(request: pytest.FixtureRequest) -> Iterator[str]:
+    usar_motor(request.param)
+    yield request.param
+    usar_motor(DECIMAL)
+
+
+@pytest.mark.usefixtures("motor")
+@pytest.mark.parametrize("version", [1, 2])
+def test_nu_sells_check_the_net_amount_withirrf_for(tmp_path: pathlib.Path, version: int) -> None:
+    assert irrf_for(trades_for(4, SEED, sells=True))
+    file_path = tmp_path / "nu.pdf"
+    nu_note(file_path, 4, 1, SEED, version, sells=True)
+    rows = read_nu(file_path)
+    assert any(row["quantidade"].startswith("-") for row in rows)
+
+
+@pytest.mark.usefixtures("motor")
+@pytest.mark.parametrize("pages", [1, 2])
+def test_xp_sells_check_the_net_amount_withirrf_for(tmp_path: pathlib.Path, pages: int) -> None:
+    assert irrf_for(trades_for(4, SEED, sells=True))
+    file_path = tmp_path / "xp.pdf"
+    xp_note(file_path, 4, pages, SEED, sells=True)
+    rows = read_xp(file_path)
+    assert any(row["quantidade"].startswith("-") for row in rows)
+
+
+@pytest.mark.parametrize("version", [1, 2])
+def test_avenue_reads_the_date_of_each_trade(tmp_path: pathlib.Path, version: int) -> None:
+    file_path = tmp_path / "avenue.pdf"
+    avenue_note(file_path, 5, 2, SEED, version)
+    rows = read_avenue(file_path)
+    assert len({row["data"] for row in rows}) == len(rows) == 5
@@ -0,0 +1,21 @@
+import datetime as dt
+import pathlib
+
+import pytest
+
+from pynotas import registry
+from pynotas.cache import ParseCache
+from pynotas.registry import PLUGINS_PATH
+
+
+def test_evicting_the_parse_cache_keeps_the_entry_point_list(
+    tmp_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.chdir(tmp_path)
+    # sem o cache do processo, corretoras() grava a lista dos entry points nesta pasta
+    registry.corretoras.cache_clear()
+    registry.corretoras()
+    assert PLUGINS_PATH.is_file()
+    ParseCache(max_bytes=0, max_age=dt.timedelta(0)).evict()
+    assert PLUGINS_PATH.is_file()
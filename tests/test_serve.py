@@ -0,0 +1,74 @@
+import concurrent.futures as cf
+import http.client
+import json
+import pathlib
+import threading
+from typing import Any, Iterator
+
+import pytest
+
+from pynotas import detect
+from pynotas.serve import Pedido, Servico, ServidorTcp
+
+
+def _nunca(*_: object) -> Any:  # noqa: ANN401
+    raise AssertionError
+
+
+@pytest.fixture
+def cliente(request: pytest.FixtureRequest) -> Iterator[http.client.HTTPConnection]:
+    workers = getattr(request, "param", 1)
+    with cf.ThreadPoolExecutor(1) as executor:
+        servidor = ServidorTcp(("127.0.0.1", 0), Pedido)
+        servidor.servico = Servico(executor, _nunca, {}, workers, fila=0)  # type: ignore[arg-type]
+        thread = threading.Thread(target=servidor.serve_forever)
+        thread.start()
+        conexao = http.client.HTTPConnection("127.0.0.1", servidor.server_address[1], timeout=5)
+        try:
+            yield conexao
+        finally:
+            conexao.close()
+            servidor.shutdown()
+            servidor.server_close()
+            thread.join()
+
+
+def test_an_invalid_content_length_is_a_bad_request(cliente: http.client.HTTPConnection) -> None:
+    cliente.putrequest("POST", "/notas")
+    cliente.putheader("Content-Length", "muito")
+    cliente.endheaders()
+    resposta = cliente.getresponse()
+    assert resposta.status == 400
+    assert "Content-Length" in json.loads(resposta.read())["erro"]
+
+
+@pytest.mark.parametrize("cliente", [0], indirect=True)
+def test_detection_waits_for_a_free_slot(
+    cliente: http.client.HTTPConnection,
+    tmp_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(detect, "classificar", _nunca)
+    nota = tmp_path / "nota.pdf"
+    nota.write_bytes(b"%PDF")
+    cliente.request("GET", f"/notas?path={nota}")
+    resposta = cliente.getresponse()
+    assert resposta.status == 503
+    assert json.loads(resposta.read())["em_andamento"] == 0
+
+
+def test_a_note_of_no_broker_gives_its_slot_back(
+    cliente: http.client.HTTPConnection,
+    tmp_path: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(detect, "classificar", lambda _: None)
+    nota = tmp_path / "nota.pdf"
+    nota.write_bytes(b"%PDF")
+    for _ in range(2):
+        cliente.request("GET", f"/notas?path={nota}")
+        resposta = cliente.getresponse()
+        assert resposta.status == 422
+        resposta.read()
+    cliente.request("GET", "/saude")
+    assert json.loads(cliente.getresponse().read()) == {"workers": 1, "fila": 0, "em_andamento": 0, "atendidos": 2}
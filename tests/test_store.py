@@ -0,0 +1,69 @@
+import pathlib
+from typing import Iterator
+
+import pytest
+
+from pynotas.models import LinhaPlanilha
+from pynotas.store import SqliteStore
+
+
+def _linha(ativo: str, quantidade: str) -> LinhaPlanilha:
+    return LinhaPlanilha(
+        data="02/01/2023",
+        ativo=ativo,
+        tipo="Ação",
+        local="Brasil",
+        corretora="XP",
+        quantidade=quantidade,
+        taxa_ativo="0",
+        quantidade_final=quantidade,
+        preco="30,5",
+        taxa_unitaria="0,01",
+        preco_medio="30,51",
+        preco_total="3050",
+        taxa_total="1",
+        total_investido="3051",
+    )
+
+
+@pytest.fixture
+def store(tmp_path: pathlib.Path) -> Iterator[SqliteStore]:
+    store = SqliteStore(tmp_path / "pynotas.db")
+    with store.transacao():
+        store.gravar(pathlib.Path("a.pdf"), [_linha("PETR4", "100"), _linha("VALE3", "10")])
+        store.gravar(pathlib.Path("b.pdf"), [_linha("ITUB4", "-5")])
+    yield store
+    store.close()
+
+
+def _linhas(store: SqliteStore) -> list[tuple[str, str, str, float]]:
+    return list(store.conexao.execute("SELECT arquivo, data, ativo, quantidade FROM linhas ORDER BY arquivo, ativo"))
+
+
+def test_gravar_replaces_only_the_rows_of_that_note(store: SqliteStore) -> None:
+    with store.transacao():
+        store.gravar(pathlib.Path("a.pdf"), [_linha("WEGE3", "7")])
+    assert _linhas(store) == [("a.pdf", "2023-01-02", "WEGE3", 7.0), ("b.pdf", "2023-01-02", "ITUB4", -5.0)]
+
+
+def _falhar(store: SqliteStore) -> None:
+    with store.transacao():
+        store.gravar(pathlib.Path("a.pdf"), [_linha("WEGE3", "7")])
+        store.gravar(pathlib.Path("c.pdf"), [_linha("ABEV3", "3")])
+        raise RuntimeError
+
+
+def test_an_error_rolls_the_whole_transaction_back(store: SqliteStore) -> None:
+    antes = _linhas(store)
+    with pytest.raises(RuntimeError):
+        _falhar(store)
+    assert _linhas(store) == antes
+    # as linhas que estavam no lote também não vão na próxima transação
+    with store.transacao():
+        store.gravar(pathlib.Path("d.pdf"), [])
+    assert _linhas(store) == antes
+    # e quem abre o banco de novo vê o mesmo
+    outro = SqliteStore(store.path)
+    assert not outro.novo
+    assert _linhas(outro) == antes
+    outro.close()
@@ -0,0 +1,30 @@
+import os
+import pathlib
+import stat
+
+from pynotas.utils import substituir
+
+
+def _modo(path: pathlib.Path) -> int:
+    return stat.S_IMODE(path.stat().st_mode)
+
+
+def test_substituir_keeps_the_mode_of_the_file_it_replaces(tmp_path: pathlib.Path) -> None:
+    destino = tmp_path / "xp.csv"
+    destino.write_text("antigo\n", encoding="utf-8")
+    destino.chmod(0o640)
+    with substituir(destino) as f:
+        f.write("novo\n")
+    assert destino.read_text(encoding="utf-8") == "novo\n"
+    assert _modo(destino) == 0o640
+    assert list(tmp_path.iterdir()) == [destino]
+
+
+def test_substituir_creates_with_the_umask_mode(tmp_path: pathlib.Path) -> None:
+    umask = os.umask(0o022)
+    try:
+        with substituir(tmp_path / "all.csv") as f:
+            f.write("novo\n")
+    finally:
+        os.umask(umask)
+    assert _modo(tmp_path / "all.csv") == 0o644